@@ -51,6 +51,20 @@ def add_file_routes(app,CreateCredentials,isLocal,serverPath,bcrypt):
         fileManager = FileHandler(request,isLocal=IS_LOCAL ,serverPath=SERVER_PATH)
         return RouteUtils.run_instance_function(fileManager, fileManager.getErrorMetrics)
 
+    @app.route("/v1/row_errors/", methods = ["POST"])
+    @permissions_check
+    def row_errors():
+        """ Page through the individual failing rows of a validation job """
+        fileManager = FileHandler(request,isLocal=IS_LOCAL, serverPath=SERVER_PATH)
+        return RouteUtils.run_instance_function(fileManager, fileManager.getRowErrors)
+
+    @app.route("/v1/rule_stats/", methods = ["POST"])
+    @permissions_check(permission_list=["website_admin"])
+    def rule_stats():
+        """ Summarize how long each SQL validation rule has been taking """
+        fileManager = FileHandler(request,isLocal=IS_LOCAL, serverPath=SERVER_PATH)
+        return RouteUtils.run_instance_function(fileManager, fileManager.getRuleStats)
+
     @app.route("/v1/local_upload/", methods = ["POST"])
     @permissions_check
     def upload_local_file():
@@ -1,12 +1,13 @@
 import os
 from csv import reader
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
+from threading import Thread
 from uuid import uuid4
 
 import requests
 from flask import session as flaskSession
-from flask import session, request, redirect, send_from_directory
+from flask import current_app, session, request, redirect, send_from_directory
 from requests.exceptions import Timeout
 from sqlalchemy.orm import joinedload
 from sqlalchemy.orm.exc import NoResultFound
@@ -20,7 +21,8 @@ from dataactcore.interfaces.db import GlobalDB
 from dataactcore.models.errorModels import File
 from dataactcore.models.jobModels import FileGenerationTask, JobDependency, Job, Submission
 from dataactcore.models.userModel import User
-from dataactcore.models.lookups import FILE_STATUS_DICT, RULE_SEVERITY_DICT
+from dataactcore.models.lookups import (FILE_STATUS_DICT, RULE_SEVERITY_DICT, RULE_SEVERITY_DICT_ID, FILE_TYPE_DICT,
+                                       FILE_TYPE_DICT_ID)
 from dataactcore.utils.jobQueue import generate_e_file, generate_f_file
 from dataactcore.utils.jsonResponse import JsonResponse
 from dataactcore.utils.report import (get_report_path, get_cross_report_name,
@@ -31,8 +33,10 @@ from dataactcore.utils.statusCode import StatusCode
 from dataactcore.utils.stringCleaner import StringCleaner
 from dataactcore.interfaces.function_bag import (
     checkNumberOfErrorsByJobId, getErrorType, run_job_checks,
-    createFileIfNeeded, getErrorMetricsByJobId, get_submission_stats)
+    createFileIfNeeded, getErrorMetricsByJobId, get_submission_stats, get_row_errors, get_rule_execution_stats,
+    RULE_STATS_PERIODS)
 from dataactvalidator.filestreaming.csv_selection import write_csv
+from dataactvalidator.filestreaming.rowErrorWriter import materializeReports, pendingReports
 
 
 _debug_logger = logging.getLogger('deprecated.debug')
@@ -55,6 +59,10 @@ class FileHandler:
     VALIDATOR_RESPONSE_FILE = "validatorResponse"
     STATUS_MAP = {"waiting":"invalid", "ready":"invalid", "running":"waiting", "finished":"finished", "invalid":"failed", "failed":"failed"}
     VALIDATION_STATUS_MAP = {"waiting":"waiting", "ready":"waiting", "running":"waiting", "finished":"finished", "failed":"failed", "invalid":"failed"}
+    ROW_ERROR_PAGE_SIZE = 100
+    ROW_ERROR_MAX_PAGE_SIZE = 1000
+    # Days of rule execution statistics summarized by default
+    RULE_STATS_DAYS = 30
 
     def __init__(self,request,interfaces = None,isLocal= False,serverPath =""):
         """ Create the File Handler
@@ -94,6 +102,8 @@ class FileHandler:
             safe_dictionary = RequestDictionary(self.request)
             submission_id = safe_dictionary.getValue("submission_id")
             response_dict ={}
+            # Response key to the name of its report
+            report_names = {}
             sess = GlobalDB.db().session
             for job_id in self.jobManager.getJobsBySubmission(submission_id):
                 # get the job object here so we can call the refactored getReportPath
@@ -106,6 +116,7 @@ class FileHandler:
                     else:
                         report_name = get_report_path(job, 'error')
                         key = 'job_{}_error_url'.format(job_id)
+                    report_names[key] = report_name
                     if not self.isLocal:
                         response_dict[key] = self.s3manager.getSignedUrl("errors", report_name, method="GET")
                     else:
@@ -127,8 +138,18 @@ class FileHandler:
                 else:
                     report_path = self.s3manager.getSignedUrl("errors", report_name, method="GET")
                 # Assign to key based on source and target
-                response_dict[self.getCrossReportKey(first_file.name, second_file.name, is_warning)] = report_path
-
+                key = self.getCrossReportKey(first_file.name, second_file.name, is_warning)
+                report_names[key] = report_name
+                response_dict[key] = report_path
+
+            # Reports validated with lazy_reports set are written the first time they are requested, in the
+            # background, and are "pending" until they have been written
+            pending = pendingReports(list(report_names.values()))
+            if pending:
+                for key, report_name in report_names.items():
+                    if report_name in pending:
+                        response_dict[key] = "pending"
+                self.materializeInBackground(list(pending))
             return JsonResponse.create(StatusCode.OK, response_dict)
 
         except ResponseException as e:
@@ -137,6 +158,27 @@ class FileHandler:
             # Unexpected exception, this is a 500 server error
             return JsonResponse.error(e,StatusCode.INTERNAL_ERROR)
 
+    def materializeInBackground(self, report_names):
+        """ Write the CSVs of reports held in row_error on a thread of their own, so the request doesn't wait
+
+        Args:
+            report_names: names of the report files, without the folder
+        """
+        app = current_app._get_current_object()
+        is_local, directory = self.isLocal, self.serverPath
+
+        def materialize():
+            # The thread gets its own app context, and so its own database connection
+            with app.app_context():
+                try:
+                    materializeReports(report_names, is_local, directory)
+                except Exception:
+                    _debug_logger.exception('Writing reports %s failed', report_names)
+                finally:
+                    GlobalDB.close()
+
+        Thread(target=materialize, daemon=True).start()
+
     def get_signed_url_for_submission_file(self):
         """ Gets the signed URL for the specified file """
         try:
@@ -485,6 +527,90 @@ class FileHandler:
             # Unexpected exception, this is a 500 server error
             return JsonResponse.error(e,StatusCode.INTERNAL_ERROR)
 
+    def getRowErrors(self):
+        """ Returns an Http response object containing one page of the row-level errors for a job
+
+        The request holds a job_id, and optionally a limit, rule, field and severity to filter on,
+        and after, the next value of the previous page
+        """
+        try:
+            safe_dictionary = RequestDictionary(self.request)
+            job_id = safe_dictionary.getValue("job_id")
+            job = self.jobManager.getJobById(job_id)
+
+            # Check if user has permission to specified submission
+            self.check_submission_permission(self.jobManager.getSubmissionById(job.submission_id))
+
+            limit = int(safe_dictionary.getValue("limit")) if safe_dictionary.exists("limit") \
+                else self.ROW_ERROR_PAGE_SIZE
+            if limit < 1 or limit > self.ROW_ERROR_MAX_PAGE_SIZE:
+                raise ResponseException("limit must be between 1 and {}".format(self.ROW_ERROR_MAX_PAGE_SIZE),
+                                        StatusCode.CLIENT_ERROR)
+            after = safe_dictionary.getValue("after") if safe_dictionary.exists("after") else None
+            if after is not None and (not isinstance(after, list) or len(after) != 3):
+                raise ResponseException("after must be the next value returned with the previous page",
+                                        StatusCode.CLIENT_ERROR)
+            severity_id = None
+            if safe_dictionary.exists("severity"):
+                severity = safe_dictionary.getValue("severity")
+                if severity not in RULE_SEVERITY_DICT:
+                    raise ResponseException("severity must be one of: {}".format(", ".join(RULE_SEVERITY_DICT)),
+                                            StatusCode.CLIENT_ERROR)
+                severity_id = RULE_SEVERITY_DICT[severity]
+            rule = safe_dictionary.getValue("rule") if safe_dictionary.exists("rule") else None
+            field = safe_dictionary.getValue("field") if safe_dictionary.exists("field") else None
+
+            rows, next_key = get_row_errors(job_id, limit, after, rule, field, severity_id)
+            errors = [{"row_number": row.row_number, "field_name": row.field_name,
+                       "error_message": row.error_message, "value_provided": row.value_provided,
+                       "original_label": row.original_rule_label,
+                       "severity": RULE_SEVERITY_DICT_ID.get(row.severity_id, ''),
+                       "source_file": FILE_TYPE_DICT_ID.get(row.file_type_id, ''),
+                       "target_file": FILE_TYPE_DICT_ID.get(row.target_file_type_id, '')} for row in rows]
+            return JsonResponse.create(StatusCode.OK, {"job_id": job.job_id, "errors": errors, "next": next_key})
+        except ( ValueError , TypeError ) as e:
+            return JsonResponse.error(e,StatusCode.CLIENT_ERROR)
+        except ResponseException as e:
+            return JsonResponse.error(e,e.status)
+        except Exception as e:
+            # Unexpected exception, this is a 500 server error
+            return JsonResponse.error(e,StatusCode.INTERNAL_ERROR)
+
+    def getRuleStats(self):
+        """ Returns an Http response object containing the p50 and p95 execution time of each SQL rule
+
+        The request optionally holds days, how many days back to look, period, to summarize each rule
+        per hour, day, week or month, and file_type, to only include that file type's rules
+        """
+        try:
+            safe_dictionary = RequestDictionary(self.request)
+            days = int(safe_dictionary.getValue("days")) if safe_dictionary.exists("days") \
+                else self.RULE_STATS_DAYS
+            if days < 1:
+                raise ResponseException("days must be at least 1", StatusCode.CLIENT_ERROR)
+            period = safe_dictionary.getValue("period") if safe_dictionary.exists("period") else None
+            if period is not None and period not in RULE_STATS_PERIODS:
+                raise ResponseException("period must be one of: {}".format(", ".join(RULE_STATS_PERIODS)),
+                                        StatusCode.CLIENT_ERROR)
+            file_type_id = None
+            if safe_dictionary.exists("file_type"):
+                file_type = safe_dictionary.getValue("file_type")
+                if file_type not in FILE_TYPE_DICT:
+                    raise ResponseException("file_type must be one of: {}".format(", ".join(FILE_TYPE_DICT)),
+                                            StatusCode.CLIENT_ERROR)
+                file_type_id = FILE_TYPE_DICT[file_type]
+
+            start_date = datetime.utcnow() - timedelta(days=days)
+            rules = get_rule_execution_stats(start_date, file_type_id=file_type_id, period=period)
+            return JsonResponse.create(StatusCode.OK, {"start_date": str(start_date), "rules": rules})
+        except ( ValueError , TypeError ) as e:
+            return JsonResponse.error(e,StatusCode.CLIENT_ERROR)
+        except ResponseException as e:
+            return JsonResponse.error(e,e.status)
+        except Exception as e:
+            # Unexpected exception, this is a 500 server error
+            return JsonResponse.error(e,StatusCode.INTERNAL_ERROR)
+
     def uploadFile(self):
         """ Saves a file and returns the saved path.  Should only be used for local installs. """
         try:
@@ -103,6 +103,24 @@ class s3UrlHandler:
         else:
             return key.size
 
+    @staticmethod
+    def getFileETag(filename):
+        """ Returns the S3 ETag for specified filename, or None if file doesn't exist
+
+        The ETag only depends on the file's contents and on how it was uploaded,
+        so an identical file uploaded the same way has the same ETag
+        """
+        try:
+            s3UrlHandler.REGION
+        except AttributeError as e:
+            s3UrlHandler.REGION = CONFIG_BROKER["aws_region"]
+        s3connection = boto.s3.connect_to_region(s3UrlHandler.REGION)
+        bucket = s3connection.get_bucket(CONFIG_BROKER['aws_bucket'])
+        key = bucket.get_key(filename)
+        if key is None:
+            return None
+        return key.etag.strip('"')
+
     def getFileUrls(self, bucket_name, path):
         try:
             s3UrlHandler.REGION
@@ -1,14 +1,14 @@
 import uuid
 
-from sqlalchemy import func, or_
+from sqlalchemy import func, literal_column, or_, tuple_
 from sqlalchemy.orm import joinedload
 from sqlalchemy.orm.exc import NoResultFound
 
-from dataactcore.models.errorModels import ErrorMetadata, File
+from dataactcore.models.errorModels import ErrorMetadata, File, RowError
 from dataactcore.models.jobModels import Job, Submission, JobDependency
 from dataactcore.models.stagingModels import AwardFinancial
 from dataactcore.models.userModel import User, UserStatus, EmailTemplateType, EmailTemplate, PermissionType
-from dataactcore.models.validationModels import RuleSeverity
+from dataactcore.models.validationModels import RuleExecutionStats, RuleSeverity
 from dataactcore.models.lookups import (FILE_TYPE_DICT, FILE_STATUS_DICT, JOB_TYPE_DICT,
                                         JOB_STATUS_DICT, FILE_TYPE_DICT_ID, PERMISSION_TYPE_DICT)
 from dataactcore.interfaces.db import GlobalDB
@@ -30,6 +30,9 @@ from dataactvalidator.validation_handlers.validationError import ValidationError
 # todo: move these value to config if it is decided to keep local user login long term
 HASH_ROUNDS = 12
 
+# Periods get_rule_execution_stats can summarize by
+RULE_STATS_PERIODS = ("hour", "day", "week", "month")
+
 
 def createUserWithPassword(email, password, bcrypt, permission=1, cgac_code="SYS"):
     """Convenience function to set up fully-baked user (used for setup/testing only)."""
@@ -354,6 +357,97 @@ def getErrorMetricsByJobId(job_id, include_file_types=False, severity_id=None):
         result_list.append(record_dict)
     return result_list
 
+def get_row_errors(job_id, limit, after=None, rule_label=None, field_name=None, severity_id=None):
+    """ Get one page of the row-level errors for a job, ordered by rule label and row number
+
+    Args:
+        job_id: ID of the job
+        limit: Most errors to return
+        after: Key of the last error on the previous page, None for the first page
+        rule_label: Only return errors for this rule
+        field_name: Only return errors for this field
+        severity_id: Only return errors of this severity
+
+    Returns:
+        Tuple of a list of RowError objects and the key to pass as after for the next page,
+        the key is None on the last page
+    """
+    sess = GlobalDB.db().session
+    query = sess.query(RowError).filter(RowError.job_id == job_id)
+    if rule_label is not None:
+        query = query.filter(RowError.original_rule_label == rule_label)
+    if field_name is not None:
+        query = query.filter(RowError.field_name == field_name)
+    if severity_id is not None:
+        query = query.filter(RowError.severity_id == severity_id)
+    pageKey = (RowError.original_rule_label, RowError.row_number, RowError.row_error_id)
+    if after is not None:
+        # Seek past the previous page along ix_row_error_job_rule_row instead of counting off an offset
+        query = query.filter(tuple_(*pageKey) > tuple_(*after))
+    # Fetch one extra row to find out whether there is another page
+    rows = query.order_by(*pageKey).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, [last.original_rule_label, last.row_number, last.row_error_id]
+
+def get_rule_execution_stats(start_date=None, end_date=None, file_type_id=None, period=None):
+    """ Summarize rule_execution_stats per rule, slowest median first
+
+    Args:
+        start_date: Only include executions from this datetime on
+        end_date: Only include executions before this datetime
+        file_type_id: Only include rules for this file type
+        period: One of RULE_STATS_PERIODS to summarize each rule per period, None to summarize
+            over the whole range
+
+    Returns:
+        List of dicts with the rule's query name, label and file type, the period start if period is set,
+        the number of executions, the p50 and p95 of elapsed seconds and the average failure and staging
+        row counts
+
+    Raises:
+        ValueError: If period is not one of RULE_STATS_PERIODS
+    """
+    if period is not None and period not in RULE_STATS_PERIODS:
+        raise ValueError("period must be one of: {}".format(", ".join(RULE_STATS_PERIODS)))
+    sess = GlobalDB.db().session
+    elapsed = RuleExecutionStats.elapsed_seconds
+    p50 = func.percentile_cont(0.5).within_group(elapsed).label("p50_seconds")
+    groups = [RuleExecutionStats.query_name, RuleExecutionStats.rule_label, RuleExecutionStats.file_type_id]
+    if period is not None:
+        # A literal rather than a bound parameter, so the grouped expression matches the selected one
+        groups.append(func.date_trunc(literal_column("'{}'".format(period)), RuleExecutionStats.created_at).
+                      label("period"))
+    query = sess.query(*(groups + [
+        func.count().label("executions"), p50,
+        func.percentile_cont(0.95).within_group(elapsed).label("p95_seconds"),
+        func.avg(RuleExecutionStats.failure_count).label("average_failures"),
+        func.avg(RuleExecutionStats.staging_row_count).label("average_staging_rows")]))
+    if start_date is not None:
+        query = query.filter(RuleExecutionStats.created_at >= start_date)
+    if end_date is not None:
+        query = query.filter(RuleExecutionStats.created_at < end_date)
+    if file_type_id is not None:
+        query = query.filter(RuleExecutionStats.file_type_id == file_type_id)
+    query = query.group_by(*groups)
+    if period is not None:
+        query = query.order_by(RuleExecutionStats.query_name, groups[-1])
+    else:
+        query = query.order_by(p50.desc(), RuleExecutionStats.query_name)
+    results = []
+    for row in query:
+        result = {"query_name": row.query_name, "rule_label": row.rule_label,
+                  "file_type": FILE_TYPE_DICT_ID.get(row.file_type_id, ""), "executions": row.executions,
+                  "p50_seconds": row.p50_seconds, "p95_seconds": row.p95_seconds,
+                  "average_failures": float(row.average_failures or 0),
+                  "average_staging_rows": float(row.average_staging_rows or 0)}
+        if period is not None:
+            result["period"] = str(row.period.date())
+        results.append(result)
+    return results
+
 """ USER DB FUNCTIONS """
 def get_email_template(email_type):
     """ Get template for specified email type
@@ -0,0 +1,85 @@
+"""add submission composite indexes to staging tables
+
+Revision ID: c3f9a7e2d514
+Revises: b7e4c1d93f58
+Create Date: 2016-12-09 14:37:05.118342
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c3f9a7e2d514'
+down_revision = 'b7e4c1d93f58'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# Indexes for the joins of the SQL rules, each leading with submission_id
+INDEXES = [
+    ('ix_appropriation_submission_tas', 'appropriation', ['submission_id', 'tas']),
+    ('ix_oc_pa_submission_tas_oc_pa', 'object_class_program_activity',
+     ['submission_id', 'tas', 'object_class', 'program_activity_code']),
+    ('ix_award_financial_submission_tas_oc_pa', 'award_financial',
+     ['submission_id', 'tas', 'object_class', 'program_activity_code']),
+    ('ix_award_financial_submission_piid', 'award_financial', ['submission_id', 'piid']),
+    ('ix_award_financial_submission_fain', 'award_financial', ['submission_id', 'fain']),
+    ('ix_award_financial_submission_uri', 'award_financial', ['submission_id', 'uri']),
+    ('ix_award_financial_assistance_submission_fain', 'award_financial_assistance', ['submission_id', 'fain']),
+    ('ix_award_financial_assistance_submission_uri', 'award_financial_assistance', ['submission_id', 'uri']),
+    ('ix_award_procurement_submission_piid', 'award_procurement', ['submission_id', 'piid']),
+]
+
+
+def upgrade(engine_name):
+    globals()["upgrade_%s" % engine_name]()
+
+
+def downgrade(engine_name):
+    globals()["downgrade_%s" % engine_name]()
+
+
+def index_connection():
+    """ Connection of its own for building indexes CONCURRENTLY, which can't run inside the migration's transaction """
+    conn = op.get_bind().engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+    conn.execute("SET lock_timeout = '1min'")
+    return conn
+
+
+def build_in_transaction(table, conn):
+    """ True if the table's indexes should be built in the migration's transaction rather than concurrently
+
+    A table the migration's transaction created or changed is locked by it, or can't be seen from another
+    connection, until the end of the run. An empty table's index is built at once, and is rolled back with
+    the rest of the run if a later revision fails.
+    """
+    holds_lock = op.get_bind().execute(sa.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_locks WHERE pid = pg_backend_pid() AND relation = to_regclass(:name))"),
+        name=table).scalar()
+    if holds_lock or conn.execute(sa.text("SELECT to_regclass(:name)"), name=table).scalar() is None:
+        return True
+    return not conn.execute('SELECT EXISTS (SELECT 1 FROM {})'.format(table)).scalar()
+
+
+def upgrade_data_broker():
+    conn = index_connection()
+    try:
+        for name, table, columns in INDEXES:
+            if build_in_transaction(table, conn):
+                op.execute('DROP INDEX IF EXISTS {}'.format(name))
+                op.create_index(name, table, columns, unique=False)
+                continue
+            # A concurrent build that failed leaves an invalid index behind
+            conn.execute('DROP INDEX CONCURRENTLY IF EXISTS {}'.format(name))
+            conn.execute('CREATE INDEX CONCURRENTLY {} ON {} ({})'.format(name, table, ', '.join(columns)))
+    finally:
+        conn.execute('RESET lock_timeout')
+        conn.close()
+
+
+def downgrade_data_broker():
+    # Dropping an index doesn't scan its table, so the indexes are dropped in the migration's transaction, which
+    # may already hold the staging tables' locks
+    for name, _, _ in reversed(INDEXES):
+        op.execute('DROP INDEX IF EXISTS {}'.format(name))
@@ -0,0 +1,92 @@
+"""partition staging tables by submission
+
+Revision ID: d8a2f6c0b3e7
+Revises: c3f9a7e2d514
+Create Date: 2016-12-12 11:05:42.907163
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'd8a2f6c0b3e7'
+down_revision = 'c3f9a7e2d514'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+import sqlalchemy as sa
+
+
+STAGING_TABLES = ['appropriation', 'object_class_program_activity', 'award_financial', 'award_financial_assistance',
+                  'award_procurement']
+
+# There is a partition per submission, so the partition count grows with the submissions kept. Before
+# PostgreSQL 12, planning a query on a partitioned table locks and opens every partition, even those the
+# query's submission_id rules out, so older servers keep plain staging tables.
+MIN_SERVER_VERSION = (12,)
+
+
+def upgrade(engine_name):
+    globals()["upgrade_%s" % engine_name]()
+
+
+def downgrade(engine_name):
+    globals()["downgrade_%s" % engine_name]()
+
+
+def partitioning_supported():
+    return op.get_bind().dialect.server_version_info >= MIN_SERVER_VERSION
+
+
+def is_partitioned(table):
+    return op.get_bind().execute(sa.text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"),
+                                 name=table).scalar() == 'p'
+
+
+def upgrade_data_broker():
+    # Older servers keep plain staging tables, the validator deletes a submission's rows from them
+    if not partitioning_supported():
+        return
+    conn = op.get_bind()
+    # Partitions are created for submissions as they are validated. The rows already staged become each
+    # table's default partition.
+    for table in STAGING_TABLES:
+        if is_partitioned(table):
+            continue
+        default = '{}_default'.format(table)
+        indexes = [index for index in sa.inspect(conn).get_indexes(table) if not index['unique']]
+        last_submission = conn.execute('SELECT MAX(submission_id) FROM {}'.format(table)).scalar()
+        op.execute('ALTER TABLE {} RENAME TO {}'.format(table, default))
+        for index in indexes:
+            op.execute('ALTER INDEX {0} RENAME TO {0}_default'.format(index['name']))
+        op.execute('CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS) PARTITION BY LIST (submission_id)'.format(
+            table, default))
+        if last_submission is not None:
+            # PostgreSQL scans the default partition for rows of each partition created, unless a check
+            # rules them out, as this one does for submissions newer than the rows already staged
+            op.execute('ALTER TABLE {0} ADD CONSTRAINT {0}_submission_id_check CHECK (submission_id <= {1})'.format(
+                default, int(last_submission)))
+        op.execute('ALTER TABLE {} ATTACH PARTITION {} DEFAULT'.format(table, default))
+        # Indexes on the parent are created on every partition, the default partition's existing indexes are
+        # attached rather than built again
+        for index in indexes:
+            op.create_index(index['name'], table, index['column_names'], unique=False)
+
+
+def downgrade_data_broker():
+    if not partitioning_supported():
+        return
+    conn = op.get_bind()
+    for table in STAGING_TABLES:
+        if not is_partitioned(table):
+            continue
+        default = '{}_default'.format(table)
+        op.execute('ALTER TABLE {} DETACH PARTITION {}'.format(table, default))
+        # The check would reject rows of submissions created since the upgrade
+        op.execute('ALTER TABLE {0} DROP CONSTRAINT IF EXISTS {0}_submission_id_check'.format(default))
+        op.execute('INSERT INTO {} SELECT * FROM {}'.format(default, table))
+        op.execute('DROP TABLE {} CASCADE'.format(table))
+        op.execute('ALTER TABLE {} RENAME TO {}'.format(default, table))
+        # The default partition kept its own copies of the parent's indexes
+        for index in sa.inspect(conn).get_indexes(table):
+            if index['name'].endswith('_default'):
+                op.execute('ALTER INDEX {} RENAME TO {}'.format(index['name'], index['name'][:-len('_default')]))
@@ -76,6 +76,24 @@ Index("ix_sf_133_tas",
   SF133.line,
   unique=True)
 
+class SubmissionSF133(Base):
+    """ SF-133 amounts for the TAS in a submission's appropriations and program activity files, for the
+    submission's period. Built before the SQL rules run, see SF133WorkingSet """
+    __tablename__ = "submission_sf_133"
+    # Rebuilt from sf_133 whenever a submission is validated, so the table is not written to the WAL
+    __table_args__ = {'prefixes': ['UNLOGGED']}
+    submission_sf_133_id = Column(Integer, primary_key=True)
+    submission_id = Column(Integer, nullable=False)
+    tas = Column(Text, nullable=False)
+    line = Column(Integer, nullable=False)
+    amount = Column(Numeric, nullable=False)
+
+Index("ix_submission_sf_133_submission_tas_line",
+  SubmissionSF133.submission_id,
+  SubmissionSF133.tas,
+  SubmissionSF133.line,
+  unique=True)
+
 class ProgramActivity(Base):
     __tablename__ = "program_activity"
     program_activity_id = Column(Integer, primary_key=True)
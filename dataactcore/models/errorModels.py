@@ -1,6 +1,6 @@
 """ These classes define the ORM models to be used by sqlalchemy for the error database """
 
-from sqlalchemy import Column, Integer, Text, ForeignKey
+from sqlalchemy import Column, Integer, Text, ForeignKey, Boolean, Index
 from sqlalchemy.orm import relationship
 from dataactcore.models.baseModel import Base
 
@@ -52,3 +52,42 @@ class ErrorMetadata(Base):
     original_rule_label = Column(Text, nullable=True)
     severity_id = Column(Integer, ForeignKey("rule_severity.rule_severity_id", name="fk_error_severity_id"))
     severity = relationship("RuleSeverity")
+
+class ErrorReport(Base):
+    """ An error or warning report whose rows are kept in row_error until the report is first requested """
+    __tablename__ = "error_report"
+
+    error_report_id = Column(Integer, primary_key=True)
+    job_id = Column(Integer, ForeignKey("job.job_id", ondelete="CASCADE", name="fk_error_report_job_id"))
+    # Name of the report file, without the folder, as returned by get_report_path and friends
+    report_name = Column(Text, nullable=False, unique=True)
+    severity_id = Column(Integer, ForeignKey("rule_severity.rule_severity_id", name="fk_error_report_severity_id"))
+    cross_file = Column(Boolean, nullable=False, default=False, server_default="False")
+    # True once the CSV has been written, it is then served as is until the job is validated again
+    materialized = Column(Boolean, nullable=False, default=False, server_default="False")
+
+class RowError(Base):
+    """ One row of an error or warning report """
+    __tablename__ = "row_error"
+
+    row_error_id = Column(Integer, primary_key=True)
+    error_report_id = Column(Integer, ForeignKey("error_report.error_report_id", ondelete="CASCADE",
+                                                 name="fk_row_error_report_id"), nullable=False, index=True)
+    job_id = Column(Integer, nullable=False)
+    severity_id = Column(Integer)
+    # Source and target file types are only set for cross-file errors
+    file_type_id = Column(Integer, nullable=True)
+    target_file_type_id = Column(Integer, nullable=True)
+    field_name = Column(Text)
+    error_message = Column(Text)
+    value_provided = Column(Text)
+    row_number = Column(Integer)
+    original_rule_label = Column(Text, nullable=True)
+
+# Supports paging through a job's errors by rule label and row
+Index("ix_row_error_job_rule_row",
+      RowError.job_id,
+      RowError.original_rule_label,
+      RowError.row_number,
+      RowError.row_error_id,
+      unique=False)
@@ -1,6 +1,6 @@
 """ These classes define the ORM models to be used by sqlalchemy for the job tracker database """
 
-from sqlalchemy import Column, Integer, Text, ForeignKey, Date, DateTime, Boolean
+from sqlalchemy import Column, Integer, Text, ForeignKey, Date, DateTime, Boolean, BigInteger, Float
 from sqlalchemy.orm import relationship
 from dataactcore.models.baseModel import Base
 
@@ -85,6 +85,42 @@ class Job(Base):
     error_message = Column(Text)
     start_date = Column(Date)
     end_date = Column(Date)
+    # For csv_record_validation jobs, when the file was last loaded into staging. For validation jobs,
+    # when the last successful cross-file run started, None if every file pair must be checked again
+    last_validated = Column(DateTime, nullable=True)
+
+class ValidationCache(Base):
+    """ Results of a completed file validation, reused when an identical file is validated under the same rules """
+    __tablename__ = "validation_cache"
+
+    validation_cache_id = Column(Integer, primary_key=True)
+    # Hash of the file's contents, file type, schema and rule versions and reporting period
+    cache_key = Column(Text, nullable=False, index=True)
+    # Job whose staging rows and reports hold the results
+    job_id = Column(Integer, ForeignKey("job.job_id", ondelete="CASCADE", name="fk_validation_cache_job_id"),
+                    nullable=False, unique=True)
+    job = relationship("Job", uselist=False)
+    file_size = Column(Integer)
+    number_of_rows = Column(Integer)
+    number_of_rows_valid = Column(Integer)
+    # JSON list of the job's error_metadata rows
+    error_metadata = Column(Text)
+
+class JobPhaseTiming(Base):
+    """ Time spent in one phase of a validation job """
+    __tablename__ = "job_phase_timing"
+
+    job_phase_timing_id = Column(Integer, primary_key=True)
+    job_id = Column(Integer, ForeignKey("job.job_id", ondelete="CASCADE", name="fk_job_phase_timing_job_id"),
+                    nullable=False, index=True)
+    job = relationship("Job", uselist=False)
+    phase = Column(Text, nullable=False)
+    wall_seconds = Column(Float)
+    # CPU time of the whole validator process, including its S3 and database threads
+    cpu_seconds = Column(Float)
+    rows = Column(Integer)
+    bytes_read = Column(BigInteger)
+    rows_per_second = Column(Float)
 
 class JobDependency(Base):
     __tablename__ = "job_dependency"
@@ -104,6 +140,8 @@ class FileType(Base):
     description = Column(Text)
     letter_name = Column(Text)
     file_order = Column(Integer)
+    # Bumped whenever the file_columns for this file type are reloaded
+    schema_version = Column(Integer, nullable=False, default=0, server_default='0')
 
 class FileGenerationTask(Base):
     __tablename__ = "file_generation_task"
@@ -103,3 +103,4 @@ RULE_SEVERITY = [
     LookupType(2, 'fatal', 'fatal error')
 ]
 RULE_SEVERITY_DICT = {item.name: item.id for item in RULE_SEVERITY}
+RULE_SEVERITY_DICT_ID = {item.id: item.name for item in RULE_SEVERITY}
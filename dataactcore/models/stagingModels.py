@@ -4,19 +4,24 @@ from dataactcore.models.baseModel import Base
 
 def concatTas(context):
     """Create a concatenated TAS string for insert into database."""
-    tas1 = context.current_parameters['allocation_transfer_agency']
+    return concatTasDict(context.current_parameters)
+
+
+def concatTasDict(data):
+    """Create a concatenated TAS string from a dict of TAS components."""
+    tas1 = data.get('allocation_transfer_agency')
     tas1 = tas1 if tas1 else '000'
-    tas2 = context.current_parameters['agency_identifier']
+    tas2 = data.get('agency_identifier')
     tas2 = tas2 if tas2 else '000'
-    tas3 = context.current_parameters['beginning_period_of_availa']
+    tas3 = data.get('beginning_period_of_availa')
     tas3 = tas3 if tas3 else '0000'
-    tas4 = context.current_parameters['ending_period_of_availabil']
+    tas4 = data.get('ending_period_of_availabil')
     tas4 = tas4 if tas4 else '0000'
-    tas5 = context.current_parameters['availability_type_code']
+    tas5 = data.get('availability_type_code')
     tas5 = tas5 if tas5 else ' '
-    tas6 = context.current_parameters['main_account_code']
+    tas6 = data.get('main_account_code')
     tas6 = tas6 if tas6 else '0000'
-    tas7 = context.current_parameters['sub_account_code']
+    tas7 = data.get('sub_account_code')
     tas7 = tas7 if tas7 else '000'
     tas = '{}{}{}{}{}{}{}'.format(tas1, tas2, tas3, tas4, tas5, tas6, tas7)
     return tas
@@ -58,6 +63,12 @@ class Appropriation(Base):
         cleanKwargs = {k: v for k, v in kwargs.items() if hasattr(self, k)}
         super(Appropriation, self).__init__(**cleanKwargs)
 
+# Rules are scoped to a submission, so indexes for their joins lead with submission_id
+Index("ix_appropriation_submission_tas",
+      Appropriation.submission_id,
+      Appropriation.tas,
+      unique=False)
+
 class ObjectClassProgramActivity(Base):
     """Model for the object_class_program_activity table."""
     __tablename__ = "object_class_program_activity"
@@ -123,6 +134,13 @@ Index("ix_oc_pa_tas_oc_pa",
       ObjectClassProgramActivity.program_activity_code,
       unique=False)
 
+Index("ix_oc_pa_submission_tas_oc_pa",
+      ObjectClassProgramActivity.submission_id,
+      ObjectClassProgramActivity.tas,
+      ObjectClassProgramActivity.object_class,
+      ObjectClassProgramActivity.program_activity_code,
+      unique=False)
+
 class AwardFinancial(Base):
     """Corresponds to entries in File C"""
     __tablename__ = "award_financial"
@@ -193,6 +211,28 @@ Index("ix_award_financial_tas_oc_pa",
       AwardFinancial.program_activity_code,
       unique=False)
 
+Index("ix_award_financial_submission_tas_oc_pa",
+      AwardFinancial.submission_id,
+      AwardFinancial.tas,
+      AwardFinancial.object_class,
+      AwardFinancial.program_activity_code,
+      unique=False)
+
+Index("ix_award_financial_submission_piid",
+      AwardFinancial.submission_id,
+      AwardFinancial.piid,
+      unique=False)
+
+Index("ix_award_financial_submission_fain",
+      AwardFinancial.submission_id,
+      AwardFinancial.fain,
+      unique=False)
+
+Index("ix_award_financial_submission_uri",
+      AwardFinancial.submission_id,
+      AwardFinancial.uri,
+      unique=False)
+
 class AwardFinancialAssistance(Base):
     """Model for D2-Award (Financial Assistance)."""
     __tablename__ = "award_financial_assistance"
@@ -268,6 +308,16 @@ class AwardFinancialAssistance(Base):
         cleanKwargs = {k: v for k, v in kwargs.items() if hasattr(self, k)}
         super(AwardFinancialAssistance, self).__init__(**cleanKwargs)
 
+Index("ix_award_financial_assistance_submission_fain",
+      AwardFinancialAssistance.submission_id,
+      AwardFinancialAssistance.fain,
+      unique=False)
+
+Index("ix_award_financial_assistance_submission_uri",
+      AwardFinancialAssistance.submission_id,
+      AwardFinancialAssistance.uri,
+      unique=False)
+
 class AwardProcurement(Base):
     """Model for D1-Award (Procurement)."""
     __tablename__ = "award_procurement"
@@ -474,3 +524,8 @@ class AwardProcurement(Base):
         # so get rid of any extraneous kwargs before instantiating
         cleanKwargs = {k: v for k, v in kwargs.items() if hasattr(self, k)}
         super(AwardProcurement, self).__init__(**cleanKwargs)
+
+Index("ix_award_procurement_submission_piid",
+      AwardProcurement.submission_id,
+      AwardProcurement.piid,
+      unique=False)
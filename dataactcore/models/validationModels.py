@@ -1,6 +1,6 @@
 """ These classes define the ORM models to be used by sqlalchemy for the job tracker database """
 
-from sqlalchemy import Column, Integer, Text, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, Text, ForeignKey, Boolean, Float, Index
 from sqlalchemy.orm import relationship
 from dataactcore.models.baseModel import Base
 
@@ -53,3 +53,21 @@ class RuleSql(Base):
     target_file_id = Column(Integer, ForeignKey("file_type.file_type_id", name="fk_target_file"), nullable=True)
     target_file = relationship("FileType", uselist=False, foreign_keys=[target_file_id])
     query_name = Column(Text)
+
+class RuleExecutionStats(Base):
+    """ Time taken and failures found by one run of a SQL rule against a submission """
+    __tablename__ = "rule_execution_stats"
+
+    rule_execution_stats_id = Column(Integer, primary_key=True)
+    # Not a foreign key, rule_sql is reloaded whenever the rules change
+    rule_sql_id = Column(Integer)
+    rule_label = Column(Text)
+    query_name = Column(Text)
+    submission_id = Column(Integer)
+    file_type_id = Column(Integer)
+    target_file_type_id = Column(Integer)
+    staging_row_count = Column(Integer)
+    failure_count = Column(Integer)
+    elapsed_seconds = Column(Float)
+
+    __table_args__ = (Index("ix_rule_execution_stats_query_created", "query_name", "created_at"),)
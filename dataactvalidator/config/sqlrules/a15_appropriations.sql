@@ -3,10 +3,8 @@ SELECT
     approp.unobligated_balance_cpe,
     sf.amount as sf_133_amount
 FROM appropriation as approp
-    INNER JOIN sf_133 as sf ON approp.tas = sf.tas
-    INNER JOIN submission as sub ON approp.submission_id = sub.submission_id AND
-        sf.period = sub.reporting_fiscal_period AND
-        sf.fiscal_year = sub.reporting_fiscal_year
+    INNER JOIN submission_sf_133 as sf ON approp.submission_id = sf.submission_id AND
+        approp.tas = sf.tas
 WHERE approp.submission_id = {} AND
     sf.line = 2490 AND
     approp.unobligated_balance_cpe <> sf.amount
\ No newline at end of file
@@ -4,10 +4,8 @@ SELECT DISTINCT
     string_agg(CAST(sf.line AS varchar), ', ') AS lines,
     string_agg(CAST(sf.amount AS varchar), ', ') AS amounts
 FROM appropriation AS approp
-    INNER JOIN sf_133 AS sf ON approp.tas = sf.tas
-    INNER JOIN submission AS sub ON approp.submission_id = sub.submission_id
-        AND sf.period = sub.reporting_fiscal_period
-        AND sf.fiscal_year = sub.reporting_fiscal_year
+    INNER JOIN submission_sf_133 AS sf ON approp.submission_id = sf.submission_id
+        AND approp.tas = sf.tas
 WHERE approp.submission_id = {}
     AND sf.line IN (1750, 1850)
     AND sf.amount > 0
@@ -7,15 +7,12 @@ SELECT DISTINCT approp.row_number,
 	approp.main_account_code,
 	approp.sub_account_code
 FROM appropriation AS approp
-	JOIN submission AS sub
-	    ON approp.submission_id = sub.submission_id
 WHERE approp.submission_id = {0}
 	AND NOT EXISTS (
 		SELECT 1
-		FROM sf_133 AS sf
+		FROM submission_sf_133 AS sf
         WHERE approp.tas IS NOT DISTINCT FROM sf.tas
-            AND sf.period = sub.reporting_fiscal_period
-	        AND sf.fiscal_year = sub.reporting_fiscal_year
+            AND sf.submission_id = approp.submission_id
 	)
     AND (
         COALESCE(approp.adjustments_to_unobligated_cpe,0) <> 0
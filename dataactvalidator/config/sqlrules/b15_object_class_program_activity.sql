@@ -16,10 +16,8 @@ SELECT
     SUM(op.ussgl498200_upward_adjustm_cpe) as ussgl498200_upward_adjustm_cpe_sum,
     sf.amount as sf_133_amount
 FROM object_class_program_activity as op
-    INNER JOIN sf_133 as sf ON op.tas = sf.tas
-    INNER JOIN submission as sub ON op.submission_id = sub.submission_id AND
-        sf.period = sub.reporting_fiscal_period AND
-        sf.fiscal_year = sub.reporting_fiscal_year
+    INNER JOIN submission_sf_133 as sf ON op.submission_id = sf.submission_id AND
+        op.tas = sf.tas
 WHERE op.submission_id = {} AND sf.line = 2104 AND
     LOWER(op.by_direct_reimbursable_fun) = 'r'
 GROUP BY op.tas, sf.amount
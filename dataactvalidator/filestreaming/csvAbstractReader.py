@@ -1,4 +1,8 @@
 import csv
+import itertools
+import os
+import re
+
 from dataactcore.config import CONFIG_BROKER
 from dataactcore.utils.statusCode import StatusCode
 from dataactcore.utils.responseException import ResponseException
@@ -14,7 +18,11 @@ class CsvAbstractReader(object):
     """
 
     BUFFER_SIZE = 8192
+    # A line with its ending, only '\r' and '\n' are treated as line breaks
+    LINE_PATTERN = re.compile(r'[^\r\n]*(?:\r\n|\r|\n)|[^\r\n]+')
     header_report_headers = ["Error type", "Header name"]
+    # Bytes of the file read so far
+    bytes_read = 0
 
     def open_file(self, region, bucket, filename, csv_schema, bucket_name, error_filename, long_to_short_dict):
         """ Opens file and prepares to read each record, mapping entries to specified column names
@@ -29,18 +37,18 @@ class CsvAbstractReader(object):
         """
 
         self.filename = filename
-        self.unprocessed = ''
         self.extra_line = False
-        self.lines = []
         self.header_dictionary = {}
         self.packet_counter = 0
+        self.bytes_read = 0
         current = 0
         self.is_finished= False
         self.column_count = 0
-        line = self._get_line()
+        self.lines = self._line_stream()
+        line = self._get_header_line()
         # make sure we have not finished reading the file
 
-        if self.is_finished:
+        if line is None:
             # Write header error for no header row
             with self.get_writer(bucket_name, error_filename, ["Error Type"], self.is_local) as writer:
                 writer.write(["No header row"])
@@ -103,6 +111,9 @@ class CsvAbstractReader(object):
                     current += 1
 
         self.column_count = current
+        # (position, short name) pairs for the columns we keep, unknown columns are skipped
+        self.header_columns = [(position, name) for position, name in sorted(self.header_dictionary.items())
+                               if name is not None]
 
         #Check that all required fields exists
         missing_headers = []
@@ -132,18 +143,31 @@ class CsvAbstractReader(object):
                 writer.finishBatch()
             raise ResponseException("Errors in header row: " + str(error_string), StatusCode.CLIENT_ERROR, ValueError,ValidationError.headerError,**extra_info)
 
+        self.header_line = line
+        # Lines of the record read ahead are kept, so split_records can write it out as submitted
+        self.lookahead_lines = []
+        # A single csv.reader consumes the rest of the stream, so quoted newlines are handled across packets
+        self.records = self._record_stream(
+            csv.reader(self._lookahead_line_stream(), dialect='excel', delimiter=self.delimiter))
+        self.next_row = next(self.records, None)
+        self.is_finished = self.next_row is None
+        # Stop keeping lines, the rest of the file is only read once
+        self.next_row_lines, self.lookahead_lines = self.lookahead_lines, None
+
         return long_headers
 
     @staticmethod
     def get_writer(bucket_name, filename, header, is_local, region = None):
         """
         Gets the write type based on if its a local install or not.
+        Header errors go to the error report, so they are compressed the same way.
         """
+        compress = bool(CONFIG_BROKER.get('gzip_reports'))
         if is_local:
-            return CsvLocalWriter(filename, header)
+            return CsvLocalWriter(filename, header, compress)
         if region is None:
             region = CONFIG_BROKER["aws_region"]
-        return CsvS3Writer(region, bucket_name, filename, header)
+        return CsvS3Writer(region, bucket_name, filename, header, compress)
 
     def get_next_record(self):
         """
@@ -151,25 +175,92 @@ class CsvAbstractReader(object):
         Returns:
             dictionary representing this record
         """
-        return_dict = {}
-        line = self._get_line()
+        row = self.next_row
+        if row is None:
+            # Nothing left but trailing line breaks
+            self.is_finished = True
+            self.extra_line = True
+            raise ResponseException("Wrong number of fields in this row", StatusCode.CLIENT_ERROR, ValueError, ValidationError.readError)
 
-        for row in csv.reader([line], dialect='excel', delimiter=self.delimiter):
-            if len(row) != self.column_count:
-                raise ResponseException("Wrong number of fields in this row", StatusCode.CLIENT_ERROR, ValueError, ValidationError.readError)
-            for current, cell in enumerate(row):
-                if current >= self.column_count:
-                    raise ResponseException("Record contains too many fields",StatusCode.CLIENT_ERROR,ValueError,ValidationError.readError)
-                if cell == "":
-                    # Use None instead of empty strings for sqlalchemy
-                    cell = None
-                # self.header_dictionary uses the short, machine-readable column names
-                if self.header_dictionary[current] is None:
-                    # Skip this column as it is unknown
-                    continue
-                else:
-                    return_dict[self.header_dictionary[current]] = cell
-        return return_dict
+        # Look ahead so is_finished is set as soon as the last record has been returned
+        self.next_row = next(self.records, None)
+        self.is_finished = self.next_row is None
+
+        if len(row) != self.column_count:
+            raise ResponseException("Wrong number of fields in this row", StatusCode.CLIENT_ERROR, ValueError, ValidationError.readError)
+        # self.header_dictionary uses the short, machine-readable column names
+        # Use None instead of empty strings for sqlalchemy
+        return {name: row[position] or None for position, name in self.header_columns}
+
+    def open_stream(self, region, bucket, filename):
+        """ Opens the file without reading the header, so it can be split with split_records
+
+        Args:
+            region: AWS region where the bucket is located (not used if instantiated as CsvLocalReader)
+            bucket: the S3 Bucket (not used if instantiated as CsvLocalReader)
+            filename: The file path for the CSV file
+        """
+        raise NotImplementedError("Do not instantiate csvAbstractReader directly.")
+
+    def split_records(self, directory, rows_per_segment):
+        """ Split a file into local segment files of whole records
+
+        Each segment starts with the header line, so it can be read on its own by a
+        CsvLocalReader. A record ends at a line break outside double quotes, so quoted
+        line breaks never split a record. Blank lines between records are dropped, as
+        the reader skips them without counting a row.
+
+        A file opened with open_file is split from the first record on, continuing the
+        stream its header was read from, so the file is only read once. Its records are
+        then all in the segments, and get_next_record has none left to return.
+
+        Args:
+            directory: Local directory to write segment files to
+            rows_per_segment: Number of records to write to each segment
+
+        Returns:
+            List of (segment filename, number of records) tuples in file order
+        """
+        if hasattr(self, 'records'):
+            header = self.header_line
+            lines = itertools.chain(self.next_row_lines, self.lines)
+            self.next_row = None
+            self.is_finished = True
+        else:
+            self.packet_counter = 0
+            self.bytes_read = 0
+            self.lines = self._line_stream()
+            header = self._get_header_line()
+            lines = self.lines
+        segments = []
+        if header is None:
+            return segments
+
+        segment = None
+        rows = 0
+        in_quotes = False
+        for line in lines:
+            if not in_quotes and not line.strip('\r\n'):
+                continue
+            if segment is None:
+                path = os.path.join(directory, "segment_{}.csv".format(len(segments)))
+                segment = open(path, "w", newline="")
+                segment.write(header + "\n")
+                rows = 0
+            segment.write(line)
+            if line.count('"') % 2:
+                in_quotes = not in_quotes
+            if not in_quotes:
+                rows += 1
+                if rows >= rows_per_segment:
+                    segment.close()
+                    segments.append((path, rows))
+                    segment = None
+        if segment is not None:
+            segment.close()
+            # A record with an unclosed quote runs to the end of the file
+            segments.append((path, rows + 1 if in_quotes else rows))
+        return segments
 
     def close(self):
         """
@@ -189,73 +280,67 @@ class CsvAbstractReader(object):
         """
         raise NotImplementedError("Do not instantiate csvAbstractReader directly.")
 
-    def _get_line(self):
+    def _packet_stream(self):
         """
-        This method reads 8192 bytes from S3 Bucket at a time and stores
-        it in a line buffer. The line buffer is used until its empty then
-        another request is created to S3 for more data.
+        Generator of text packets from the file, ending when the file is exhausted
         """
-        if len(self.lines) > 0:
-            #Get the next line
-            return self.lines.pop(0)
-        #packets are 8192 bytes in size
-        #for packet in self.s3File :
-        while self.packet_counter *  CsvAbstractReader.BUFFER_SIZE <=  self._get_file_size():
-
-            success,packet =  self._get_next_packet()
+        while True:
+            success, packet = self._get_next_packet()
             if not success:
                 break
-            self.packet_counter +=1
-
-            #Get the current lines
-            current_bytes = self.unprocessed + packet
-            self.lines = self._split_lines(current_bytes)
+            self.packet_counter += 1
+            yield packet
 
-            #edge case if the packet was filled with newlines only try again
-            if len(self.lines) ==0:
-                continue
-
-            #last line still needs processing save and reuse
-            self.unprocessed = self.lines.pop()
-            if len(self.lines) > 0:
-                #Get the next line
-                return  self.lines.pop(0)
-        self.is_finished = True
-
-        if len(self.unprocessed) < 5:
-            # Got an extra line from a line break on the last line
-            self.extra_line = True
-        return self.unprocessed
+    def _line_stream(self):
+        """
+        Generator of lines from the file with their line endings kept, so a csv.reader can
+        join quoted fields that span lines. A line ending in a carriage return at the end of
+        a packet is held back, so a CRLF split across packets is not read as two line breaks.
+        """
+        unprocessed = ''
+        for packet in self._packet_stream():
+            unprocessed += packet
+            lines = self.LINE_PATTERN.findall(unprocessed)
+            tail = ''
+            if lines and (lines[-1][-1] not in '\r\n' or unprocessed.endswith('\r')):
+                # Last line is incomplete, or may be followed by the '\n' of a '\r\n' in the next packet
+                tail = lines.pop()
+            for line in lines:
+                yield line
+            unprocessed = tail
+        if unprocessed:
+            yield unprocessed
+
+    def _lookahead_line_stream(self):
+        """
+        Generator of lines from the file that keeps the lines read while lookahead_lines is a list
+        """
+        for line in self.lines:
+            if self.lookahead_lines is not None:
+                self.lookahead_lines.append(line)
+            yield line
 
+    def _get_header_line(self):
+        """
+        Returns the first non-blank line of the file without its line ending,
+        or None if the file has no content
+        """
+        header = ''
+        for line in self.lines:
+            header += line
+            if not header.strip('\r\n'):
+                # Skip blank lines before the header
+                header = ''
+            elif header.count('"') % 2 == 0:
+                # Header is complete unless a quoted value spans lines
+                return header.rstrip('\r\n')
+        return header.rstrip('\r\n') or None
 
-    def _split_lines(self, packet) :
+    @staticmethod
+    def _record_stream(reader):
         """
-        arguments :
-        packet unprocessed string of CSV data
-        returns a list of strings broken by newline
+        Generator of rows from the csv reader, skipping blank lines
         """
-        lines_to_return = []
-        escape_mode =  False
-        current = ""
-
-        for index,char in enumerate(packet):
-            if not escape_mode:
-                if char =='\r' or char =='\n' or char =='\r\n':
-                    if len(current) >0:
-                        lines_to_return.append(current)
-                        #check the last char if its a new line add extra line
-                        # as its at the end of the packet
-                    if index == len(packet)-1:
-                        lines_to_return.append("")
-                    current = ""
-                else:
-                  current = "".join([current,char])
-                  if char == '"':
-                        escape_mode = True
-            else :
-                if char == '"':
-                    escape_mode = False
-                current = "".join([current,char])
-        if len(current)>0:
-            lines_to_return.append(current)
-        return lines_to_return
+        for row in reader:
+            if row:
+                yield row
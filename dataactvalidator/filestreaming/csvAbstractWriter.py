@@ -21,33 +21,36 @@ class CsvAbstractWriter(object):
 
         """
         self.rows = []
+        # One buffer and formatter are reused for every batch
+        self.ioStream = io.StringIO()
+        self.csvFormatter = csv.writer(self.ioStream)
         self.write(header)
 
     def write(self,dataList) :
         """
 
         args
-        dataList - list of strings to be written to a file system.
+        dataList - list of values to be written to a file system, None is written as an empty string.
         Adds a row of csv into the S3 stream
 
         """
-        strList = []
-        for data in dataList:
-            if data is None:
-                data = ""
-            strList.append(str(data))
-        self.rows.append(strList)
+        # csv.writer writes None as an empty string and str() of anything else
+        self.rows.append(dataList)
         if(len(self.rows) > self.BATCH_SIZE):
             self.finishBatch()
 
     def finishBatch(self):
         """ Write the last unfinished batch """
-        ioStream = io.StringIO()
-        csvFormatter = csv.writer(ioStream)
-        csvFormatter.writerows(self.rows)
-        self._write(ioStream.getvalue())
+        self.csvFormatter.writerows(self.rows)
+        self._write(self.ioStream.getvalue())
+        self.ioStream.seek(0)
+        self.ioStream.truncate()
         self.rows = []
 
+    def flush(self):
+        """ Write the unfinished batch, once this returns everything written so far has been handed to the file """
+        self.finishBatch()
+
     def _write(self,data):
         """
 
@@ -17,14 +17,24 @@ class CsvLocalReader(CsvAbstractReader):
             error_filename: filename for error report
             long_to_short_dict: mapping of long to short schema column names
         """
+        self.open_stream(region, bucket, filename)
+        super(CsvLocalReader,self).open_file(
+            region, bucket, filename, csv_schema, bucket_name, error_filename, long_to_short_dict)
+
+    def open_stream(self, region, bucket, filename):
+        """ Opens the file without reading the header
+
+        Args:
+            region: Not used, included here to match signature of CsvAbstractReader.open_stream
+            bucket: Not used, included here to match signature of CsvAbstractReader.open_stream
+            filename: The file path for the CSV file
+        """
         self.filename = filename
         self.is_local = True
         try:
             self.file = open(filename,"r")
         except :
             raise ValueError("".join(["Filename provided not found : ", str(self.filename)]))
-        super(CsvLocalReader,self).open_file(
-            region, bucket, filename, csv_schema, bucket_name, error_filename, long_to_short_dict)
 
     def close(self):
         """Closes file if it exists """
@@ -44,7 +54,9 @@ class CsvLocalReader(CsvAbstractReader):
         """
         Gets the next packet from the file returns true if successful
         """
-        packet  = self.file.read(CsvAbstractReader.BUFFER_SIZE)
+        packet  = self.file.read(self.BUFFER_SIZE)
+        # Position in the underlying binary file, newline translation changes the length of the text
+        self.bytes_read = self.file.buffer.tell()
         success = True
         if packet == "":
             success = False
@@ -1,3 +1,5 @@
+import gzip
+
 from dataactvalidator.filestreaming.csvAbstractWriter import CsvAbstractWriter
 
 
@@ -7,7 +9,7 @@ class CsvLocalWriter(CsvAbstractWriter):
     use with the "with" python construct
     """
 
-    def __init__(self,filename,header) :
+    def __init__(self,filename,header,compress=False) :
         """
 
         args
@@ -15,9 +17,13 @@ class CsvLocalWriter(CsvAbstractWriter):
         bucket - the string name of the S3 bucket
         filename - string filename and path in the S3 bucket
         header - list of strings for the header
+        compress - True to write the file gzip compressed, under the same name
 
         """
-        self.stream = open(filename,"w", newline = '')
+        if compress:
+            self.stream = gzip.open(filename, "wt", newline='', encoding="utf-8")
+        else:
+            self.stream = open(filename,"w", newline = '')
         super(CsvLocalWriter,self).__init__(filename,header)
 
 
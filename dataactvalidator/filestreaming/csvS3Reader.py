@@ -1,4 +1,9 @@
+import codecs
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 import boto
+from dataactcore.config import CONFIG_BROKER
 from dataactvalidator.filestreaming.csvAbstractReader import CsvAbstractReader
 
 
@@ -7,6 +12,11 @@ class CsvS3Reader(CsvAbstractReader):
     Reads data from S3 CSV file
     """
 
+    # Files are read in large ranged requests, with the next blocks fetched
+    # on background threads while the current block is being validated
+    BUFFER_SIZE = 16 * 1024 ** 2
+    PREFETCH_BLOCKS = 2
+
     def initialize_file(self, region, bucket, filename):
         """Returns an S3 filename."""
         s3connection = boto.s3.connect_to_region(region)
@@ -28,15 +38,43 @@ class CsvS3Reader(CsvAbstractReader):
             filename: The file path for the CSV file in S3
         Returns:
         """
-        self.s3_file = self.initialize_file(region, bucket, filename)
-        self.is_local = False
+        self.open_stream(region, bucket, filename)
 
         super(CsvS3Reader, self).open_file(
             region, bucket, filename, csv_schema, bucket_name, error_filename, long_to_short_dict)
 
+    def open_stream(self, region, bucket, filename):
+        """ Opens the file without reading the header
+
+        Args:
+            region: AWS region where the bucket is located
+            bucket: the S3 Bucket
+            filename: The file path for the CSV file in S3
+        """
+        self.s3_file = self.initialize_file(region, bucket, filename)
+        self.is_local = False
+        self.start_prefetch()
+
+    def start_prefetch(self):
+        """ Set up block sizes and the thread pool used to fetch blocks ahead of the reader """
+        self.BUFFER_SIZE = int(CONFIG_BROKER.get('s3_read_block_size') or self.BUFFER_SIZE)
+        prefetch_blocks = CONFIG_BROKER.get('s3_prefetch_blocks')
+        # 0 turns prefetching off, each block is then fetched when the reader gets to it
+        self.prefetch_blocks = self.PREFETCH_BLOCKS if prefetch_blocks is None else int(prefetch_blocks)
+        # Ranged requests can split a multi-byte character, so decode incrementally
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.executor = ThreadPoolExecutor(max_workers=max(1, self.prefetch_blocks))
+        # Requested blocks in file order, at most prefetch_blocks + 1 are held in memory
+        self.pending_blocks = deque()
+        self.next_offset = 0
+
     def close(self):
-        """ Don't need to close file when streaming from S3 """
-        pass
+        """ Stop any background block fetches, the S3 file itself does not need to be closed """
+        pending_blocks = getattr(self, 'pending_blocks', [])
+        for block in pending_blocks:
+            block.cancel()
+        if hasattr(self, 'executor'):
+            self.executor.shutdown(wait=False)
 
     def _get_file_size(self):
         """
@@ -44,15 +82,32 @@ class CsvS3Reader(CsvAbstractReader):
         """
         return self.s3_file.size
 
+    def _fetch_block(self, offset):
+        """ Fetch one block of the file, runs on a background thread
+
+        Args:
+            offset: Byte offset of the start of the block
+
+        Returns:
+            Bytes in the block
+        """
+        # Each request gets its own key object, boto keys hold per-request state
+        s3_key = self.s3_file.bucket.new_key(self.s3_file.name)
+        header = {'Range': 'bytes={}-{}'.format(offset, offset + self.BUFFER_SIZE - 1)}
+        return s3_key.get_contents_as_string(headers=header)
+
     def _get_next_packet(self):
         """
         Gets the next packet from the file returns true if successful
         """
-        offset_check = self.packet_counter * CsvAbstractReader.BUFFER_SIZE
-        header = {'Range': 'bytes={}-{}'.format(
-            offset_check, offset_check + CsvAbstractReader.BUFFER_SIZE - 1)}
-        try:
-            packet = self.s3_file.get_contents_as_string(headers=header, encoding='utf-8')
-            return True, packet
-        except:
+        file_size = self._get_file_size()
+        while len(self.pending_blocks) <= self.prefetch_blocks and self.next_offset < file_size:
+            self.pending_blocks.append(self.executor.submit(self._fetch_block, self.next_offset))
+            self.next_offset += self.BUFFER_SIZE
+
+        if not self.pending_blocks:
             return False, ""
+        packet = self.pending_blocks.popleft().result()
+        self.bytes_read += len(packet)
+        final = not self.pending_blocks and self.next_offset >= file_size
+        return True, self.decoder.decode(packet, final)
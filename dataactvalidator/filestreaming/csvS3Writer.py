@@ -1,5 +1,10 @@
+import io
+import queue
+import threading
+import zlib
+
 import boto
-import smart_open
+from dataactcore.config import CONFIG_BROKER
 from dataactvalidator.filestreaming.csvAbstractWriter import CsvAbstractWriter
 
 
@@ -7,8 +12,20 @@ class CsvS3Writer(CsvAbstractWriter):
     """
     Writes a CSV to an S3 Bucket in a steaming manner
     use with the "with" python construct
+
+    Output is encoded into one reusable part buffer. Each full part is handed
+    to a background thread that uploads it as part of a multipart upload, so
+    validation carries on while parts are sent. A file smaller than one part
+    is uploaded as a single object when the writer is closed.
+
+    Compressed files are stored with a gzip Content-Encoding, so browsers
+    following a signed URL decompress them transparently.
     """
-    def __init__(self,region,bucket,filename,header) :
+
+    # Parts waiting for the uploader thread, writes block once this many are queued
+    QUEUE_DEPTH = 2
+
+    def __init__(self,region,bucket,filename,header,compress=False) :
         """
 
         args
@@ -16,10 +33,24 @@ class CsvS3Writer(CsvAbstractWriter):
         bucket - the string name of the S3 bucket
         filename - string filename and path in the S3 bucket
         header - list of strings for the header
+        compress - True to store the file gzip compressed, under the same name
 
         """
-        conn = boto.s3.connect_to_region(region).get_bucket(bucket).new_key(filename)
-        self.stream = smart_open.smart_open(conn, 'w', min_part_size=CsvAbstractWriter.BUFFER_SIZE)
+        self.bucket = boto.s3.connect_to_region(region).get_bucket(bucket)
+        self.filename = filename
+        self.headers = {"Content-Type": "text/csv"}
+        self.compressor = None
+        if compress:
+            self.headers["Content-Encoding"] = "gzip"
+            # wbits of 16 + MAX_WBITS writes a gzip header and trailer
+            self.compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        self.part = bytearray()
+        self.part_number = 0
+        self.multipart = None
+        self.upload_error = None
+        self.parts = queue.Queue(maxsize=int(CONFIG_BROKER.get('s3_upload_queue_depth') or self.QUEUE_DEPTH))
+        self.uploader = threading.Thread(target=self._upload_parts, daemon=True)
+        self.uploader.start()
         super(CsvS3Writer,self).__init__(filename,header)
 
 
@@ -31,7 +62,48 @@ class CsvS3Writer(CsvAbstractWriter):
         data -  (string) a string be written to the current file
 
         """
-        self.stream.write(data)
+        data = data.encode("utf-8")
+        if self.compressor is not None:
+            data = self.compressor.compress(data)
+        self.part.extend(data)
+        if len(self.part) >= self.BUFFER_SIZE:
+            self._queue_part()
+
+    def _queue_part(self):
+        """ Hand the current part to the uploader thread and start a new one """
+        self._check_upload()
+        self.part_number += 1
+        self.parts.put((self.part_number, bytes(self.part)))
+        del self.part[:]
+
+    def _upload_parts(self):
+        """ Upload queued parts in order until the end marker, runs on the uploader thread """
+        while True:
+            item = self.parts.get()
+            try:
+                if item is None:
+                    break
+                if self.upload_error is None:
+                    part_number, data = item
+                    if self.multipart is None:
+                        self.multipart = self.bucket.initiate_multipart_upload(self.filename, headers=self.headers)
+                    self.multipart.upload_part_from_file(io.BytesIO(data), part_number)
+            except Exception as e:
+                # Keep draining the queue so the writer never blocks, the error is raised on the writer's thread
+                self.upload_error = e
+            finally:
+                self.parts.task_done()
+
+    def _check_upload(self):
+        """ Raise any error from the uploader thread """
+        if self.upload_error is not None:
+            raise self.upload_error
+
+    def flush(self):
+        """ Write the unfinished batch and wait until every full part has been uploaded """
+        self.finishBatch()
+        self.parts.join()
+        self._check_upload()
 
 
     def __exit__(self, type, value, traceback) :
@@ -42,8 +114,25 @@ class CsvS3Writer(CsvAbstractWriter):
         value - the value of the error
         traceback - the traceback of the error
 
-        This function calls the smart open exit in the
-        'with' block
+        This function waits for the uploader thread and finishes
+        the upload, or abandons it if the 'with' block failed
 
         """
-        self.stream.__exit__(type, value, traceback)
+        if type is None and self.compressor is not None:
+            self.part.extend(self.compressor.flush())
+        if type is None and self.upload_error is None and self.part_number and self.part:
+            # The last part of a multipart upload may be smaller than BUFFER_SIZE
+            self._queue_part()
+        self.parts.put(None)
+        self.uploader.join()
+
+        if type is not None or self.upload_error is not None:
+            if self.multipart is not None:
+                self.multipart.cancel_upload()
+            if type is None:
+                raise self.upload_error
+        elif self.multipart is not None:
+            self.multipart.complete_upload()
+        else:
+            # Small enough for a single request
+            self.bucket.new_key(self.filename).set_contents_from_string(bytes(self.part), headers=self.headers)
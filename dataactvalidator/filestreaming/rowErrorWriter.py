@@ -0,0 +1,206 @@
+import os
+import sys
+from datetime import datetime
+
+from sqlalchemy import text
+
+from dataactcore.config import CONFIG_BROKER
+from dataactcore.interfaces.db import GlobalDB
+from dataactcore.models.errorModels import ErrorReport, RowError
+from dataactcore.models.lookups import FILE_TYPE_DICT, FILE_TYPE_DICT_ID
+from dataactvalidator.filestreaming.csvAbstractWriter import CsvAbstractWriter
+from dataactvalidator.filestreaming.csvLocalWriter import CsvLocalWriter
+from dataactvalidator.filestreaming.csvS3Writer import CsvS3Writer
+
+
+REPORT_HEADERS = ["Field name", "Error message", "Row number", "Value provided", "Rule label"]
+CROSS_FILE_REPORT_HEADERS = ["Source File", "Target File", "Field names", "Error message", "Values provided",
+                             "Row number", "Rule label"]
+
+
+class RowErrorWriter(CsvAbstractWriter):
+    """
+    Stores the rows of an error or warning report in the row_error table,
+    use with the "with" python construct. Given a csv_writer, rows are also
+    written to the CSV as they arrive, otherwise the CSV is written by
+    materializeReports when the report is first requested.
+    """
+
+    BATCH_SIZE = 1000
+
+    def __init__(self, engine, job_id, report_name, header, severity_id, csv_writer=None):
+        """
+
+        args
+
+        engine - engine to check out this writer's connection from
+        job_id - ID of the job the report belongs to
+        report_name - name of the report file, without the folder
+        header - list of strings for the header, either REPORT_HEADERS or CROSS_FILE_REPORT_HEADERS
+        severity_id - ID of the rule severity of every row in the report
+        csv_writer - CsvWriter for the report itself, None to leave it to materializeReports
+
+        """
+        self.conn = engine.connect()
+        self.job_id = job_id
+        self.severity_id = severity_id
+        self.cross_file = header == CROSS_FILE_REPORT_HEADERS
+        self.csv_writer = csv_writer
+        # Replace the report from an earlier run, its rows are deleted along with it
+        self.conn.execute(ErrorReport.__table__.delete().where(ErrorReport.report_name == report_name))
+        now = datetime.utcnow()
+        result = self.conn.execute(ErrorReport.__table__.insert().values(
+            job_id=job_id, report_name=report_name, severity_id=severity_id, cross_file=self.cross_file,
+            materialized=csv_writer is not None, created_at=now, updated_at=now))
+        self.error_report_id = result.inserted_primary_key[0]
+        # The header is not stored, it is added when the report is materialized
+        self.rows = []
+
+    def write(self, dataList):
+        """
+
+        args
+        dataList - list of values for one report row, in header order
+
+        """
+        if self.csv_writer is not None:
+            self.csv_writer.write(dataList)
+        super(RowErrorWriter, self).write(dataList)
+
+    def finishBatch(self):
+        """ Insert the unfinished batch """
+        if self.rows:
+            now = datetime.utcnow()
+            self.conn.execute(RowError.__table__.insert().values([self.rowValues(row, now) for row in self.rows]))
+        self.rows = []
+        if self.csv_writer is not None:
+            self.csv_writer.finishBatch()
+
+    def flush(self):
+        """ Insert the unfinished batch and flush the CSV """
+        self.finishBatch()
+        if self.csv_writer is not None:
+            self.csv_writer.flush()
+
+    def rowValues(self, row, now):
+        """ Map a report row, in header order, to row_error columns """
+        if self.cross_file:
+            source_file, target_file, field_name, error_message, value_provided, row_number, rule_label = row
+            file_type_id, target_file_type_id = FILE_TYPE_DICT[source_file], FILE_TYPE_DICT[target_file]
+        else:
+            field_name, error_message, row_number, value_provided, rule_label = row
+            file_type_id = target_file_type_id = None
+        return {
+            "error_report_id": self.error_report_id, "job_id": self.job_id, "severity_id": self.severity_id,
+            "file_type_id": file_type_id, "target_file_type_id": target_file_type_id, "field_name": field_name,
+            "error_message": error_message,
+            "value_provided": None if value_provided is None else str(value_provided),
+            "row_number": int(row_number),
+            # Empty rather than null, so the label can be part of a pagination key
+            "original_rule_label": rule_label or "", "created_at": now, "updated_at": now}
+
+    def __exit__(self, type, value, traceback):
+        """
+
+        args
+        type - the type of error
+        value - the value of the error
+        traceback - the traceback of the error
+
+        This function inserts the last batch, or drops the
+        partial report if the 'with' block failed, then
+        closes the CSV writer
+
+        """
+        exc_info = (type, value, traceback)
+        try:
+            if type is None:
+                self.finishBatch()
+            else:
+                self.conn.execute(ErrorReport.__table__.delete().where(
+                    ErrorReport.error_report_id == self.error_report_id))
+        except Exception:
+            exc_info = sys.exc_info()
+            raise
+        finally:
+            self.conn.close()
+            if self.csv_writer is not None:
+                self.csv_writer.__exit__(*exc_info)
+
+
+def reportRows(report, rows):
+    """ Turn row_error rows back into report rows, in header order
+
+    Args:
+        report: ErrorReport the rows belong to
+        rows: iterable of RowError rows, in row_error_id order
+
+    Yields:
+        Lists of values, as they were handed to the RowErrorWriter
+    """
+    for row in rows:
+        if report.cross_file:
+            yield [FILE_TYPE_DICT_ID[row.file_type_id], FILE_TYPE_DICT_ID[row.target_file_type_id], row.field_name,
+                   row.error_message, row.value_provided, row.row_number, row.original_rule_label]
+        else:
+            yield [row.field_name, row.error_message, str(row.row_number), row.value_provided,
+                   row.original_rule_label]
+
+
+def pendingReports(report_names):
+    """ Names of the reports that are still held in row_error, so have no CSV yet
+
+    Args:
+        report_names: names of the report files, without the folder
+
+    Returns:
+        Set of the report names that materializeReports has not written yet
+    """
+    sess = GlobalDB.db().session
+    return {name for name, in sess.query(ErrorReport.report_name).filter(
+        ErrorReport.report_name.in_(report_names), ErrorReport.materialized == False)}
+
+
+def materializeReports(report_names, is_local, directory=""):
+    """ Write the CSV for each of the named reports that is still held in row_error
+
+    Reports that were written directly, or were already materialized, are left alone.
+    Each report's row is locked while its CSV is written, and reports another process
+    is writing are skipped, so concurrent requests never write the same report twice.
+
+    Args:
+        report_names: names of the report files, without the folder
+        is_local: True to write to the local directory instead of the S3 errors folder
+        directory: folder for local reports
+    """
+    sess = GlobalDB.db().session
+    report_ids = [report_id for report_id, in sess.query(ErrorReport.error_report_id).filter(
+        ErrorReport.report_name.in_(report_names), ErrorReport.materialized == False).
+        order_by(ErrorReport.report_name)]
+    sess.commit()
+    compress = bool(CONFIG_BROKER.get('gzip_reports'))
+    fetch_size = int(CONFIG_BROKER.get('validator_sql_fetch_size') or 10000)
+    for report_id in report_ids:
+        # Held until the commit below, the report may have been written since it was listed
+        locked = sess.execute(text("SELECT error_report_id FROM error_report WHERE error_report_id = :id "
+                                   "AND NOT materialized FOR UPDATE SKIP LOCKED"), {"id": report_id}).scalar()
+        if locked is None:
+            sess.rollback()
+            continue
+        report = sess.query(ErrorReport).filter(ErrorReport.error_report_id == report_id).one()
+        header = CROSS_FILE_REPORT_HEADERS if report.cross_file else REPORT_HEADERS
+        if is_local:
+            writer = CsvLocalWriter(os.path.join(directory, report.report_name), header, compress)
+        else:
+            # Forcing forward slash here instead of using os.path to write a valid path for S3
+            writer = CsvS3Writer(CONFIG_BROKER['aws_region'], CONFIG_BROKER['aws_bucket'],
+                                 "".join(["errors/", report.report_name]), header, compress)
+        rows = sess.query(RowError).filter(RowError.error_report_id == report.error_report_id). \
+            order_by(RowError.row_error_id).yield_per(fetch_size)
+        with writer:
+            for row in reportRows(report, rows):
+                writer.write(row)
+            writer.finishBatch()
+        # Served as is from now on, until the job is validated again
+        report.materialized = True
+        sess.commit()
@@ -61,6 +61,8 @@ class SchemaLoader(object):
                     else:
                             raise ValueError('CSV File does not follow schema')
 
+                # Let running validators know their cached schema is stale
+                fileType.schema_version += 1
                 sess.commit()
                 logger.info('{} {} schema records added to {}'.format(
                     file_column_count, fileTypeName, FileColumn.__tablename__))
@@ -4,7 +4,8 @@ import os
 from dataactcore.config import CONFIG_BROKER
 from dataactcore.logging import configure_logging
 from dataactcore.interfaces.db import GlobalDB
-from dataactcore.models.lookups import FILE_TYPE_DICT, RULE_SEVERITY_DICT
+from dataactcore.models.jobModels import Job
+from dataactcore.models.lookups import FILE_TYPE_DICT, JOB_TYPE_DICT, RULE_SEVERITY_DICT
 from dataactcore.models.validationModels import RuleSql
 from dataactvalidator.app import createApp
 from dataactvalidator.filestreaming.fieldCleaner import FieldCleaner
@@ -88,6 +89,10 @@ class SQLLoader():
                     rule_sql.rule_cross_file_flag = cross_file_flag
 
                     sess.merge(rule_sql)
+
+            # Rules may have changed, so the next cross-file run for every submission checks all file pairs
+            sess.query(Job).filter(Job.job_type_id == JOB_TYPE_DICT['validation']).update(
+                {Job.last_validated: None}, synchronize_session=False)
             sess.commit()
 
 if __name__ == '__main__':
@@ -0,0 +1,107 @@
+from datetime import datetime
+import logging
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from dataactcore.interfaces.db import GlobalDB
+from dataactcore.models.stagingModels import concatTasDict
+
+
+_exception_logger = logging.getLogger('deprecated.exception')
+
+
+class StagingWriter(object):
+    """
+    Buffers validated records for a staging table and writes them with
+    multi-row inserts instead of one ORM object and commit per row
+    """
+
+    BATCH_SIZE = 1000
+
+    def __init__(self, model, job_id, submission_id, batch_size=None):
+        """
+
+        args
+
+        model - orm model for the staging table being loaded
+        job_id - ID of current job
+        submission_id - ID of current submission
+        batch_size - number of records to buffer before writing, defaults to BATCH_SIZE
+
+        """
+        self.table = model.__table__
+        self.job_id = job_id
+        self.submission_id = submission_id
+        self.batch_size = batch_size or self.BATCH_SIZE
+        # Primary key is generated by the database, everything else is taken from the record
+        self.columns = [column.name for column in self.table.columns if not column.primary_key]
+        self.has_tas = "tas" in self.columns
+        self.rows = []
+
+    def write(self, record, row_number):
+        """ Add a record to the buffer, flushing it if the batch is full
+
+        Args:
+            record: Dict of cleaned values keyed by short column name
+            row_number: Row number of this record in the submitted file
+
+        Returns:
+            List of row numbers that could not be written to the staging table
+        """
+        row = {column: record.get(column) for column in self.columns}
+        row["job_id"] = self.job_id
+        row["submission_id"] = self.submission_id
+        row["row_number"] = row_number
+        if self.has_tas:
+            row["tas"] = concatTasDict(row)
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            return self.flush()
+        return []
+
+    def flush(self):
+        """ Write all buffered records to the staging table
+
+        Returns:
+            List of row numbers that could not be written to the staging table
+        """
+        if not self.rows:
+            return []
+        rows = self.rows
+        self.rows = []
+        now = datetime.utcnow()
+        for row in rows:
+            row["created_at"] = now
+            row["updated_at"] = now
+
+        sess = GlobalDB.db().session
+        try:
+            sess.execute(self.table.insert().values(rows))
+            sess.commit()
+            return []
+        except SQLAlchemyError:
+            sess.rollback()
+            _exception_logger.info(
+                'VALIDATOR_INFO: Batch insert into %s failed for job_id: %s, retrying rows individually',
+                self.table.name, self.job_id)
+        return self._write_rows_individually(rows)
+
+    def _write_rows_individually(self, rows):
+        """ Insert each row on its own so a bad row only fails itself
+
+        Args:
+            rows: List of row dicts that failed as a batch
+
+        Returns:
+            List of row numbers that could not be written to the staging table
+        """
+        sess = GlobalDB.db().session
+        failed_rows = []
+        for row in rows:
+            try:
+                sess.execute(self.table.insert().values(row))
+                sess.commit()
+            except SQLAlchemyError:
+                sess.rollback()
+                failed_rows.append(row["row_number"])
+        return failed_rows
@@ -0,0 +1,330 @@
+import argparse
+import html
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import tempfile
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from dataactcore.interfaces.db import GlobalDB
+from dataactcore.interfaces.interfaceHolder import InterfaceHolder
+from dataactcore.logging import configure_logging
+from dataactcore.models.lookups import FILE_TYPE, FILE_TYPE_DICT_ID
+from dataactcore.models.validationModels import RuleSql
+from dataactvalidator.app import createApp
+from dataactvalidator.scripts.generate_submission import create_submission_jobs, generate_submission
+from dataactvalidator.validation_handlers.ruleStatements import RuleStatements
+from dataactvalidator.validation_handlers.sf133WorkingSet import SF133WorkingSet
+from dataactvalidator.validation_handlers.validationManager import ValidationManager
+
+logger = logging.getLogger(__name__)
+
+# Sequential scans of tables with at least this many rows are flagged
+LARGE_TABLE_ROWS = 10000
+# Nested loops whose inputs are estimated to give at least this many row pairs are flagged
+NESTED_LOOP_ROWS = 1000000
+# Subplans run at least this many times, once per row of a correlated subquery, are flagged
+SUBPLAN_LOOPS = 1000
+# A rule is a regression when it takes this many times as long as in the baseline report
+REGRESSION_FACTOR = 2.0
+# Rules faster than this many milliseconds are never regressions, their timings are mostly noise
+REGRESSION_MIN_MS = 10.0
+
+IDENTIFIER_RE = re.compile(r'\b(?:([a-z_][a-z0-9_]*)\.)?([a-z_][a-z0-9_]*)\b')
+INDEX_COLUMNS_RE = re.compile(r'\((.*)\)')
+
+
+def walk_plan(node, parent=None):
+    """ Yield each node of a plan with its parent, depth first """
+    yield node, parent
+    for child in node.get("Plans", []):
+        yield from walk_plan(child, node)
+
+
+def condition_columns(condition, alias, columns):
+    """ Columns of a table used in a plan node's condition, in the order they appear
+
+    Args:
+        condition: Filter or join condition from the plan
+        alias: Alias the table has in the query
+        columns: Set of the table's column names
+
+    Returns:
+        List of column names
+    """
+    found = []
+    for qualifier, name in IDENTIFIER_RE.findall(condition or ""):
+        if (qualifier in ("", alias)) and name in columns and name not in found:
+            found.append(name)
+    # Every rule is scoped to one submission, so indexes for rules lead with submission_id
+    if "submission_id" in found:
+        found.remove("submission_id")
+        found.insert(0, "submission_id")
+    return found
+
+
+def find_issues(plan, tables, large_table_rows=LARGE_TABLE_ROWS):
+    """ Flag the parts of a plan that tend to be slow on a large submission
+
+    Args:
+        plan: Top node of a plan from EXPLAIN's JSON output
+        tables: Dict of table name to a dict with its estimated "rows", set of "columns" and list of "indexes",
+            each index a list of its column names
+        large_table_rows: Row count from which a sequential scan is flagged
+
+    Returns:
+        List of dicts, each with the issue's "type", "node" type, "relation" if there is one and "detail". Sequential
+        scans with a filter that no index leads with have the "index_candidate" columns to index.
+    """
+    issues = []
+    for node, parent in walk_plan(plan):
+        node_type = node.get("Node Type")
+        relation = node.get("Relation Name")
+        if node_type == "Seq Scan" and relation in tables and tables[relation]["rows"] >= large_table_rows:
+            table = tables[relation]
+            issue = {"type": "seq_scan", "node": node_type, "relation": relation,
+                     "detail": "Sequential scan of {} ({:.0f} rows){}".format(
+                         relation, table["rows"], ", filter " + node["Filter"] if node.get("Filter") else "")}
+            columns = condition_columns(node.get("Filter"), node.get("Alias"), table["columns"])
+            # Join conditions of the nested loop running this scan could use an index too
+            if parent is not None and parent.get("Node Type") == "Nested Loop":
+                columns += [column for column in condition_columns(parent.get("Join Filter"), node.get("Alias"),
+                                                                   table["columns"]) if column not in columns]
+            if columns and not any(index and index[0] in columns for index in table["indexes"]):
+                issue["index_candidate"] = columns
+            issues.append(issue)
+        elif node_type == "Nested Loop" and len(node.get("Plans", [])) == 2:
+            outer, inner = node["Plans"]
+            pairs = outer.get("Plan Rows", 0) * inner.get("Plan Rows", 0)
+            if pairs >= NESTED_LOOP_ROWS:
+                issues.append({"type": "nested_loop", "node": node_type, "relation": inner.get("Relation Name"),
+                               "detail": "Nested loop over an estimated {:.0f} x {:.0f} rows".format(
+                                   outer.get("Plan Rows", 0), inner.get("Plan Rows", 0))})
+        if node.get("Parent Relationship") == "SubPlan" and node.get("Actual Loops", 0) >= SUBPLAN_LOOPS:
+            issues.append({"type": "correlated_subplan", "node": node_type, "relation": relation,
+                           "detail": "{} run {} times by {}".format(node_type, node["Actual Loops"],
+                                                                    node.get("Subplan Name", "a subplan"))})
+    return issues
+
+
+def summarize_plan(rule, explained, tables, large_table_rows=LARGE_TABLE_ROWS):
+    """ Summarize the EXPLAIN output for one rule
+
+    Args:
+        rule: RuleSql object
+        explained: Output of RuleStatements.explain
+        tables: Table details, see find_issues
+        large_table_rows: Row count from which a sequential scan is flagged
+
+    Returns:
+        Dict for the report
+    """
+    result = explained[0]
+    plan = result["Plan"]
+    return {"rule_label": rule.rule_label, "query_name": rule.query_name,
+            "file_type": FILE_TYPE_DICT_ID.get(rule.file_id),
+            "target_file_type": FILE_TYPE_DICT_ID.get(rule.target_file_id),
+            "execution_ms": result.get("Execution Time", result.get("Total Runtime")),
+            "planning_ms": result.get("Planning Time"), "total_cost": plan.get("Total Cost"),
+            "actual_rows": plan.get("Actual Rows"),
+            # Buffer counts of a node include its children's
+            "shared_hit_blocks": plan.get("Shared Hit Blocks"), "shared_read_blocks": plan.get("Shared Read Blocks"),
+            "issues": find_issues(plan, tables, large_table_rows), "plan": explained}
+
+
+def compare_reports(rules, baseline):
+    """ Mark the rules that got slower or picked up new issues since a baseline report
+
+    Args:
+        rules: Rule dicts from summarize_plan, each is given a "regressions" list
+        baseline: Rule dicts from an earlier report
+
+    Returns:
+        Number of rules with regressions
+    """
+    earlier = {rule["query_name"]: rule for rule in baseline}
+    regressed = 0
+    for rule in rules:
+        rule["regressions"] = []
+        before = earlier.get(rule["query_name"])
+        if before is None:
+            continue
+        if rule["execution_ms"] is not None and before.get("execution_ms") is not None and \
+                rule["execution_ms"] >= REGRESSION_MIN_MS and \
+                rule["execution_ms"] > REGRESSION_FACTOR * before["execution_ms"]:
+            rule["regressions"].append("execution time {:.1f} ms, was {:.1f} ms".format(
+                rule["execution_ms"], before["execution_ms"]))
+        before_issues = {(issue["type"], issue.get("relation")) for issue in before.get("issues", [])}
+        for issue in rule["issues"]:
+            if (issue["type"], issue.get("relation")) not in before_issues:
+                rule["regressions"].append("new issue: " + issue["detail"])
+        if rule["regressions"]:
+            regressed += 1
+    return regressed
+
+
+def format_html(rules, submission_id):
+    """ Lay out the ranked rules as an HTML page """
+    rows = []
+    for rank, rule in enumerate(rules, 1):
+        notes = [html.escape(issue["detail"]) + (" &mdash; index candidate ({})".format(
+            html.escape(", ".join(issue["index_candidate"]))) if issue.get("index_candidate") else "")
+            for issue in rule["issues"]]
+        notes += ["<strong>{}</strong>".format(html.escape(regression)) for regression in rule.get("regressions", [])]
+        rows.append("<tr{}><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td>"
+                    "<td><ul>{}</ul></td></tr>".format(
+                        ' class="regressed"' if rule.get("regressions") else ' class="flagged"' if notes else "",
+                        rank, html.escape(rule["rule_label"]), html.escape(rule["query_name"]),
+                        html.escape(rule["file_type"] or ""),
+                        "" if rule["execution_ms"] is None else "{:.1f}".format(rule["execution_ms"]),
+                        "" if rule["planning_ms"] is None else "{:.1f}".format(rule["planning_ms"]),
+                        "" if rule["shared_read_blocks"] is None else rule["shared_read_blocks"], "".join("<li>{}</li>".format(note) for note in notes)))
+    return """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>SQL rule plans for submission {0}</title>
+<style>
+body {{ font-family: sans-serif; }}
+table {{ border-collapse: collapse; }}
+td, th {{ border: 1px solid #ccc; padding: 4px 8px; vertical-align: top; text-align: left; }}
+tr.flagged {{ background: #fff8e1; }}
+tr.regressed {{ background: #ffebee; }}
+</style>
+</head>
+<body>
+<h1>SQL rule plans for submission {0}</h1>
+<table>
+<tr><th>Rank</th><th>Rule</th><th>Query</th><th>File</th><th>Execution ms</th><th>Planning ms</th>
+<th>Blocks read</th><th>Issues</th></tr>
+{1}
+</table>
+</body>
+</html>
+""".format(submission_id, "\n".join(rows))
+
+
+def read_tables(conn):
+    """ Estimated row count, columns and index columns of each table in the public schema """
+    tables = {}
+    for name, rows in conn.execute("SELECT relname, reltuples FROM pg_class JOIN pg_namespace "
+                                   "ON pg_namespace.oid = relnamespace WHERE nspname = 'public' AND relkind = 'r'"):
+        tables[name] = {"rows": rows, "columns": set(), "indexes": []}
+    for name, column in conn.execute("SELECT table_name, column_name FROM information_schema.columns "
+                                     "WHERE table_schema = 'public'"):
+        if name in tables:
+            tables[name]["columns"].add(column)
+    for name, definition in conn.execute("SELECT tablename, indexdef FROM pg_indexes WHERE schemaname = 'public'"):
+        match = INDEX_COLUMNS_RE.search(definition)
+        if name in tables and match:
+            tables[name]["indexes"].append([column.strip().strip('"') for column in match.group(1).split(",")])
+    return tables
+
+
+def load_synthetic_submission(rows, error_rate, seed):
+    """ Generate a synthetic submission and validate it, so its rows are in the staging tables
+
+    Returns:
+        ID of the submission
+    """
+    sess = GlobalDB.db().session
+    directory = tempfile.mkdtemp()
+    try:
+        paths = generate_submission(directory, rows, error_rate, seed)
+        interfaces = InterfaceHolder()
+        jobs, cross_file_id = create_submission_jobs(sess, paths)
+        manager = ValidationManager(True, os.path.join(directory, "reports"))
+        for job_id in jobs.values():
+            interfaces.jobDb.markJobStatus(job_id, "running")
+            manager.runValidation(job_id, interfaces)
+            interfaces.jobDb.markJobStatus(job_id, "finished")
+        submission_id = interfaces.jobDb.getSubmissionId(cross_file_id)
+        interfaces.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    # Plans depend on the planner's statistics, which autovacuum may not have caught up on
+    conn = GlobalDB.db().connection
+    for file_type in FILE_TYPE:
+        if file_type.model is not None:
+            conn.execute("ANALYZE {}".format(file_type.model.__tablename__))
+    return submission_id
+
+
+def audit_rules(submission_id, query_names=None, large_table_rows=LARGE_TABLE_ROWS):
+    """ Run EXPLAIN (ANALYZE, BUFFERS) for each SQL rule against a submission
+
+    Args:
+        submission_id: ID of the submission the rules run against
+        query_names: Only audit the rules with these query names, defaults to all rules
+        large_table_rows: Row count from which a sequential scan is flagged
+
+    Returns:
+        List of rule dicts from summarize_plan, slowest first
+    """
+    sess = GlobalDB.db().session
+    query = sess.query(RuleSql).order_by(RuleSql.rule_sql_id)
+    if query_names:
+        query = query.filter(RuleSql.query_name.in_(query_names))
+    rules = query.all()
+    if any(SF133WorkingSet.readsWorkingSet(rule.rule_sql) for rule in rules):
+        # Submissions validated before the working set existed don't have one
+        with GlobalDB.db().engine.begin() as conn:
+            SF133WorkingSet.build(conn, submission_id)
+            conn.execute("ANALYZE {}".format(SF133WorkingSet.TABLE))
+    summaries = []
+    with GlobalDB.db().engine.connect() as conn:
+        tables = read_tables(conn)
+        for rule in rules:
+            try:
+                explained = RuleStatements.explain(conn, rule, submission_id)
+            except SQLAlchemyError:
+                logger.exception('Could not explain query %s for rule %s', rule.query_name, rule.rule_label)
+                continue
+            summaries.append(summarize_plan(rule, explained, tables, large_table_rows))
+    summaries.sort(key=lambda rule: rule["execution_ms"] or 0, reverse=True)
+    return summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run EXPLAIN ANALYZE for each SQL rule and report slow plans.')
+    parser.add_argument('-s', '--submission_id', help='Submission to run the rules against', type=int)
+    parser.add_argument('-r', '--rows', help='Rows in each file of a synthetic submission to load and run the '
+                                             'rules against, if no submission is given', type=int, default=10000)
+    parser.add_argument('-e', '--error_rate', help='Share of synthetic rows that fail a basic schema check',
+                        type=float, default=0.01)
+    parser.add_argument('-q', '--query_name', help='Only audit this rule query, may be repeated', action='append')
+    parser.add_argument('-o', '--output', help='Path of the report without an extension, .json and .html files '
+                                               'are written', default='rule_plans')
+    parser.add_argument('-b', '--baseline', help='JSON report of an earlier run to compare with, exits with 1 '
+                                                 'if any rule regressed')
+    parser.add_argument('--large_table_rows', help='Row count from which sequential scans are flagged', type=int,
+                        default=LARGE_TABLE_ROWS)
+    args = parser.parse_args()
+
+    with createApp().app_context():
+        submission_id = args.submission_id
+        if submission_id is None:
+            submission_id = load_synthetic_submission(args.rows, args.error_rate, 0)
+            logger.info('Loaded synthetic submission %s with %s rows in each file', submission_id, args.rows)
+        rules = audit_rules(submission_id, args.query_name, args.large_table_rows)
+
+    regressed = 0
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressed = compare_reports(rules, json.load(baseline)["rules"])
+    with open(args.output + ".json", "w") as report:
+        json.dump({"submission_id": submission_id, "rules": rules}, report, indent=2)
+    with open(args.output + ".html", "w") as report:
+        report.write(format_html(rules, submission_id))
+    logger.info('Audited %s rules, %s with issues, %s regressed, report written to %s.json and %s.html',
+                len(rules), sum(1 for rule in rules if rule["issues"]), regressed, args.output, args.output)
+    if regressed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    configure_logging()
+    main()
@@ -0,0 +1,22 @@
+import logging
+
+from dataactcore.interfaces.db import GlobalDB
+from dataactcore.logging import configure_logging
+from dataactcore.models.lookups import FILE_TYPE
+from dataactvalidator.app import createApp
+from dataactvalidator.validation_handlers.stagingPartitions import StagingPartitions
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    """ Drop the staging table partitions of submissions that have been deleted """
+    with createApp().app_context():
+        sess = GlobalDB.db().session
+        models = [file_type.model for file_type in FILE_TYPE if file_type.model is not None]
+        dropped = StagingPartitions.dropOrphaned(sess, models)
+        logger.info('Dropped %s staging partitions of deleted submissions', len(dropped))
+
+if __name__ == '__main__':
+    configure_logging()
+    main()
@@ -0,0 +1,271 @@
+import argparse
+import csv
+from collections import namedtuple
+from datetime import datetime
+import logging
+import os
+import random
+import string
+
+from dataactcore.config import CONFIG_BROKER
+from dataactcore.logging import configure_logging
+from dataactcore.models.jobModels import Job, Submission
+from dataactcore.models.lookups import FILE_TYPE_DICT, JOB_STATUS_DICT, JOB_TYPE_DICT
+from dataactvalidator.filestreaming.fieldCleaner import FieldCleaner
+from dataactvalidator.filestreaming.schemaLoader import SchemaLoader
+
+logger = logging.getLogger(__name__)
+
+validator_config_path = os.path.join(CONFIG_BROKER["path"], "dataactvalidator", "config")
+
+Field = namedtuple('Field', ['name', 'name_short', 'required', 'data_type', 'length', 'padded'])
+
+# Components of a TAS, in the order of the SF-133 file's columns
+TAS_FIELDS = ("allocation_transfer_agency", "agency_identifier", "availability_type_code",
+              "beginning_period_of_availa", "ending_period_of_availabil", "main_account_code", "sub_account_code")
+
+# Fiscal year and period of the SF-133 data in the validator's config folder, submissions
+# for the quarter ending 2016-03-31 are checked against it
+DEFAULT_REPORTING_START = "2016-01-01"
+DEFAULT_REPORTING_END = "2016-03-31"
+
+# Fixed values for fields with a small set of allowed codes
+FIXED_VALUES = {
+    "action_type": "A",
+    "assistance_type": "02",
+    "by_direct_reimbursable_fun": "D",
+    "cfda_number": "10.001",
+    "correction_late_delete_ind": "",
+    "legal_entity_country_code": "USA",
+    "place_of_perform_country_c": "USA",
+    "record_type": "2",
+}
+
+
+def read_fields(file_type, config_path=validator_config_path):
+    """ Read a file type's field definitions, cleaned the same way SchemaLoader loads them
+
+    Args:
+        file_type: Name of the file type, one of the keys of SchemaLoader.fieldFiles
+        config_path: Folder holding the *Fields.csv files
+
+    Returns:
+        List of Field tuples in schema order
+    """
+    fields = []
+    with open(os.path.join(config_path, SchemaLoader.fieldFiles[file_type]), newline='') as csvfile:
+        for record in csv.DictReader(csvfile):
+            record = FieldCleaner.cleanRecord(record)
+            length = record["field_length"]
+            fields.append(Field(record["fieldname"], record["fieldname_short"], record["required"] == "true",
+                                record["data_type"], int(length) if str(length).strip() else None,
+                                str(record.get("padded_flag") or "").strip().lower() == "true"))
+    return fields
+
+
+class SubmissionGenerator(object):
+    """
+    Writes synthetic files for a submission that pass the basic schema checks,
+    apart from the rows chosen by the error rate.
+
+    TAS come from the SF-133 file in the validator's config folder, and object
+    classes and program activities from their domain value files, so the SQL
+    rules join against loaded data the way they do for real submissions. Award
+    IDs are shared between award_financial and the award files. Amounts are
+    random, so the SQL rules that compare totals still find failures.
+    """
+
+    # Distinct values of each string field
+    POOL_SIZE = 1000
+
+    def __init__(self, seed=0, config_path=validator_config_path):
+        self.random = random.Random(seed)
+        self.pools = {}
+        self.config_path = config_path
+        self.tas = self.read_tas()
+        self.object_classes = self.read_column("object_class.csv", 0)
+        self.program_activities = self.read_program_activities()
+
+    def read_tas(self):
+        """ Returns a list of distinct TAS dicts from the SF-133 file """
+        tas = set()
+        with open(os.path.join(self.config_path, "sf_133.csv"), newline='') as csvfile:
+            reader = csv.reader(csvfile)
+            next(reader)
+            for row in reader:
+                ata, aid, a, bpoa, epoa, main, sub = (value.strip() for value in row[:7])
+                tas.add((ata.zfill(3) if ata else "", aid.zfill(3), a, bpoa, epoa, main.zfill(4), sub.zfill(3)))
+        return [dict(zip(TAS_FIELDS, row)) for row in sorted(tas)]
+
+    def read_column(self, filename, position):
+        """ Returns the distinct non-blank values of one column of a domain value file """
+        with open(os.path.join(self.config_path, filename), newline='') as csvfile:
+            reader = csv.reader(csvfile)
+            next(reader)
+            return sorted({row[position].strip() for row in reader if row[position].strip()})
+
+    def read_program_activities(self):
+        """ Returns a list of (code, name) tuples from the program activity file """
+        with open(os.path.join(self.config_path, "program_activity.csv"), newline='') as csvfile:
+            reader = csv.DictReader(csvfile)
+            return sorted({(row["pa_code"].strip().zfill(4), row["pa_name"].strip()) for row in reader})
+
+    def value(self, field):
+        """ Returns a random value that passes the field's type and length checks """
+        if field.name_short in FIXED_VALUES:
+            return FIXED_VALUES[field.name_short]
+        if field.data_type == "float":
+            return "{:.2f}".format(self.random.uniform(0, 1000000))
+        if field.data_type in ("int", "long"):
+            return str(self.random.randint(1, 10 ** min(field.length or 9, 9) - 1))
+        if "date" in field.name_short or field.name_short.startswith("period_of_perf"):
+            return "201601{:02d}".format(self.random.randint(1, 28))
+        # Building strings is slow, so each string field draws from its own pool of values
+        pool = self.pools.get(field.name)
+        if pool is None:
+            length = field.length or 20
+            if field.padded:
+                pool = [str(self.random.randint(0, 10 ** length - 1)).zfill(length) for _ in range(self.POOL_SIZE)]
+            else:
+                pool = ["".join(self.random.choices(string.ascii_uppercase, k=min(length, 12)))
+                        for _ in range(self.POOL_SIZE)]
+            self.pools[field.name] = pool
+        return self.random.choice(pool)
+
+    def corrupt(self, fields, row):
+        """ Break one field of a row so that it fails a basic schema check
+
+        Returns:
+            False if none of the fields has a check to fail
+        """
+        typed = ("float", "int", "long")
+        checked = [field for field in fields if field.data_type in typed or field.length or field.required]
+        if not checked:
+            return False
+        field = self.random.choice(checked)
+        if field.data_type in typed:
+            row[field.name] = "x" + (row[field.name] or "1")
+        elif field.length:
+            row[field.name] = "X" * (field.length + 1)
+        else:
+            row[field.name] = ""
+        return True
+
+    def row(self, file_type, fields, row_number):
+        """ Returns a dict of long field name to value for one row of a file """
+        row = {field.name: self.value(field) if field.required or self.random.random() < 0.9 else ""
+               for field in fields}
+        short = {field.name_short: field.name for field in fields}
+        if "agency_identifier" in short:
+            for name, value in self.random.choice(self.tas).items():
+                row[short[name]] = value
+        if "object_class" in short:
+            row[short["object_class"]] = self.random.choice(self.object_classes)
+        if "program_activity_code" in short:
+            code, name = self.random.choice(self.program_activities)
+            row[short["program_activity_code"]] = code
+            row[short["program_activity_name"]] = name
+        # Award IDs are drawn from the same range in every file, so the C to D cross-file rules find matches
+        award = self.random.randint(1, max(row_number // 2, 1))
+        for name in ("piid", "parent_award_id", "fain", "uri"):
+            if name in short:
+                row[short[name]] = ""
+        if file_type == "award_procurement" or (file_type == "award_financial" and award % 2):
+            row[short["piid"]] = "PIID{:09d}".format(award)
+        elif file_type in ("award", "award_financial"):
+            row[short["fain"]] = "FAIN{:09d}".format(award)
+        return row
+
+    def write_file(self, file_type, path, rows, error_rate=0.0):
+        """ Write a synthetic file with a header of long field names
+
+        Args:
+            file_type: Name of the file type
+            path: File to write
+            rows: Number of rows after the header
+            error_rate: Share of rows, from 0 to 1, with one field broken so it fails a basic schema check.
+                D files skip the basic checks, so their broken rows are still accepted.
+
+        Returns:
+            Number of rows that were broken
+        """
+        fields = read_fields(file_type, self.config_path)
+        broken = 0
+        with open(path, "w", newline='') as csvfile:
+            writer = csv.DictWriter(csvfile, [field.name for field in fields])
+            writer.writeheader()
+            for row_number in range(2, rows + 2):
+                row = self.row(file_type, fields, row_number)
+                if error_rate and self.random.random() < error_rate and self.corrupt(fields, row):
+                    broken += 1
+                writer.writerow(row)
+        return broken
+
+
+def generate_submission(directory, rows, error_rate=0.0, seed=0, file_types=None):
+    """ Write a synthetic file for each file type of a submission
+
+    Args:
+        directory: Folder to write the files to
+        rows: Number of rows in each file
+        error_rate: Share of rows to break, see SubmissionGenerator.write_file
+        seed: Seed for the random values, the same seed gives the same files
+        file_types: Names of the file types to write, defaults to every file type with a schema
+
+    Returns:
+        Dict of file type name to the path of its file
+    """
+    generator = SubmissionGenerator(seed)
+    paths = {}
+    for file_type in file_types or sorted(SchemaLoader.fieldFiles):
+        paths[file_type] = os.path.join(directory, "{}_{}.csv".format(file_type, rows))
+        broken = generator.write_file(file_type, paths[file_type], rows, error_rate)
+        logger.info('Wrote {} rows, {} broken, to {}'.format(rows, broken, paths[file_type]))
+    return paths
+
+
+def create_submission_jobs(sess, paths):
+    """ Create a submission with a ready validation job for each file and a cross-file job
+
+    Args:
+        sess: Database session
+        paths: Dict of file type name to the path of its file
+
+    Returns:
+        Tuple of a dict of file type name to job ID, and the cross-file job's ID
+    """
+    submission = Submission(datetime_utc=datetime.utcnow(), cgac_code="000",
+                            reporting_start_date=datetime.strptime(DEFAULT_REPORTING_START, "%Y-%m-%d").date(),
+                            reporting_end_date=datetime.strptime(DEFAULT_REPORTING_END, "%Y-%m-%d").date(),
+                            is_quarter_format=True)
+    sess.add(submission)
+    sess.flush()
+    jobs = {}
+    for file_type, path in paths.items():
+        jobs[file_type] = Job(filename=path, original_filename=os.path.basename(path),
+                              file_size=os.path.getsize(path), job_status_id=JOB_STATUS_DICT['ready'],
+                              job_type_id=JOB_TYPE_DICT['csv_record_validation'],
+                              file_type_id=FILE_TYPE_DICT[file_type], submission_id=submission.submission_id)
+        sess.add(jobs[file_type])
+    cross_file = Job(job_status_id=JOB_STATUS_DICT['ready'], job_type_id=JOB_TYPE_DICT['validation'],
+                     submission_id=submission.submission_id)
+    sess.add(cross_file)
+    sess.commit()
+    return {file_type: job.job_id for file_type, job in jobs.items()}, cross_file.job_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic submission files from the validator schemas.')
+    parser.add_argument('-r', '--rows', help='Number of rows in each file', type=int, default=10000)
+    parser.add_argument('-e', '--error_rate', help='Share of rows, from 0 to 1, that fail a basic schema check',
+                        type=float, default=0.0)
+    parser.add_argument('-s', '--seed', help='Seed for the random values', type=int, default=0)
+    parser.add_argument('-d', '--directory', help='Folder to write the files to', default='.')
+    parser.add_argument('-f', '--file_type', help='File type to generate, may be repeated, defaults to all',
+                        action='append', choices=sorted(SchemaLoader.fieldFiles))
+    args = parser.parse_args()
+    generate_submission(args.directory, args.rows, args.error_rate, args.seed, args.file_type)
+
+if __name__ == '__main__':
+    configure_logging()
+    main()
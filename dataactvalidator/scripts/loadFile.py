@@ -9,6 +9,7 @@ from dataactcore.logging import configure_logging
 from dataactcore.models.domainModels import CGAC, ObjectClass, ProgramActivity
 from dataactvalidator.app import createApp
 from dataactvalidator.scripts.loaderUtils import LoaderUtils
+from dataactvalidator.validation_handlers.resultCache import ResultCache
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +38,7 @@ def loadCgac(filename):
         # insert to db
         table_name = model.__table__.name
         num = LoaderUtils.insertDataframe(data, table_name, sess.connection())
+        ResultCache.clear(sess)
         sess.commit()
 
     logger.info('{} records inserted to {}'.format(num, table_name))
@@ -64,6 +66,7 @@ def loadObjectClass(filename):
         # insert to db
         table_name = model.__table__.name
         num = LoaderUtils.insertDataframe(data, table_name, sess.connection())
+        ResultCache.clear(sess)
         sess.commit()
 
     logger.info('{} records inserted to {}'.format(num, table_name))
@@ -102,6 +105,7 @@ def loadProgramActivity(filename):
         # insert to db
         table_name = model.__table__.name
         num = LoaderUtils.insertDataframe(data, table_name, sess.connection())
+        ResultCache.clear(sess)
         sess.commit()
 
     logger.info('{} records inserted to {}'.format(num, table_name))
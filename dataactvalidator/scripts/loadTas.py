@@ -11,6 +11,7 @@ from dataactcore.logging import configure_logging
 from dataactcore.models.domainModels import TASLookup
 from dataactvalidator.app import createApp
 from dataactvalidator.scripts.loaderUtils import LoaderUtils
+from dataactvalidator.validation_handlers.resultCache import ResultCache
 
 
 logger = logging.getLogger(__name__)
@@ -75,6 +76,7 @@ def updateTASLookups(csvPath):
     for _, row in new_data.iterrows():
         sess.add(TASLookup(**row))
 
+    ResultCache.clear(sess)
     sess.commit()
     logger.info('%s records in CSV, %s existing',
                 len(data.index), sum(data['existing_id'].notnull()))
@@ -13,6 +13,7 @@ from dataactcore.logging import configure_logging
 from dataactcore.models.domainModels import SF133
 from dataactvalidator.app import createApp
 from dataactvalidator.scripts.loaderUtils import LoaderUtils
+from dataactvalidator.validation_handlers.resultCache import ResultCache
 
 logger = logging.getLogger(__name__)
 
@@ -143,6 +144,7 @@ def load_sf133(filename, fiscal_year, fiscal_period, force_load=False):
         # insert to db
         table_name = SF133.__table__.name
         num = LoaderUtils.insertDataframe(data, table_name, sess.connection())
+        ResultCache.clear(sess)
         sess.commit()
 
     logger.info('{} records inserted to {}'.format(num, table_name))
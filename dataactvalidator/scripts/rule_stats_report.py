@@ -0,0 +1,57 @@
+import argparse
+import logging
+from datetime import datetime, timedelta
+
+from dataactcore.interfaces.function_bag import get_rule_execution_stats, RULE_STATS_PERIODS
+from dataactcore.logging import configure_logging
+from dataactcore.models.lookups import FILE_TYPE_DICT
+from dataactvalidator.app import createApp
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ("query_name", "rule_label", "file_type", "executions", "p50_seconds", "p95_seconds",
+           "average_failures", "average_staging_rows")
+
+
+def format_report(rules, period=None):
+    """ Lay out the summaries from get_rule_execution_stats as a fixed width table
+
+    Args:
+        rules: List of dicts from get_rule_execution_stats
+        period: Period the rules were summarized by, None if they were summarized over the whole range
+
+    Returns:
+        The table as a string, one line per rule and period after the header
+    """
+    columns = ("period",) + COLUMNS if period else COLUMNS
+    lines = [list(columns)]
+    for rule in rules:
+        line = []
+        for column in columns:
+            value = rule[column]
+            line.append("{:.3f}".format(value) if isinstance(value, float) else str(value or ""))
+        lines.append(line)
+    widths = [max(len(line[i]) for line in lines) for i in range(len(columns))]
+    return "\n".join("  ".join(value.ljust(width) for value, width in zip(line, widths)).rstrip()
+                     for line in lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report the p50 and p95 execution time of each SQL rule.')
+    parser.add_argument('-d', '--days', help='Number of days back to report on', type=int, default=30)
+    parser.add_argument('-p', '--period', help='Report each rule per period instead of over the whole range',
+                        choices=RULE_STATS_PERIODS)
+    parser.add_argument('-f', '--file_type', help='Only report on the rules for this file type',
+                        choices=sorted(FILE_TYPE_DICT))
+    args = parser.parse_args()
+
+    with createApp().app_context():
+        start_date = datetime.utcnow() - timedelta(days=args.days)
+        file_type_id = FILE_TYPE_DICT[args.file_type] if args.file_type else None
+        rules = get_rule_execution_stats(start_date, file_type_id=file_type_id, period=args.period)
+        logger.info('Summarized %s rule executions since %s', sum(rule['executions'] for rule in rules), start_date)
+        print(format_report(rules, args.period))
+
+if __name__ == '__main__':
+    configure_logging()
+    main()
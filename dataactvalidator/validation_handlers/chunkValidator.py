@@ -0,0 +1,146 @@
+import pandas as pd
+
+from dataactcore.utils.stringCleaner import StringCleaner
+from dataactvalidator.validation_handlers.validationError import ValidationError
+
+
+class ChunkValidator(object):
+    """
+    Cleans and validates a chunk of records at a time as pandas column
+    operations. Produces the same cleaned records and failure lists as
+    FieldCleaner.cleanRow followed by ValidationPlan.validate on each row.
+    """
+
+    NUMERIC_TYPES = ("INT", "DECIMAL", "LONG")
+    # Anchored versions of the ValidationPlan fast paths, str.contains is used
+    # because it behaves the same across pandas versions
+    TYPE_PATTERNS = {
+        "INT": r'\A[+-]?[0-9]+\Z',
+        "LONG": r'\A[+-]?[0-9]+\Z',
+        "DECIMAL": r'\A[+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)\Z'
+    }
+
+    def __init__(self, fields, long_to_short_dict, plan, skip_validation=False):
+        """
+
+        args
+
+        fields - list of FileColumn objects for this file type
+        long_to_short_dict - mapping of long to short schema column names
+        plan - ValidationPlan for this file type
+        skip_validation - True to only clean the records, as for D files
+
+        """
+        self.fields = [(long_to_short_dict[field.name], field) for field in fields]
+        self.type_names = {name: field.field_type.name for name, field in self.fields}
+        self.plan = plan
+        self.skip_validation = skip_validation
+
+    def validateChunk(self, records):
+        """ Clean and validate a chunk of records
+
+        Args:
+            records: list of dicts as returned by the reader, keyed by short column name
+
+        Returns:
+            Tuple of two lists, each with one entry per record:
+            cleaned records, in the same form FieldCleaner.cleanRow returns
+            (passed validations, list of failures, type check passed) tuples, in the form ValidationPlan.validate returns
+        """
+        # Keep the column order of the submitted file so failures are listed in the same order as the row path
+        columns = list(records[0].keys()) if records else []
+        frame = pd.DataFrame.from_records(records, columns=columns).astype(object)
+        frame = frame.where(frame.notnull(), None)
+
+        failed_cells = {}
+        for name, field in self.fields:
+            frame[name] = self.cleanColumn(frame[name], field)
+        if not self.skip_validation:
+            for column_index, name in enumerate(columns):
+                column = self.plan.columns.get(name)
+                if column is not None:
+                    self.checkColumn(frame[name], column, column_index, failed_cells)
+
+        # Building the dicts from column lists is much faster than DataFrame.to_dict
+        cleaned = [dict(zip(columns, row)) for row in zip(*[frame[name].tolist() for name in columns])]
+        results = []
+        failed_rows = {}
+        # Order failures by row, then by column position in the file
+        for (position, column_index), failure in sorted(failed_cells.items()):
+            failed_rows.setdefault(position, []).append(failure)
+        for position in range(len(cleaned)):
+            failures = failed_rows.get(position, [])
+            type_failed = any(failure[1] == ValidationError.typeError for failure in failures)
+            results.append((not failures, failures, not type_failed))
+        return cleaned, results
+
+    @staticmethod
+    def cleanColumn(values, field):
+        """ Column version of FieldCleaner.cleanRow for one field
+
+        Args:
+            values: Series of raw values for this field
+            field: FileColumn object
+
+        Returns:
+            Series of cleaned values, with None for empty values
+        """
+        present = values.notnull()
+        if not present.any():
+            return values
+        stripped = values[present].str.strip()
+        if field.field_type.name in ChunkValidator.NUMERIC_TYPES:
+            # Only drop commas when what is left is a number, as FieldCleaner does
+            has_comma = stripped.str.contains(",", regex=False, na=False)
+            if has_comma.any():
+                without_commas = stripped[has_comma].str.replace(",", "", regex=False)
+                numeric = without_commas.map(StringCleaner.isNumeric).astype(bool)
+                stripped[without_commas[numeric].index] = without_commas[numeric]
+        if field.padded_flag and field.length is not None:
+            length = field.length
+            non_empty = stripped != ""
+            stripped[non_empty] = stripped[non_empty].map(lambda value: value.zfill(length))
+        values = values.copy()
+        values[present] = stripped
+        # Replace empty strings with null
+        return values.where(values.notnull() & (values != ""), None)
+
+    def checkColumn(self, values, column, column_index, failed_cells):
+        """ Column version of the ValidationPlan checks for one field
+
+        Args:
+            values: Series of cleaned values for this field
+            column: PlanColumn for this field
+            column_index: position of this field in the submitted file
+            failed_cells: dict of failures keyed by (row position, column position), updated in place
+        """
+        present = values.notnull()
+        if column.required:
+            for position in (~present).values.nonzero()[0]:
+                failed_cells[(position, column_index)] = [
+                    column.name, ValidationError.requiredError, "", "", "fatal"]
+        if not present.any():
+            return
+
+        data = values[present]
+        positions = present.values.nonzero()[0]
+        type_ok = pd.Series(True, index=data.index)
+        if column.check_type is not None:
+            datatype = self.type_names.get(column.name)
+            if datatype in self.TYPE_PATTERNS:
+                type_ok = data.str.contains(self.TYPE_PATTERNS[datatype], regex=True, na=False)
+                # Values the pattern rejects may still be accepted by int() or Decimal()
+                slow = ~type_ok
+                if slow.any():
+                    type_ok[slow] = data[slow].map(column.check_type).astype(bool)
+            else:
+                type_ok = data.map(column.check_type).astype(bool)
+            for position, value in zip(positions[~type_ok.values], data[~type_ok].values):
+                failed_cells[(position, column_index)] = [
+                    column.name, ValidationError.typeError, value, "", "fatal"]
+
+        if column.length is not None:
+            too_long = type_ok & (data.str.len() > column.length)
+            for position, value in zip(positions[too_long.values], data[too_long].values):
+                failed_cells[(position, column_index)] = [
+                    column.name, ValidationError.lengthError, value, "", "warning"]
@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from dataactcore.models.errorModels import ErrorMetadata
 from dataactvalidator.validation_handlers.validationError import ValidationError
 
@@ -5,11 +7,37 @@ from dataactcore.interfaces.db import GlobalDB
 
 from dataactcore.models.lookups import ERROR_TYPE_DICT
 
+
+class RowErrorCount(object):
+    """ Running count of one kind of error in a job """
+    __slots__ = ("filename", "fieldName", "jobId", "errorType", "numErrors", "firstRow", "originalRuleLabel",
+                 "fileTypeId", "targetFileId", "severity")
+
+    def __init__(self, filename, fieldName, jobId, errorType, numErrors, firstRow, originalRuleLabel, fileTypeId,
+                 targetFileId, severity):
+        self.filename = filename
+        self.fieldName = fieldName
+        self.jobId = jobId
+        self.errorType = errorType
+        self.numErrors = numErrors
+        self.firstRow = firstRow
+        self.originalRuleLabel = originalRuleLabel
+        self.fileTypeId = fileTypeId
+        self.targetFileId = targetFileId
+        self.severity = severity
+
+    def copy(self):
+        return RowErrorCount(self.filename, self.fieldName, self.jobId, self.errorType, self.numErrors,
+                             self.firstRow, self.originalRuleLabel, self.fileTypeId, self.targetFileId,
+                             self.severity)
+
+
 class ErrorInterface:
     """Manages communication with error database."""
 
     def __init__(self):
         """ Create empty row error dict """
+        # RowErrorCount objects keyed by (job_id, field_name, error_type)
         self.rowErrors = {}
 
     def recordRowError(self, job_id, filename, field_name, error_type, row, original_label=None, file_type_id=None,
@@ -27,65 +55,79 @@ class ErrorInterface:
             target_file_id: Id of target file type
             severity_id: Id of error severity
         """
-        key = "".join([str(job_id), field_name, str(error_type)])
-        if key in self.rowErrors:
-            self.rowErrors[key]["numErrors"] += 1
+        key = (job_id, field_name, error_type)
+        errorCount = self.rowErrors.get(key)
+        if errorCount is not None:
+            errorCount.numErrors += 1
         else:
-            errorDict = {"filename": filename, "fieldName": field_name, "jobId": job_id, "errorType": error_type,
-                         "numErrors": 1,
-                         "firstRow": row, "originalRuleLabel": original_label, "fileTypeId": file_type_id,
-                         "targetFileId": target_file_id, "severity": severity_id}
-            self.rowErrors[key] = errorDict
+            self.rowErrors[key] = RowErrorCount(filename, field_name, job_id, error_type, 1, row, original_label,
+                                                file_type_id, target_file_id, severity_id)
+
+    def mergeRowErrors(self, row_errors):
+        """ Add errors recorded by another ErrorInterface, which must come after the errors already recorded here
+
+        Args:
+            row_errors: rowErrors dict of the other ErrorInterface
+        """
+        for key, errorCount in row_errors.items():
+            if key in self.rowErrors:
+                # Keep the first row recorded here, it was seen first
+                self.rowErrors[key].numErrors += errorCount.numErrors
+            else:
+                self.rowErrors[key] = errorCount.copy()
 
     def writeAllRowErrors(self, job_id):
-        """ Writes all recorded errors to database
+        """ Writes all recorded errors to database in a single insert
 
         Args:
             job_id: ID to write errors for
         """
         sess = GlobalDB.db().session
-        for key in self.rowErrors.keys():
-            errorDict = self.rowErrors[key]
-            # Set info for this error
-            thisJob = errorDict["jobId"]
+        now = datetime.utcnow()
+        errorRows = []
+        for (thisJob, field_name, errorType), errorCount in self.rowErrors.items():
             if int(job_id) != int(thisJob):
                 # This row is for a different job, skip it
                 continue
-            field_name = errorDict["fieldName"]
-            try:
-                # If last part of key is an int, it's one of our prestored messages
-                error_type = int(errorDict["errorType"])
-            except ValueError:
+            prestoredType = self.getPrestoredErrorType(errorType)
+            if prestoredType is None:
                 # For rule failures, it will hold the error message
-                errorMsg = errorDict["errorType"]
-                if "Field must be no longer than specified limit" in errorMsg:
-                    ruleFailedId = ERROR_TYPE_DICT['length_error']
+                if "Field must be no longer than specified limit" in errorType:
+                    errorTypeId = ERROR_TYPE_DICT['length_error']
                 else:
-                    ruleFailedId = ERROR_TYPE_DICT['rule_failed']
-                errorRow = ErrorMetadata(job_id=thisJob, filename=errorDict["filename"], field_name=field_name,
-                                         error_type_id=ruleFailedId, rule_failed=errorMsg,
-                                         occurrences=errorDict["numErrors"], first_row=errorDict["firstRow"],
-                                         original_rule_label=errorDict["originalRuleLabel"],
-                                         file_type_id=errorDict["fileTypeId"],
-                                         target_file_type_id=errorDict["targetFileId"],
-                                         severity_id=errorDict["severity"])
+                    errorTypeId = ERROR_TYPE_DICT['rule_failed']
+                ruleFailed = errorType
             else:
-                # This happens if cast to int was successful
-                errorString = ValidationError.getErrorTypeString(error_type)
-                errorId = ERROR_TYPE_DICT[errorString]
-                # Create error metadata
-                errorRow = ErrorMetadata(job_id=thisJob, filename=errorDict["filename"], field_name=field_name,
-                                         error_type_id=errorId, occurrences=errorDict["numErrors"],
-                                         first_row=errorDict["firstRow"],
-                                         rule_failed=ValidationError.getErrorMessage(error_type),
-                                         original_rule_label=errorDict["originalRuleLabel"],
-                                         file_type_id=errorDict["fileTypeId"],
-                                         target_file_type_id=errorDict["targetFileId"],
-                                         severity_id=errorDict["severity"])
-
-            sess.add(errorRow)
+                errorTypeId = ERROR_TYPE_DICT[ValidationError.getErrorTypeString(prestoredType)]
+                ruleFailed = ValidationError.getErrorMessage(prestoredType)
+            errorRows.append({
+                "job_id": thisJob, "filename": errorCount.filename, "field_name": field_name,
+                "error_type_id": errorTypeId, "rule_failed": ruleFailed, "occurrences": errorCount.numErrors,
+                "first_row": errorCount.firstRow, "original_rule_label": errorCount.originalRuleLabel,
+                "file_type_id": errorCount.fileTypeId, "target_file_type_id": errorCount.targetFileId,
+                "severity_id": errorCount.severity, "created_at": now, "updated_at": now})
 
+        if errorRows:
+            sess.execute(ErrorMetadata.__table__.insert().values(errorRows))
         # Commit the session to write all rows
         sess.commit()
         # Clear the dictionary
-        self.rowErrors = {}
\ No newline at end of file
+        self.rowErrors = {}
+
+    @staticmethod
+    def getPrestoredErrorType(errorType):
+        """ Get the ValidationError type for an error
+
+        Args:
+            errorType: error type as recorded, an int for prestored messages or the text of a rule failure
+
+        Returns:
+            The prestored error type as an int, or None for rule failures
+        """
+        if isinstance(errorType, int):
+            return errorType
+        try:
+            # Prestored types recorded as strings are still prestored messages
+            return int(errorType)
+        except ValueError:
+            return None
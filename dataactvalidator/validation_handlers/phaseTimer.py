@@ -0,0 +1,122 @@
+from collections import OrderedDict
+from datetime import datetime
+import logging
+import time
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from dataactcore.config import CONFIG_BROKER
+from dataactcore.interfaces.db import GlobalDB
+from dataactcore.models.jobModels import JobPhaseTiming
+
+
+logger = logging.getLogger(__name__)
+_exception_logger = logging.getLogger('deprecated.exception')
+
+
+class PhaseTiming(object):
+    """ Totals for one phase of a validation job """
+
+    def __init__(self):
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.rows = None
+        self.bytes_read = None
+
+    @property
+    def rows_per_second(self):
+        if not self.rows or not self.wall_seconds:
+            return None
+        return self.rows / self.wall_seconds
+
+
+class PhaseTimer(object):
+    """
+    Adds up the wall and CPU time a validation job spends in each of its phases.
+
+    Phases that interleave row by row are timed as laps, each lap ends the
+    previous one and starts the next, so timing a row costs two clock reads:
+
+        started = timer.start()
+        record = readRecord()
+        started = timer.lap("read", started)
+        plan.validate(record)
+        started = timer.lap("validate", started)
+
+    CPU time is for the whole process, so it includes the S3 prefetch and
+    upload threads and excludes worker processes.
+    """
+
+    def __init__(self):
+        self.phases = OrderedDict()
+
+    @staticmethod
+    def start():
+        """ Returns the wall and CPU clocks to pass to lap """
+        return time.perf_counter(), time.process_time()
+
+    def lap(self, phase, started):
+        """ Add the time since started to phase
+
+        Args:
+            phase: Name of the phase
+            started: Clocks from start or the previous lap
+
+        Returns:
+            Clocks to pass to the next lap
+        """
+        now = time.perf_counter(), time.process_time()
+        timing = self.phases.get(phase)
+        if timing is None:
+            timing = self.phases[phase] = PhaseTiming()
+        timing.wall_seconds += now[0] - started[0]
+        timing.cpu_seconds += now[1] - started[1]
+        return now
+
+    def count(self, phase, rows=None, bytes_read=None):
+        """ Set the rows handled and bytes read by a phase that has been timed
+
+        Args:
+            phase: Name of the phase
+            rows: Number of rows the phase handled
+            bytes_read: Number of bytes of the file the phase read
+        """
+        timing = self.phases.get(phase)
+        if timing is None:
+            return
+        if rows is not None:
+            timing.rows = rows
+        if bytes_read is not None:
+            timing.bytes_read = bytes_read
+
+    def record(self, job_id):
+        """ Log each phase and store it in job_phase_timing
+
+        Each phase is logged with its values as extra fields on the log record, for
+        formatters that write structured logs. Set record_phase_timing to false to
+        skip storing them. A failure to store them is logged and not raised.
+
+        Args:
+            job_id: ID of the job that was timed
+        """
+        now = datetime.utcnow()
+        rows = []
+        for phase, timing in self.phases.items():
+            fields = {"job_id": job_id, "phase": phase, "wall_seconds": timing.wall_seconds,
+                      "cpu_seconds": timing.cpu_seconds, "rows": timing.rows, "bytes_read": timing.bytes_read,
+                      "rows_per_second": timing.rows_per_second}
+            logger.info('VALIDATOR_INFO: job_id: %s phase: %s wall_seconds: %.3f cpu_seconds: %.3f rows: %s '
+                        'bytes_read: %s rows_per_second: %s', job_id, phase, timing.wall_seconds,
+                        timing.cpu_seconds, timing.rows, timing.bytes_read,
+                        None if timing.rows_per_second is None else round(timing.rows_per_second, 1),
+                        extra=fields)
+            rows.append(dict(fields, created_at=now, updated_at=now))
+
+        if not rows or not CONFIG_BROKER.get('record_phase_timing', True):
+            return
+        try:
+            conn = GlobalDB.db().connection
+            conn.execute(JobPhaseTiming.__table__.delete().where(JobPhaseTiming.job_id == job_id))
+            conn.execute(JobPhaseTiming.__table__.insert().values(rows))
+        except SQLAlchemyError:
+            _exception_logger.exception('VALIDATOR_INFO: Could not record phase timing for job_id: %s', job_id)
@@ -0,0 +1,252 @@
+from datetime import datetime
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+import boto
+from sqlalchemy import literal, or_, select
+
+from dataactcore.aws.s3UrlHandler import s3UrlHandler
+from dataactcore.config import CONFIG_BROKER
+from dataactcore.interfaces.db import GlobalDB
+from dataactcore.models.errorModels import ErrorMetadata, ErrorReport, RowError
+from dataactcore.models.jobModels import Job, PublishStatus, Submission, ValidationCache
+from dataactcore.models.lookups import JOB_STATUS_DICT
+from dataactcore.models.validationModels import RuleSql
+from dataactcore.utils.report import get_report_path
+from dataactvalidator.filestreaming.rowErrorWriter import materializeReports
+from dataactvalidator.validation_handlers.stagingPartitions import StagingPartitions
+
+
+_exception_logger = logging.getLogger('deprecated.exception')
+
+# error_metadata columns kept in the cache, the job and filename come from the job reusing them
+ERROR_METADATA_COLUMNS = ("field_name", "error_type_id", "occurrences", "first_row", "rule_failed", "file_type_id",
+                          "target_file_type_id", "original_rule_label", "severity_id")
+
+# Publish statuses A16 counts as published
+PUBLISHED_STATUSES = ("published", "updated")
+
+
+class ResultCache(object):
+    """
+    Reuses the results of a completed validation when an identical file is
+    validated again for the same file type, schema and rule versions,
+    agency and reporting period. Domain value loads clear the cache, as the
+    SQL rules check against them.
+    """
+
+    # Bytes hashed at a time for local files
+    BLOCK_SIZE = 1024 ** 2
+
+    @classmethod
+    def getContentHash(cls, fileName, isLocal):
+        """ Hash the contents of an uploaded file
+
+        Args:
+            fileName: Path of a local file, or key of the file in the S3 bucket
+            isLocal: True for a local file, which is hashed with SHA-256, S3 files use their ETag
+
+        Returns:
+            The hash as a string, or None if the file could not be found
+        """
+        if not isLocal:
+            etag = s3UrlHandler.getFileETag(fileName)
+            return None if etag is None else "etag:" + etag
+        if not os.path.exists(fileName):
+            return None
+        digest = hashlib.sha256()
+        with open(fileName, "rb") as contents:
+            for block in iter(lambda: contents.read(cls.BLOCK_SIZE), b""):
+                digest.update(block)
+        return "sha256:" + digest.hexdigest()
+
+    @staticmethod
+    def getCacheKey(job, contentHash):
+        """ Combine a file's content hash with everything else its validation results depend on
+
+        Args:
+            job: Job object for the csv_record_validation job
+            contentHash: Hash of the file's contents
+
+        Returns:
+            Cache key as a hex string
+        """
+        sess = GlobalDB.db().session
+        submission = job.submission
+        # A16 passes when the agency has no other published or publishable submission for the fiscal year,
+        # so publishing one gives the agency's files new keys
+        otherPublished = submission.cgac_code is not None and sess.query(Submission.submission_id). \
+            outerjoin(PublishStatus, Submission.publish_status_id == PublishStatus.publish_status_id). \
+            filter(Submission.submission_id != submission.submission_id,
+                   Submission.cgac_code == submission.cgac_code,
+                   Submission.reporting_fiscal_year == submission.reporting_fiscal_year,
+                   or_(PublishStatus.name.in_(PUBLISHED_STATUSES), Submission.publishable == True)). \
+            first() is not None
+        digest = hashlib.sha256()
+        # Rules such as A33 select SF-133 rows by the submission's agency
+        for part in (contentHash, job.file_type_id, job.file_type.schema_version, submission.reporting_start_date,
+                     submission.reporting_end_date, submission.is_quarter_format, submission.cgac_code,
+                     otherPublished):
+            digest.update(repr(part).encode("utf-8"))
+            digest.update(b"\0")
+        # Any change to the file type's SQL rules gives a new key
+        rules = sess.query(RuleSql.rule_sql_id, RuleSql.rule_sql, RuleSql.rule_label, RuleSql.rule_error_message,
+                           RuleSql.rule_severity_id). \
+            filter(RuleSql.file_id == job.file_type_id, RuleSql.rule_cross_file_flag == False). \
+            order_by(RuleSql.rule_sql_id).all()
+        for rule in rules:
+            digest.update(repr(tuple(rule)).encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    @staticmethod
+    def find(job, cacheKey):
+        """ Find cached results for a job
+
+        Args:
+            job: Job object being validated
+            cacheKey: Key from getCacheKey
+
+        Returns:
+            ValidationCache object, preferring the job's own results, or None if nothing matches
+        """
+        sess = GlobalDB.db().session
+        return sess.query(ValidationCache).join(Job, ValidationCache.job_id == Job.job_id). \
+            filter(ValidationCache.cache_key == cacheKey,
+                   or_(Job.job_id == job.job_id, Job.job_status_id == JOB_STATUS_DICT['finished'])). \
+            order_by((ValidationCache.job_id == job.job_id).desc(), ValidationCache.validation_cache_id.desc()). \
+            first()
+
+    @staticmethod
+    def discard(job_id):
+        """ Drop a job's cached results, before its staging rows and reports are replaced """
+        sess = GlobalDB.db().session
+        sess.query(ValidationCache).filter(ValidationCache.job_id == job_id).delete()
+        sess.commit()
+
+    @staticmethod
+    def clear(sess):
+        """ Drop every cached result, for when the data the SQL rules check against changes
+
+        Args:
+            sess: Database session, committed by the caller
+        """
+        sess.query(ValidationCache).delete()
+
+    @staticmethod
+    def store(job_id, cacheKey, fileSize, numberOfRows, numberOfRowsValid):
+        """ Cache the results of a completed validation
+
+        Args:
+            job_id: ID of the job, its staging rows and reports hold the results
+            cacheKey: Key from getCacheKey
+            fileSize: Size of the validated file
+            numberOfRows: Number of rows in the file, including the header
+            numberOfRowsValid: Number of rows that passed validation
+        """
+        sess = GlobalDB.db().session
+        errors = sess.query(ErrorMetadata).filter(ErrorMetadata.job_id == job_id).all()
+        errorMetadata = [{column: getattr(error, column) for column in ERROR_METADATA_COLUMNS} for error in errors]
+        sess.query(ValidationCache).filter(ValidationCache.job_id == job_id).delete()
+        sess.add(ValidationCache(cache_key=cacheKey, job_id=job_id, file_size=fileSize, number_of_rows=numberOfRows,
+                                 number_of_rows_valid=numberOfRowsValid, error_metadata=json.dumps(errorMetadata)))
+        sess.commit()
+
+    @classmethod
+    def reuse(cls, job, cached, model, filename, isLocal, directory):
+        """ Give a job the cached results, copying them over when they belong to another job
+
+        Args:
+            job: Job object being validated
+            cached: ValidationCache object from find
+            model: Staging table model for the job's file type
+            filename: Name of the job's file, recorded with its error metadata
+            isLocal: True if reports are in the local directory rather than S3
+            directory: Folder for local reports
+        """
+        sess = GlobalDB.db().session
+        if cached.job_id != job.job_id:
+            source = cached.job
+            _exception_logger.info(
+                'VALIDATOR_INFO: Reusing results of job_id: %s for job_id: %s', source.job_id, job.job_id)
+            cls.copyStaging(model, source, job)
+            cls.copyReports(source, job, isLocal, directory)
+            # The staging rows changed, so the next cross-file run checks this file's pairs
+            job.last_validated = datetime.utcnow()
+        else:
+            _exception_logger.info('VALIDATOR_INFO: Reusing earlier results of job_id: %s', job.job_id)
+
+        now = datetime.utcnow()
+        sess.query(ErrorMetadata).filter(ErrorMetadata.job_id == job.job_id).delete()
+        errorRows = [dict(error, job_id=job.job_id, filename=filename, created_at=now, updated_at=now)
+                     for error in json.loads(cached.error_metadata)]
+        if errorRows:
+            sess.execute(ErrorMetadata.__table__.insert().values(errorRows))
+        if cached.job_id != job.job_id:
+            cls.store(job.job_id, cached.cache_key, cached.file_size, cached.number_of_rows,
+                      cached.number_of_rows_valid)
+        sess.commit()
+
+    @staticmethod
+    def copyStaging(model, source, job):
+        """ Replace the job's staging rows with a copy of the source job's rows """
+        sess = GlobalDB.db().session
+        table = model.__table__
+        StagingPartitions.clear(sess, model, job.submission_id)
+        columns = [column for column in table.columns if not column.primary_key]
+        values = []
+        for column in columns:
+            if column.name == "submission_id":
+                values.append(literal(job.submission_id))
+            elif column.name == "job_id":
+                values.append(literal(job.job_id))
+            else:
+                values.append(column)
+        sess.execute(table.insert().from_select(
+            [column.name for column in columns],
+            select(values).where(table.c.submission_id == source.submission_id).
+            where(table.c.job_id == source.job_id)))
+
+    @staticmethod
+    def copyReports(source, job, isLocal, directory):
+        """ Copy the source job's error and warning reports, and their stored rows, to the job's report names """
+        sess = GlobalDB.db().session
+        names = {get_report_path(source, reportType): get_report_path(job, reportType)
+                 for reportType in ('error', 'warning')}
+        # Lazy reports have to exist before they can be copied
+        materializeReports(list(names), isLocal, directory)
+        if isLocal:
+            for sourceName, name in names.items():
+                shutil.copyfile(os.path.join(directory, sourceName), os.path.join(directory, name))
+        else:
+            bucketName = CONFIG_BROKER['aws_bucket']
+            bucket = boto.s3.connect_to_region(CONFIG_BROKER['aws_region']).get_bucket(bucketName)
+            for sourceName, name in names.items():
+                # Forcing forward slash here instead of using os.path to write a valid path for S3
+                bucket.copy_key("".join(["errors/", name]), bucketName, "".join(["errors/", sourceName]))
+
+        # Rows kept for the row_errors route
+        sess.query(ErrorReport).filter(ErrorReport.job_id == job.job_id).delete()
+        now = datetime.utcnow()
+        rowColumns = [column for column in RowError.__table__.columns if column.name != "row_error_id"]
+        for report in sess.query(ErrorReport).filter(ErrorReport.report_name.in_(list(names))).all():
+            copy = ErrorReport(job_id=job.job_id, report_name=names[report.report_name],
+                               severity_id=report.severity_id, cross_file=False, materialized=True,
+                               created_at=now, updated_at=now)
+            sess.add(copy)
+            sess.flush()
+            values = []
+            for column in rowColumns:
+                if column.name == "error_report_id":
+                    values.append(literal(copy.error_report_id))
+                elif column.name == "job_id":
+                    values.append(literal(job.job_id))
+                else:
+                    values.append(column)
+            sess.execute(RowError.__table__.insert().from_select(
+                [column.name for column in rowColumns],
+                select(values).where(RowError.error_report_id == report.error_report_id).
+                order_by(RowError.row_error_id)))
@@ -0,0 +1,140 @@
+import hashlib
+import json
+
+from dataactcore.config import CONFIG_BROKER
+
+
+class RuleStatements(object):
+    """
+    Runs SQL rules with the submission ID bound as a parameter, rather than
+    formatted into the rule's SQL.
+
+    With prepare_rule_sql set, a rule that runs again on a connection it ran
+    on before is prepared there, so connections that outlive a job don't
+    parse and plan their rules for every submission. Connections that only
+    serve one job, like those of the validator app, whose engine is disposed
+    after each request, never prepare anything. A prepared rule is a
+    temporary PL/pgSQL function that opens a cursor over the rule's query,
+    as a server-side cursor can't be declared over EXECUTE; PL/pgSQL keeps
+    the query's plan for the session, and the rows are fetched from the
+    cursor a batch at a time like those of a rule that isn't prepared.
+    Functions are named after the rule's ID and a hash of its SQL, so a rule
+    reloaded with new SQL is prepared again under a new name.
+    """
+
+    # Keys of the names of the functions prepared on a connection and of the number of times each rule ran there,
+    # in the connection's info dictionary, which is cleared if the database connection behind it is replaced
+    INFO_KEY = "prepared_rule_statements"
+    RUNS_KEY = "rule_statement_runs"
+
+    @staticmethod
+    def parameterize(ruleSql, placeholder):
+        """ Replace the submission ID placeholders of a rule's SQL, written as {} or {0}
+
+        Args:
+            ruleSql: SQL of the rule
+            placeholder: Parameter marker to put in their place
+
+        Returns:
+            SQL with the parameter marker
+        """
+        return ruleSql.format(placeholder)
+
+    @staticmethod
+    def statementName(rule):
+        """ Name of a rule's prepared function, from its ID and a hash of its SQL """
+        digest = hashlib.sha1(rule.rule_sql.encode("utf-8")).hexdigest()[:16]
+        return "rule_{}_{}".format(rule.rule_sql_id, digest)
+
+    @classmethod
+    def prepare(cls, conn, rule):
+        """ Prepare a rule on a connection, unless it has already been prepared there
+
+        Args:
+            conn: Connection the rule will run on
+            rule: RuleSql object
+
+        Returns:
+            Name of the rule's function, taking the submission ID and a cursor name and returning the cursor name
+        """
+        prepared = conn.info.setdefault(cls.INFO_KEY, set())
+        name = cls.statementName(rule)
+        if name not in prepared:
+            query = cls.parameterize(rule.rule_sql, "$1").strip().rstrip(";")
+            conn.execute("CREATE OR REPLACE FUNCTION pg_temp.{}(integer, refcursor) RETURNS refcursor AS $rule$ "
+                         "DECLARE failures refcursor := $2; BEGIN OPEN failures NO SCROLL FOR {}; "
+                         "RETURN failures; END $rule$ LANGUAGE plpgsql".format(name, query))
+            prepared.add(name)
+        return name
+
+    @classmethod
+    def execute(cls, conn, rule, submissionId):
+        """ Run a rule against a submission on a server-side cursor
+
+        Args:
+            conn: Connection to run the rule on
+            rule: RuleSql object
+            submissionId: ID of the submission to check
+
+        Returns:
+            Result of the rule's failing rows, with keys, fetchmany and close like a ResultProxy
+        """
+        if CONFIG_BROKER.get('prepare_rule_sql', False):
+            runs = conn.info.setdefault(cls.RUNS_KEY, {})
+            name = cls.statementName(rule)
+            runs[name] = runs.get(name, 0) + 1
+            if runs[name] > 1:
+                return RuleCursor(conn, cls.prepare(conn, rule), submissionId)
+        return conn.execution_options(stream_results=True).execute(cls.boundSql(rule), submission_id=submissionId)
+
+    @classmethod
+    def explain(cls, conn, rule, submissionId, options="ANALYZE, BUFFERS"):
+        """ Run EXPLAIN on a rule with the submission ID bound
+
+        A prepared rule's query is planned the same way for its first runs, PostgreSQL only considers a generic
+        plan for it after five executions.
+
+        Args:
+            conn: Connection to run the rule on
+            rule: RuleSql object
+            submissionId: ID of the submission to check
+            options: EXPLAIN options, the plan is always returned as JSON
+
+        Returns:
+            The plan as parsed from EXPLAIN's JSON output, a list with one dict
+        """
+        plan = conn.execute("EXPLAIN ({}, FORMAT JSON) {}".format(options, cls.boundSql(rule)),
+                            submission_id=submissionId).scalar()
+        # psycopg2 parses json columns, older versions return EXPLAIN's output as text
+        return json.loads(plan) if isinstance(plan, str) else plan
+
+    @classmethod
+    def boundSql(cls, rule):
+        """ A rule's SQL with a %(submission_id)s parameter to bind, for running it without preparing it """
+        # Percent signs in the rule have to be escaped once there is a parameter to bind
+        return cls.parameterize(rule.rule_sql.replace("%", "%%"), "%(submission_id)s")
+
+
+class RuleCursor(object):
+    """ Failing rows of a prepared rule, fetched from the cursor its function opens """
+
+    def __init__(self, conn, name, submissionId):
+        self.conn = conn
+        self.cursor = conn.execute("SELECT pg_temp.{}(%(submission_id)s, %(cursor)s)".format(name),
+                                   submission_id=submissionId, cursor="{}_failures".format(name)).scalar()
+        self.closed = False
+
+    def keys(self):
+        # Before the first row, FETCH RELATIVE 0 returns no rows but describes the columns
+        result = self.conn.execute('FETCH RELATIVE 0 FROM "{}"'.format(self.cursor))
+        keys = result.keys()
+        result.close()
+        return keys
+
+    def fetchmany(self, size):
+        return self.conn.execute('FETCH FORWARD {} FROM "{}"'.format(int(size), self.cursor)).fetchall()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.conn.execute('CLOSE "{}"'.format(self.cursor))
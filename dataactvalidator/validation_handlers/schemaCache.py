@@ -0,0 +1,104 @@
+from collections import namedtuple
+import threading
+from types import MappingProxyType
+
+from sqlalchemy.orm import joinedload
+
+from dataactcore.interfaces.db import GlobalDB
+from dataactcore.models.jobModels import FileType
+from dataactcore.models.validationModels import FileColumn
+
+
+# Read-only stand-ins for FieldType and FileColumn rows, safe to share between jobs
+FieldTypeDescriptor = namedtuple('FieldTypeDescriptor', ['field_type_id', 'name'])
+ColumnDescriptor = namedtuple('ColumnDescriptor', ['file_column_id', 'file_id', 'name', 'name_short', 'required',
+                                                   'padded_flag', 'length', 'field_type'])
+
+
+class SchemaCache(object):
+    """
+    Process-wide cache of the FileColumn schema for each file type and of the
+    long and short column name maps. Each lookup checks the schema_version of
+    every file type, which SchemaLoader.loadFields bumps, and drops anything
+    loaded under an older version.
+    """
+    _lock = threading.Lock()
+    _versions = {}
+    _columns = {}
+    _nameMaps = None
+
+    @classmethod
+    def getColumns(cls, fileId):
+        """ Get the schema for a file type
+
+        Args:
+            fileId: ID of the file type
+
+        Returns:
+            Tuple of ColumnDescriptor objects, in the same order as a FileColumn query
+        """
+        sess = GlobalDB.db().session
+        cls.checkVersions(sess)
+        columns = cls._columns.get(fileId)
+        if columns is None:
+            rows = sess.query(FileColumn). \
+                options(joinedload('field_type')). \
+                filter(FileColumn.file_id == fileId). \
+                all()
+            columns = tuple(cls.describe(row) for row in rows)
+            with cls._lock:
+                cls._columns[fileId] = columns
+        return columns
+
+    @classmethod
+    def getNameMaps(cls):
+        """ Get the column name maps across all file types
+
+        Returns:
+            Tuple of read-only long to short and short to long name dicts
+        """
+        sess = GlobalDB.db().session
+        cls.checkVersions(sess)
+        nameMaps = cls._nameMaps
+        if nameMaps is None:
+            colnames = sess.query(FileColumn.name, FileColumn.name_short).all()
+            nameMaps = (MappingProxyType({row.name: row.name_short for row in colnames}),
+                        MappingProxyType({row.name_short: row.name for row in colnames}))
+            with cls._lock:
+                cls._nameMaps = nameMaps
+        return nameMaps
+
+    @classmethod
+    def checkVersions(cls, sess):
+        """ Drop cached schemas whose file type has been reloaded since they were cached
+
+        Args:
+            sess: Database session
+        """
+        versions = dict(sess.query(FileType.file_type_id, FileType.schema_version).all())
+        if versions == cls._versions:
+            return
+        with cls._lock:
+            for fileId in set(versions) | set(cls._versions):
+                if versions.get(fileId) != cls._versions.get(fileId):
+                    cls._columns.pop(fileId, None)
+                    # Name maps cover every file type
+                    cls._nameMaps = None
+            cls._versions = versions
+
+    @classmethod
+    def clear(cls):
+        """ Drop everything, the next lookup reloads from the database """
+        with cls._lock:
+            cls._versions = {}
+            cls._columns = {}
+            cls._nameMaps = None
+
+    @staticmethod
+    def describe(column):
+        """ Copy a FileColumn row, with its FieldType, into a ColumnDescriptor """
+        fieldType = column.field_type
+        if fieldType is not None:
+            fieldType = FieldTypeDescriptor(fieldType.field_type_id, fieldType.name)
+        return ColumnDescriptor(column.file_column_id, column.file_id, column.name, column.name_short,
+                                column.required, column.padded_flag, column.length, fieldType)
@@ -0,0 +1,53 @@
+from sqlalchemy import text
+
+from dataactcore.models.domainModels import SubmissionSF133
+from dataactcore.models.stagingModels import Appropriation, ObjectClassProgramActivity
+
+
+class SF133WorkingSet(object):
+    """
+    Copies the SF-133 lines a submission's rules compare against into submission_sf_133.
+
+    Most A and B rules join the staged file to sf_133 on TAS and the submission's
+    period. Rather than each of them probing all of sf_133, the lines for the TAS in
+    the submission's appropriations and program activity files are copied once,
+    before the file's SQL rules run, and the rules join to that copy on
+    submission_id and TAS. Rows are kept one per line, as in sf_133, so rules still
+    pick their lines with sf.line. Rules reading other periods or TAS missing from
+    the submission (A33, A34) still read sf_133.
+    """
+
+    TABLE = SubmissionSF133.__tablename__
+    STAGING_MODELS = [Appropriation, ObjectClassProgramActivity]
+
+    @classmethod
+    def readsWorkingSet(cls, sql):
+        """ True if a rule's sql reads the working set """
+        return cls.TABLE in sql
+
+    @classmethod
+    def build(cls, conn, submissionId):
+        """ Replace a submission's working set with the SF-133 lines for its TAS and period
+
+        Args:
+            conn: Database connection or session, committed by the caller
+            submissionId: ID of the submission to build the working set for
+
+        Returns:
+            Number of lines copied
+        """
+        stagedTas = " UNION ".join("SELECT tas FROM {} WHERE submission_id = :submission_id".format(
+            model.__tablename__) for model in cls.STAGING_MODELS)
+        conn.execute(text("DELETE FROM {} WHERE submission_id = :submission_id".format(cls.TABLE)),
+                     {"submission_id": submissionId})
+        # Another validation of the submission may have rebuilt the working set since it was deleted
+        result = conn.execute(text(
+            "INSERT INTO {} (created_at, updated_at, submission_id, tas, line, amount) "
+            "SELECT NOW(), NOW(), sub.submission_id, sf.tas, sf.line, sf.amount "
+            "FROM sf_133 AS sf "
+            "JOIN submission AS sub ON sf.period = sub.reporting_fiscal_period "
+            "AND sf.fiscal_year = sub.reporting_fiscal_year "
+            "WHERE sub.submission_id = :submission_id AND sf.tas IN ({}) "
+            "ON CONFLICT (submission_id, tas, line) DO NOTHING".format(cls.TABLE, stagedTas)),
+            {"submission_id": submissionId})
+        return result.rowcount
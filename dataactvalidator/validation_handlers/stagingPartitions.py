@@ -0,0 +1,149 @@
+import logging
+import random
+import re
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from dataactcore.config import CONFIG_BROKER
+from dataactcore.interfaces.db import GlobalDB
+
+
+_exception_logger = logging.getLogger('deprecated.exception')
+
+# SQLSTATE of a statement that gave up waiting for a lock after lock_timeout
+LOCK_NOT_AVAILABLE = '55P03'
+
+
+class StagingPartitions(object):
+    """
+    Clears a submission's rows from a staging table.
+
+    Staging tables that the migrations partitioned by submission_id (on
+    PostgreSQL 12 and up) have one partition per submission, so clearing a
+    submission truncates its partition, and rules that filter on
+    submission_id only read that partition. Rows loaded before the tables
+    were partitioned stay in each table's default partition, named
+    {table}_default, and are deleted from there the first time their
+    submission is cleared. Creating a partition for one of those older
+    submissions scans the default partition once. Tables that are not
+    partitioned have the submission's rows deleted.
+
+    Creating or dropping a partition locks the whole staging table, so it
+    runs in a short transaction of its own that gives up waiting for the
+    lock after staging_partition_lock_timeout milliseconds, and is retried
+    up to staging_partition_retries times. Partitions of deleted submissions
+    are dropped by dropOrphaned, see scripts/drop_staging_partitions.py.
+
+    The partitions of every submission that is kept stay, so their number
+    grows with the submissions. That is why partitioning needs PostgreSQL
+    12, which prunes the partitions a query rules out before locking them,
+    so planning a rule on one submission does not get slower as partitions
+    are added.
+    """
+
+    # Staging table name to whether it is partitioned, looked up once per process
+    _partitioned = {}
+
+    @classmethod
+    def isPartitioned(cls, sess, table):
+        """ True if a staging table is partitioned by submission """
+        if table not in cls._partitioned:
+            relkind = sess.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"),
+                                   {"name": table}).scalar()
+            cls._partitioned[table] = relkind == 'p'
+        return cls._partitioned[table]
+
+    @staticmethod
+    def partitionName(table, submissionId):
+        """ Name of a submission's partition of a staging table """
+        return "{}_submission_{}".format(table, int(submissionId))
+
+    @classmethod
+    def clear(cls, sess, model, submissionId):
+        """ Remove a submission's rows from a staging table, creating its partition if the table is partitioned
+
+        Args:
+            sess: Database session, committed by the caller
+            model: Staging table model
+            submissionId: ID of the submission to clear
+        """
+        table = model.__tablename__
+        if not cls.isPartitioned(sess, table):
+            sess.query(model).filter(model.submission_id == submissionId).delete()
+            return
+        partition = cls.partitionName(table, submissionId)
+        if sess.execute(text("SELECT to_regclass(:name)"), {"name": partition}).scalar() is not None:
+            sess.execute("TRUNCATE {}".format(partition))
+            return
+        primaryKey = model.__table__.primary_key.columns.keys()
+        cls.runLocking([
+            # The new partition can't be created while the default partition holds rows that belong in it
+            "DELETE FROM {}_default WHERE submission_id = {}".format(table, int(submissionId)),
+            "CREATE TABLE IF NOT EXISTS {} PARTITION OF {} (PRIMARY KEY ({})) FOR VALUES IN ({})".format(
+                partition, table, ", ".join(primaryKey), int(submissionId))])
+
+    @classmethod
+    def dropOrphaned(cls, sess, models):
+        """ Drop the partitions of submissions that no longer exist
+
+        Args:
+            sess: Database session
+            models: Staging table models to drop partitions from
+
+        Returns:
+            Names of the partitions dropped
+        """
+        dropped = []
+        for model in models:
+            table = model.__tablename__
+            if not cls.isPartitioned(sess, table):
+                continue
+            pattern = re.compile(r"^{}_submission_(\d+)$".format(table))
+            partitions = {}
+            for name, in sess.execute(text("SELECT child.relname FROM pg_inherits "
+                                           "JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid "
+                                           "WHERE pg_inherits.inhparent = to_regclass(:name)"), {"name": table}):
+                match = pattern.match(name)
+                if match:
+                    partitions[int(match.group(1))] = name
+            if not partitions:
+                continue
+            existing = {row[0] for row in sess.execute(
+                text("SELECT submission_id FROM submission WHERE submission_id = ANY(:ids)"),
+                {"ids": list(partitions)})}
+            # Ends the session's transaction, so it holds no lock on the table while the partitions are dropped
+            sess.commit()
+            for submissionId in sorted(set(partitions) - existing):
+                cls.runLocking(["DROP TABLE IF EXISTS {}".format(partitions[submissionId])])
+                _exception_logger.info('VALIDATOR_INFO: Dropped staging partition %s', partitions[submissionId])
+                dropped.append(partitions[submissionId])
+        return dropped
+
+    @staticmethod
+    def runLocking(statements):
+        """ Run statements that lock a staging table in a transaction of their own, retrying when the lock
+        isn't granted within staging_partition_lock_timeout milliseconds
+
+        Args:
+            statements: SQL statements to run in one transaction
+        """
+        lockTimeout = int(CONFIG_BROKER.get('staging_partition_lock_timeout') or 2000)
+        retries = int(CONFIG_BROKER.get('staging_partition_retries', 5))
+        engine = GlobalDB.db().engine
+        for attempt in range(retries + 1):
+            try:
+                with engine.begin() as conn:
+                    conn.execute("SET LOCAL lock_timeout = {}".format(lockTimeout))
+                    for statement in statements:
+                        conn.execute(statement)
+                return
+            except OperationalError as e:
+                if getattr(e.orig, 'pgcode', None) != LOCK_NOT_AVAILABLE or attempt == retries:
+                    raise
+                # Back off, so the queries queued behind the lock request can run
+                delay = random.uniform(0.5, 1) * 2 ** attempt
+                _exception_logger.info(
+                    'VALIDATOR_INFO: Staging table lock not granted, retrying in %.1f seconds', delay)
+                time.sleep(delay)
@@ -1,17 +1,22 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import csv
 from csv import Error
+from datetime import datetime
 import os
 import logging
+import multiprocessing
+import shutil
+import tempfile
 
-from sqlalchemy import or_, and_
-from sqlalchemy.orm import joinedload
+from sqlalchemy import or_
 
 from dataactcore.config import CONFIG_BROKER
 from dataactcore.interfaces.db import GlobalDB
-from dataactcore.models.lookups import FILE_TYPE, FILE_TYPE_DICT, RULE_SEVERITY_DICT
-from dataactcore.models.validationModels import FileColumn
+from dataactcore.models.lookups import FILE_TYPE, FILE_TYPE_DICT, JOB_TYPE_DICT, RULE_SEVERITY_DICT
 from dataactcore.interfaces.function_bag import (
     createFileIfNeeded, writeFileError, markFileComplete, run_job_checks)
-from dataactcore.models.errorModels import ErrorMetadata
+from dataactcore.models.errorModels import ErrorMetadata, ErrorReport
 from dataactcore.models.jobModels import Job
 from dataactcore.utils.responseException import ResponseException
 from dataactcore.utils.jsonResponse import JsonResponse
@@ -24,8 +29,17 @@ from dataactvalidator.filestreaming.csvS3Reader import CsvS3Reader
 from dataactvalidator.filestreaming.csvLocalReader import CsvLocalReader
 from dataactvalidator.filestreaming.csvLocalWriter import CsvLocalWriter
 from dataactvalidator.filestreaming.csvS3Writer import CsvS3Writer
+from dataactvalidator.filestreaming.rowErrorWriter import (
+    RowErrorWriter, REPORT_HEADERS, CROSS_FILE_REPORT_HEADERS)
+from dataactvalidator.filestreaming.stagingWriter import StagingWriter
+from dataactvalidator.validation_handlers.chunkValidator import ChunkValidator
 from dataactvalidator.validation_handlers.errorInterface import ErrorInterface
+from dataactvalidator.validation_handlers.phaseTimer import PhaseTimer
+from dataactvalidator.validation_handlers.resultCache import ResultCache
+from dataactvalidator.validation_handlers.schemaCache import SchemaCache
+from dataactvalidator.validation_handlers.stagingPartitions import StagingPartitions
 from dataactvalidator.validation_handlers.validator import Validator
+from dataactvalidator.validation_handlers.validationPlan import ValidationPlan
 from dataactvalidator.validation_handlers.validationError import ValidationError
 from dataactvalidator.filestreaming.fieldCleaner import FieldCleaner
 from dataactcore.models.validationModels import RuleSql
@@ -33,13 +47,18 @@ from dataactcore.models.validationModels import RuleSql
 
 _exception_logger = logging.getLogger('deprecated.exception')
 
+# One segment of a file to validate in a worker process, see ValidationManager.loadParallel
+SegmentTask = namedtuple('SegmentTask', ['job_id', 'submission_id', 'file_type', 'file_name', 'segment_file',
+                                         'first_row', 'row_count', 'error_file', 'warning_file'])
+SegmentResult = namedtuple('SegmentResult', ['row_count', 'error_rows', 'row_errors'])
+
 
 class ValidationManager:
     """
     Outer level class, called by flask route
     """
-    reportHeaders = ["Field name", "Error message", "Row number", "Value provided", "Rule label"]
-    crossFileReportHeaders = ["Source File", "Target File", "Field names", "Error message", "Values provided", "Row number", "Rule label"]
+    reportHeaders = REPORT_HEADERS
+    crossFileReportHeaders = CROSS_FILE_REPORT_HEADERS
 
     def __init__(self,isLocal =True,directory=""):
         # Initialize instance variables
@@ -47,11 +66,8 @@ class ValidationManager:
         self.isLocal = isLocal
         self.directory = directory
 
-        # create long-to-short (and vice-versa) column name mappings
-        sess = GlobalDB.db().session
-        colnames = sess.query(FileColumn.name, FileColumn.name_short).all()
-        self.long_to_short_dict = {row.name: row.name_short for row in colnames}
-        self.short_to_long_dict = {row.name_short: row.name for row in colnames}
+        # long-to-short (and vice-versa) column name mappings
+        self.long_to_short_dict, self.short_to_long_dict = SchemaCache.getNameMaps()
 
     @staticmethod
     def markJob(job_id,jobTracker,status,filename=None, fileError = ValidationError.unknownError, extraInfo = None):
@@ -100,7 +116,7 @@ class ValidationManager:
             return CsvLocalReader()
         return CsvS3Reader()
 
-    def getWriter(self, regionName, bucketName, fileName, header):
+    def getWriter(self, regionName, bucketName, fileName, header, job_id=None, severity_id=None, engine=None):
         """ Gets the write type based on if its a local install or not.
 
         Args:
@@ -108,10 +124,26 @@ class ValidationManager:
             bucketName - AWS bucket to write to, not used for local
             fileName - File to be written
             header - Column headers for file to be written
+            job_id - Job the report belongs to, its rows are stored in row_error for this job if lazy_reports or
+                store_row_errors is set
+            severity_id - Severity of the rows in the report, used with job_id
+            engine - Engine for the stored rows' connection, defaults to the GlobalDB engine
         """
+        lazy = bool(CONFIG_BROKER.get('lazy_reports'))
+        if job_id is None or not (lazy or CONFIG_BROKER.get('store_row_errors')):
+            return self.getCsvWriter(regionName, bucketName, fileName, header)
+        # With lazy_reports the CSV is only written once someone asks for the report
+        csvWriter = None if lazy else self.getCsvWriter(regionName, bucketName, fileName, header)
+        return RowErrorWriter(engine or GlobalDB.db().engine, job_id, os.path.basename(fileName), header,
+                              severity_id, csvWriter)
+
+    def getCsvWriter(self, regionName, bucketName, fileName, header):
+        """ Gets the CSV writer type based on if its a local install or not, see getWriter """
+        # Reports are optionally gzipped, S3 serves them with a gzip Content-Encoding
+        compress = bool(CONFIG_BROKER.get('gzip_reports'))
         if self.isLocal:
-            return CsvLocalWriter(fileName, header)
-        return CsvS3Writer(regionName, bucketName, fileName, header)
+            return CsvLocalWriter(fileName, header, compress)
+        return CsvS3Writer(regionName, bucketName, fileName, header, compress)
 
     def getFileName(self,path):
         """ Return full path of error report based on provided name """
@@ -156,44 +188,350 @@ class ValidationManager:
                 # Don't count last row if empty
                 reduce_row = True
             else:
-                writer.write(["Formatting Error", ValidationError.readErrorMsg, str(row_number), ""])
-                error_list.recordRowError(job_id, self.filename, "Formatting Error", ValidationError.readError,
-                                          row_number, severity_id=RULE_SEVERITY_DICT['fatal'])
+                self.writeReadError(writer, row_number, job_id, error_list)
                 row_error_found = True
             return {}, reduce_row, True, False, row_error_found
         return record, reduce_row, False, False, row_error_found
 
-    def writeToStaging(self, record, job_id, submission_id, passed_validations, writer, row_number, model, error_list):
-        """ Write this record to the staging tables
+    def writeReadError(self, writer, row_number, job_id, error_list):
+        """ Record a formatting error for a row that could not be parsed
 
         Args:
-            record: Record to be written
+            writer: CsvWriter object
+            row_number: Row that could not be parsed
             job_id: ID of current job
-            submission_id: ID of current submission
-            passed_validations: True if record has not failed first validations
+            error_list: instance of ErrorInterface to keep track of errors
+        """
+        writer.write(["Formatting Error", ValidationError.readErrorMsg, str(row_number), ""])
+        error_list.recordRowError(job_id, self.filename, "Formatting Error", ValidationError.readError,
+                                  row_number, severity_id=RULE_SEVERITY_DICT['fatal'])
+
+    def loadRecords(self, reader, writer, warning_writer, file_type, interfaces, job_id, fields, plan,
+                    staging_writer, error_list, chunk_size=None, row_number=1, timer=None):
+        """ Read every record from the file, run the basic schema checks and buffer valid records for staging
+
+        Args:
+            reader: CsvReader object, already opened
             writer: CsvWriter object
-            row_number: Current row number
-            model: orm model for the current file
+            warning_writer: CsvWriter for warnings
+            file_type: Type of file for current job
+            interfaces: InterfaceHolder object
+            job_id: ID of current job
+            fields: List of FileColumn objects for this file type
+            plan: ValidationPlan for this file type
+            staging_writer: StagingWriter for the current file's staging table
             error_list: instance of ErrorInterface to keep track of errors
+            chunk_size: If set, validate this many rows at a time with ChunkValidator
+            row_number: Row number of the line before the first record, the header is row 1
+            timer: PhaseTimer to add the read, validate and staging_write phases to
 
         Returns:
-            Boolean indicating whether to skip current row
+            Tuple of the last row number read and a list of row numbers with errors
         """
-        sess = GlobalDB.db().session
+        rowNumber = row_number
+        errorRows = []
+        if timer is None:
+            timer = PhaseTimer()
+        if chunk_size:
+            return self.loadChunks(reader, writer, warning_writer, file_type, interfaces, job_id, fields, plan,
+                                   staging_writer, error_list, chunk_size, row_number, timer)
+
+        started = timer.start()
+
+        while not reader.is_finished:
+            rowNumber += 1
+
+            if (rowNumber % 100) == 0:
+                _exception_logger.info(
+                    'VALIDATOR_INFO: JobId: %s loading row %s',
+                    job_id, rowNumber)
+
+            #
+            # first phase of validations: read record and record a
+            # formatting error if there's a problem
+            #
+            (record, reduceRow, skipRow, doneReading, rowErrorHere) = self.readRecord(reader,writer,file_type,interfaces,rowNumber,job_id,fields,error_list)
+            started = timer.lap("read", started)
+            if reduceRow:
+                rowNumber -= 1
+            if rowErrorHere:
+                errorRows.append(rowNumber)
+            if doneReading:
+                # Stop reading from input file
+                break
+            elif skipRow:
+                # Do not write this row to staging, but continue processing future rows
+                continue
+
+            #
+            # second phase of validations: do basic schema checks
+            # (e.g., require fields, field length, data type)
+            #
+            # D files are obtained from upstream systems (ASP and FPDS) that perform their own basic validations,
+            # so these validations are not repeated here
+            if file_type in ["award", "award_procurement"]:
+                # Skip basic validations for D files, set as valid to trigger write to staging
+                passedValidations = True
+                valid = True
+            else:
+                passedValidations, failures, valid = plan.validate(record)
+            started = timer.lap("validate", started)
+            if valid:
+                errorRows.extend(self.writeToStaging(
+                    record, writer, rowNumber, staging_writer, job_id, error_list))
+                started = timer.lap("staging_write", started)
+
+            if not passedValidations:
+                if self.writeErrors(failures, interfaces, job_id, self.short_to_long_dict, writer, warning_writer, rowNumber, error_list):
+                    errorRows.append(rowNumber)
+                started = timer.lap("validate", started)
+
+        return rowNumber, errorRows
+
+    def loadParallel(self, job_id, submission_id, file_type, reader, writer, warning_writer, error_list,
+                     processes, rows_per_segment):
+        """ Split the file into segments of whole records, then validate and stage the segments in a pool of
+        worker processes. Reports and errors are merged in row order, so the results match a serial run.
+
+        Args:
+            job_id: ID of current job
+            submission_id: ID of the submission the job belongs to
+            file_type: Type of file for current job
+            reader: CsvReader the file was opened with, its records are read into the segments
+            writer: CsvWriter object
+            warning_writer: CsvWriter for warnings
+            error_list: instance of ErrorInterface to keep track of errors
+            processes: Number of worker processes
+            rows_per_segment: Number of records to validate in each worker task
+
+        Returns:
+            Tuple of the last row number read and a list of row numbers with errors, or None if the
+            segments did not parse into the expected number of records and the file must be validated serially
+        """
+        directory = tempfile.mkdtemp()
         try:
-            record["job_id"] = job_id
-            record["submission_id"] = submission_id
-            record["valid_record"] = passed_validations
-            sess.add(model(**record))
-            sess.commit()
+            # Continues from the header the reader has already read, so the file is only downloaded once
+            segments = reader.split_records(directory, rows_per_segment)
+
+            tasks = []
+            first_row = 2
+            for index, (segment_file, row_count) in enumerate(segments):
+                tasks.append(SegmentTask(job_id, submission_id, file_type, self.filename, segment_file, first_row,
+                                         row_count, os.path.join(directory, "errors_{}.csv".format(index)),
+                                         os.path.join(directory, "warnings_{}.csv".format(index))))
+                first_row += row_count
+            _exception_logger.info(
+                'VALIDATOR_INFO: JobId: %s validating %s segments in %s processes', job_id, len(tasks), processes)
+
+            # Spawn rather than fork, so workers don't share this process's database connection
+            with multiprocessing.get_context('spawn').Pool(processes) as pool:
+                results = pool.map(validateSegment, tasks, chunksize=1)
+
+            for task, result in zip(tasks, results):
+                if result.row_count != task.row_count:
+                    # Stray quotes outside quoted fields can make the split disagree with the csv reader
+                    _exception_logger.warning(
+                        'VALIDATOR_INFO: JobId: %s segment starting at row %s read %s rows, expected %s',
+                        job_id, task.first_row, result.row_count, task.row_count)
+                    return None
+
+            error_rows = []
+            for task, result in zip(tasks, results):
+                self.copyReport(task.error_file, writer)
+                self.copyReport(task.warning_file, warning_writer)
+                error_rows.extend(result.error_rows)
+                error_list.mergeRowErrors(result.row_errors)
+            return first_row - 1, error_rows
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
 
-        except ResponseException:
-            # Write failed, move to next record
-            writer.write(["Formatting Error", ValidationError.writeErrorMsg, row_number,""])
+    def validateSegment(self, task):
+        """ Validate and stage one segment of a file, runs in a worker process
+
+        Args:
+            task: SegmentTask describing the segment
+
+        Returns:
+            SegmentResult with the number of records read, the rows with errors and the recorded errors
+        """
+        self.filename = task.file_name
+        fields = SchemaCache.getColumns(FILE_TYPE_DICT[task.file_type])
+        plan = ValidationPlan.get(task.file_type, {row.name_short: row for row in fields})
+        model = [ft.model for ft in FILE_TYPE if ft.name == task.file_type][0]
+        staging_writer = StagingWriter(model, task.job_id, task.submission_id)
+        error_list = ErrorInterface()
+
+        reader = CsvLocalReader()
+        try:
+            reader.open_file(None, None, task.segment_file, fields, None, task.error_file, self.long_to_short_dict)
+            with CsvLocalWriter(task.error_file, self.reportHeaders) as writer, \
+                    CsvLocalWriter(task.warning_file, self.reportHeaders) as warning_writer:
+                row_number, error_rows = self.loadRecords(
+                    reader, writer, warning_writer, task.file_type, None, task.job_id, fields, plan,
+                    staging_writer, error_list, CONFIG_BROKER.get('validator_chunk_size'), task.first_row - 1)
+                error_rows.extend(self.flushStaging(staging_writer, writer, task.job_id, error_list))
+                writer.finishBatch()
+                warning_writer.finishBatch()
+        finally:
+            reader.close()
+        return SegmentResult(row_number - task.first_row + 1, error_rows, error_list.rowErrors)
+
+    @staticmethod
+    def copyReport(filename, writer):
+        """ Append the rows of a local report, without its header row, to writer
+
+        Args:
+            filename: Local report written by a worker
+            writer: CsvWriter for the full report
+        """
+        with open(filename, newline='') as report:
+            rows = csv.reader(report)
+            next(rows, None)
+            for row in rows:
+                writer.write(row)
+
+    def loadChunks(self, reader, writer, warning_writer, file_type, interfaces, job_id, fields, plan,
+                   staging_writer, error_list, chunk_size, row_number=1, timer=None):
+        """ Read the file in chunks of rows, cleaning and validating each chunk as columns
+
+        Args:
+            reader: CsvReader object
+            writer: CsvWriter object
+            warning_writer: CsvWriter for warnings
+            file_type: Type of file for current job
+            interfaces: InterfaceHolder object
+            job_id: ID of current job
+            fields: List of FileColumn objects for this file type
+            plan: ValidationPlan for this file type
+            staging_writer: StagingWriter for the current file's staging table
+            error_list: instance of ErrorInterface to keep track of errors
+            chunk_size: Number of rows to validate at once
+            row_number: Row number of the line before the first record, the header is row 1
+            timer: PhaseTimer to add the read, validate and staging_write phases to
+
+        Returns:
+            Tuple of the last row number read and a list of row numbers with errors
+        """
+        if timer is None:
+            timer = PhaseTimer()
+        # D files are obtained from upstream systems (ASP and FPDS) that perform their own basic validations,
+        # so these validations are not repeated here
+        chunk_validator = ChunkValidator(fields, self.long_to_short_dict, plan,
+                                         skip_validation=file_type in ["award", "award_procurement"])
+        error_rows = []
+        records = []
+        row_numbers = []
+        started = timer.start()
+        while not reader.is_finished:
+            row_number += 1
+            try:
+                records.append(reader.get_next_record())
+                row_numbers.append(row_number)
+            except ResponseException:
+                if reader.is_finished and reader.extra_line:
+                    # Last line may be blank, don't count it or record an error
+                    row_number -= 1
+                else:
+                    self.writeReadError(writer, row_number, job_id, error_list)
+                    error_rows.append(row_number)
+            if len(records) >= chunk_size or (reader.is_finished and records):
+                _exception_logger.info(
+                    'VALIDATOR_INFO: JobId: %s loading rows %s to %s', job_id, row_numbers[0], row_numbers[-1])
+                started = timer.lap("read", started)
+                error_rows.extend(self.loadChunk(
+                    chunk_validator, records, row_numbers, writer, warning_writer, interfaces, job_id,
+                    staging_writer, error_list, timer))
+                started = timer.start()
+                records = []
+                row_numbers = []
+        timer.lap("read", started)
+        return row_number, error_rows
+
+    def loadChunk(self, chunk_validator, records, row_numbers, writer, warning_writer, interfaces, job_id,
+                  staging_writer, error_list, timer=None):
+        """ Clean, validate and stage one chunk of records
+
+        Args:
+            chunk_validator: ChunkValidator for this file type
+            records: List of records as read from the file
+            row_numbers: Row number of each record
+            writer: CsvWriter object
+            warning_writer: CsvWriter for warnings
+            interfaces: InterfaceHolder object
+            job_id: ID of current job
+            staging_writer: StagingWriter for the current file's staging table
+            error_list: instance of ErrorInterface to keep track of errors
+            timer: PhaseTimer to add the validate and staging_write phases to
+
+        Returns:
+            List of row numbers with errors
+        """
+        if timer is None:
+            timer = PhaseTimer()
+        error_rows = []
+        started = timer.start()
+        cleaned, results = chunk_validator.validateChunk(records)
+        started = timer.lap("validate", started)
+        for record, row_number, (passed_validations, failures, valid) in zip(cleaned, row_numbers, results):
+            record["row_number"] = row_number
+            if valid:
+                error_rows.extend(self.writeToStaging(
+                    record, writer, row_number, staging_writer, job_id, error_list))
+                started = timer.lap("staging_write", started)
+            if not passed_validations:
+                if self.writeErrors(failures, interfaces, job_id, self.short_to_long_dict, writer, warning_writer,
+                                    row_number, error_list):
+                    error_rows.append(row_number)
+                started = timer.lap("validate", started)
+        return error_rows
+
+    def writeToStaging(self, record, writer, row_number, staging_writer, job_id, error_list):
+        """ Buffer this record for the staging tables
+
+        Args:
+            record: Record to be written
+            writer: CsvWriter object
+            row_number: Current row number
+            staging_writer: StagingWriter for the current file's staging table
+            job_id: ID of current job
+            error_list: instance of ErrorInterface to keep track of errors
+
+        Returns:
+            List of row numbers that could not be written, these may be from earlier rows in the batch
+        """
+        failed_rows = staging_writer.write(record, row_number)
+        self.writeStagingErrors(failed_rows, writer, job_id, error_list)
+        return failed_rows
+
+    def flushStaging(self, staging_writer, writer, job_id, error_list):
+        """ Write any records still buffered for the staging tables
+
+        Args:
+            staging_writer: StagingWriter for the current file's staging table
+            writer: CsvWriter object
+            job_id: ID of current job
+            error_list: instance of ErrorInterface to keep track of errors
+
+        Returns:
+            List of row numbers that could not be written
+        """
+        failed_rows = staging_writer.flush()
+        self.writeStagingErrors(failed_rows, writer, job_id, error_list)
+        return failed_rows
+
+    def writeStagingErrors(self, failed_rows, writer, job_id, error_list):
+        """ Record a formatting error for each row that could not be written to staging
+
+        Args:
+            failed_rows: List of row numbers that could not be written
+            writer: CsvWriter object
+            job_id: ID of current job
+            error_list: instance of ErrorInterface to keep track of errors
+        """
+        for row_number in failed_rows:
+            writer.write(["Formatting Error", ValidationError.writeErrorMsg, str(row_number), ""])
             error_list.recordRowError(job_id, self.filename,
                 "Formatting Error", ValidationError.writeError, row_number, severity_id=RULE_SEVERITY_DICT['fatal'])
-            return True
-        return False
 
     def writeErrors(self, failures, interfaces, job_id, short_colnames, writer, warning_writer, row_number, error_list):
         """ Write errors to error database
@@ -265,16 +603,37 @@ class ValidationManager:
         fileType = jobTracker.getFileType(job_id)
         # Get orm model for this file
         model = [ft.model for ft in FILE_TYPE if ft.name == fileType][0]
+        fileName = jobTracker.getFileName(job_id)
 
-        # Clear existing records for this submission
-        sess.query(model).filter(model.submission_id == submissionId).delete()
+        # An identical file validated under the same rules keeps the earlier results
+        cacheKey = None
+        if CONFIG_BROKER.get('validation_cache'):
+            contentHash = ResultCache.getContentHash(fileName, self.isLocal)
+            if contentHash is not None:
+                cacheKey = ResultCache.getCacheKey(job, contentHash)
+                cached = ResultCache.find(job, cacheKey)
+                if cached is not None:
+                    self.reuseValidation(job, cached, model, fileName, jobTracker)
+                    return True
+        # Cached results for this job point at the staging rows and reports about to be replaced
+        ResultCache.discard(job_id)
+
+        # Wall and CPU time of each phase, stored in job_phase_timing once the job is done
+        timer = PhaseTimer()
+        started = timer.start()
+        # Clear existing records for this submission, workers staging in parallel need its partition to exist
+        StagingPartitions.clear(sess, model, submissionId)
+        # Drop rows kept for the old reports, the new reports replace them
+        sess.query(ErrorReport).filter(ErrorReport.job_id == job_id).delete()
+        # Note the reload, so the next cross-file run checks this file's pairs
+        job.last_validated = datetime.utcnow()
         sess.commit()
+        timer.lap("clear_staging", started)
 
         # If local, make the error report directory
         if self.isLocal and not os.path.exists(self.directory):
             os.makedirs(self.directory)
         # Get bucket name and file name
-        fileName = jobTracker.getFileName(job_id)
         self.filename = fileName
         bucketName = CONFIG_BROKER['aws_bucket']
         regionName = CONFIG_BROKER['aws_region']
@@ -289,76 +648,62 @@ class ValidationManager:
 
         # Get file size and write to jobs table
         if CONFIG_BROKER["use_aws"]:
-            fileSize = s3UrlHandler.getFileSize(errorFileName)
+            fileSize = s3UrlHandler.getFileSize(fileName)
         else:
             fileSize = os.path.getsize(jobTracker.getFileName(job_id))
         jobTracker.setFileSizeById(job_id, fileSize)
 
         # Get fields for this file
-        fields = sess.query(FileColumn). \
-            options(joinedload('field_type')). \
-            filter(FileColumn.file_id == FILE_TYPE_DICT[fileType]). \
-            all()
+        fields = SchemaCache.getColumns(FILE_TYPE_DICT[fileType])
         csvSchema = {row.name_short: row for row in fields}
+        validationPlan = ValidationPlan.get(fileType, csvSchema)
+
+        # Valid records are buffered and written to staging in batches
+        stagingWriter = StagingWriter(model, job_id, submissionId)
+        # If set, rows are cleaned and validated this many at a time as pandas columns
+        chunkSize = CONFIG_BROKER.get('validator_chunk_size')
+        # Large files can be split and validated in several processes
+        processes = int(CONFIG_BROKER.get('validator_processes') or 1)
+        parallel = processes > 1 and fileSize >= int(CONFIG_BROKER.get('validator_parallel_min_size') or 0)
 
         try:
             # Pull file and return info on whether it's using short or long col headers
+            started = timer.start()
             reader.open_file(regionName, bucketName, fileName, fields,
                              bucketName, errorFileName, self.long_to_short_dict)
-
-            # list to keep track of rows that fail validations
-            errorRows = []
-
-            # While not done, pull one row and put it into staging table if it passes
-            # the Validator
-
-            with self.getWriter(regionName, bucketName, errorFileName, self.reportHeaders) as writer, \
-                 self.getWriter(regionName, bucketName, warningFileName, self.reportHeaders) as warningWriter:
-                while not reader.is_finished:
-                    rowNumber += 1
-
-                    if (rowNumber % 100) == 0:
-                        _exception_logger.info(
-                            'VALIDATOR_INFO: JobId: %s loading row %s',
-                            job_id, rowNumber)
-
-                    #
-                    # first phase of validations: read record and record a
-                    # formatting error if there's a problem
-                    #
-                    (record, reduceRow, skipRow, doneReading, rowErrorHere) = self.readRecord(reader,writer,fileType,interfaces,rowNumber,job_id,fields,error_list)
-                    if reduceRow:
-                        rowNumber -= 1
-                    if rowErrorHere:
-                        errorRows.append(rowNumber)
-                    if doneReading:
-                        # Stop reading from input file
-                        break
-                    elif skipRow:
-                        # Do not write this row to staging, but continue processing future rows
-                        continue
-
-                    #
-                    # second phase of validations: do basic schema checks
-                    # (e.g., require fields, field length, data type)
-                    #
-                    # D files are obtained from upstream systems (ASP and FPDS) that perform their own basic validations,
-                    # so these validations are not repeated here
-                    if fileType in ["award", "award_procurement"]:
-                        # Skip basic validations for D files, set as valid to trigger write to staging
-                        passedValidations = True
-                        valid = True
-                    else:
-                        passedValidations, failures, valid = Validator.validate(record, csvSchema)
-                    if valid:
-                        skipRow = self.writeToStaging(record, job_id, submissionId, passedValidations, writer, rowNumber, model, error_list)
-                        if skipRow:
-                            errorRows.append(rowNumber)
-                            continue
-
-                    if not passedValidations:
-                        if self.writeErrors(failures, interfaces, job_id, self.short_to_long_dict, writer, warningWriter, rowNumber, error_list):
-                            errorRows.append(rowNumber)
+            timer.lap("open_file", started)
+
+            with self.getWriter(regionName, bucketName, errorFileName, self.reportHeaders, job_id,
+                                RULE_SEVERITY_DICT['fatal']) as writer, \
+                 self.getWriter(regionName, bucketName, warningFileName, self.reportHeaders, job_id,
+                                RULE_SEVERITY_DICT['warning']) as warningWriter:
+                loaded = None
+                if parallel and not reader.is_finished:
+                    # Workers read, validate and stage their segments, so those phases are timed as one
+                    started = timer.start()
+                    loaded = self.loadParallel(
+                        job_id, submissionId, fileType, reader, writer, warningWriter, error_list, processes,
+                        int(CONFIG_BROKER.get('validator_segment_rows') or 100000))
+                    if loaded is None:
+                        # Fall back to a serial run, dropping anything the workers staged
+                        StagingPartitions.clear(sess, model, submissionId)
+                        sess.commit()
+                        # The split read all of the records, so the file is read again from the start
+                        reader.close()
+                        reader = self.getReader()
+                        reader.open_file(regionName, bucketName, fileName, fields,
+                                         bucketName, errorFileName, self.long_to_short_dict)
+                    timer.lap("load_parallel", started)
+                if loaded is None:
+                    loaded = self.loadRecords(
+                        reader, writer, warningWriter, fileType, interfaces, job_id, fields, validationPlan,
+                        stagingWriter, error_list, chunkSize, timer=timer)
+                rowNumber, errorRows = loaded
+
+                # Write the last partial batch before the SQL rules read the staging table
+                started = timer.start()
+                errorRows.extend(self.flushStaging(stagingWriter, writer, job_id, error_list))
+                timer.lap("staging_write", started)
 
                 _exception_logger.info(
                     'VALIDATOR_INFO: Loading complete on job_id: %s. '
@@ -368,24 +713,36 @@ class ValidationManager:
                 # third phase of validations: run validation rules as specified
                 # in the schema guidance. these validations are sql-based.
                 #
+                started = timer.start()
                 sqlErrorRows = self.runSqlValidations(
                     interfaces, job_id, fileType, self.short_to_long_dict, writer, warningWriter, rowNumber, error_list)
                 errorRows.extend(sqlErrorRows)
+                started = timer.lap("sql_rules", started)
 
                 # Write unfinished batch
                 writer.finishBatch()
                 warningWriter.finishBatch()
+            # Includes closing the writers, which completes any S3 uploads
+            timer.lap("report_flush", started)
 
             # Calculate total number of rows in file
             # that passed validations
             errorRowsUnique = set(errorRows)
             totalRowsExcludingHeader = rowNumber - 1
             validRows = totalRowsExcludingHeader - len(errorRowsUnique)
+            for phase in ("read", "validate", "staging_write", "load_parallel", "sql_rules"):
+                timer.count(phase, rows=totalRowsExcludingHeader)
+            timer.count("read", bytes_read=reader.bytes_read)
+            timer.count("load_parallel", bytes_read=fileSize)
 
             # Update job metadata
             jobTracker.setJobRowcounts(job_id, rowNumber, validRows)
 
+            started = timer.start()
             error_list.writeAllRowErrors(job_id)
+            timer.lap("error_metadata", started)
+            if cacheKey is not None:
+                ResultCache.store(job_id, cacheKey, fileSize, rowNumber, validRows)
             # Update error info for submission
             jobTracker.populateSubmissionErrorInfo(submissionId)
             # Mark validation as finished in job tracker
@@ -394,11 +751,38 @@ class ValidationManager:
         finally:
             # Ensure the file always closes
             reader.close()
+            # Failed jobs keep the timing of the phases they got through
+            timer.record(job_id)
             _exception_logger.info(
                 'VALIDATOR_INFO: Completed L1 and SQL rule validations on '
                 'job_id: %s', job_id)
         return True
 
+    def reuseValidation(self, job, cached, model, fileName, jobTracker):
+        """ Finish a job with cached results instead of validating its file
+
+        Args:
+            job: Job object being validated
+            cached: ValidationCache object with the results to reuse
+            model: Staging table model for the job's file type
+            fileName: Name of the job's file
+            jobTracker: Interface object for job tracker
+        """
+        # If local, make the error report directory
+        if self.isLocal and not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        self.filename = fileName
+        createFileIfNeeded(job.job_id, fileName)
+        ResultCache.reuse(job, cached, model, fileName, self.isLocal, self.directory)
+        jobTracker.setFileSizeById(job.job_id, cached.file_size)
+        jobTracker.setJobRowcounts(job.job_id, cached.number_of_rows, cached.number_of_rows_valid)
+        # Update error info for submission
+        jobTracker.populateSubmissionErrorInfo(job.submission_id)
+        jobTracker.markJobStatus(job.job_id, "finished")
+        markFileComplete(job.job_id, fileName)
+        _exception_logger.info(
+            'VALIDATOR_INFO: Completed job_id: %s from cached results', job.job_id)
+
     def runSqlValidations(self, interfaces, job_id, file_type, short_colnames, writer, warning_writer, row_number, error_list):
         """ Run all SQL rules for this file type
 
@@ -458,48 +842,64 @@ class ValidationManager:
         error_list = ErrorInterface()
         
         submission_id = interfaces.jobDb.getSubmissionId(job_id)
-        bucketName = CONFIG_BROKER['aws_bucket']
-        regionName = CONFIG_BROKER['aws_region']
         _exception_logger.info(
             'VALIDATOR_INFO: Beginning runCrossValidation on submission_id: '
             '%s', submission_id)
 
-        # Delete existing cross file errors for this submission
-        sess.query(ErrorMetadata).filter(ErrorMetadata.job_id == job_id).delete()
+        crossFileJob = sess.query(Job).filter(Job.job_id == job_id).one()
+        startTime = datetime.utcnow()
+        # Only pairs with a file loaded since the last successful run are checked again,
+        # the other pairs keep their reports and error metadata
+        changedFileIds = self.getChangedFileTypes(crossFileJob)
+
+        filePairs = []
+        for first_file, second_file in get_cross_file_pairs():
+            if changedFileIds is not None and first_file.id not in changedFileIds and \
+                    second_file.id not in changedFileIds:
+                _exception_logger.info(
+                    'VALIDATOR_INFO: Keeping cross-file results for %s and %s on submission_id: %s',
+                    first_file.name, second_file.name, submission_id)
+                continue
+            filePairs.append((first_file, second_file))
+
+        # Delete existing cross file errors for the pairs being checked
+        errorQuery = sess.query(ErrorMetadata).filter(ErrorMetadata.job_id == job_id)
+        if changedFileIds is not None:
+            errorQuery = errorQuery.filter(or_(ErrorMetadata.file_type_id.in_(changedFileIds),
+                                               ErrorMetadata.target_file_type_id.in_(changedFileIds)))
+        errorQuery.delete(synchronize_session=False)
+        # Drop rows kept for the old reports of the pairs being checked
+        reportNames = [getName(submission_id, first_file.name, second_file.name)
+                       for first_file, second_file in filePairs
+                       for getName in (get_cross_report_name, get_cross_warning_report_name)]
+        sess.query(ErrorReport).filter(ErrorReport.report_name.in_(reportNames)).delete(synchronize_session=False)
+        # Committed before the rules are loaded, a commit would expire them while the pair threads read them
         sess.commit()
 
-        # get all cross file rules from db
-        crossFileRules = sess.query(RuleSql).filter(RuleSql.rule_cross_file_flag==True)
-
-        # for each cross-file combo, run associated rules and create error report
-        for c in get_cross_file_pairs():
-            first_file = c[0]
-            second_file = c[1]
-            comboRules = crossFileRules.filter(or_(and_(
-                RuleSql.file_id==first_file.id,
-                RuleSql.target_file_id==second_file.id), and_(
-                RuleSql.file_id==second_file.id,
-                RuleSql.target_file_id==first_file.id)))
-            # send comboRules to validator.crossValidate sql
-            failures = Validator.crossValidateSql(comboRules.all(), submission_id, self.short_to_long_dict)
-            # get error file name
-            reportFilename = self.getFileName(get_cross_report_name(submission_id, first_file.name, second_file.name))
-            warningReportFilename = self.getFileName(get_cross_warning_report_name(submission_id, first_file.name, second_file.name))
-
-            # loop through failures to create the error report
-            with self.getWriter(regionName, bucketName, reportFilename, self.crossFileReportHeaders) as writer, \
-                 self.getWriter(regionName, bucketName, warningReportFilename, self.crossFileReportHeaders) as warningWriter:
-                for failure in failures:
-                    if failure[9] == RULE_SEVERITY_DICT['fatal']:
-                        writer.write(failure[0:7])
-                    if failure[9] == RULE_SEVERITY_DICT['warning']:
-                        warningWriter.write(failure[0:7])
-                    error_list.recordRowError(job_id, "cross_file",
-                        failure[0], failure[3], failure[5], failure[6], failure[7], failure[8], severity_id=failure[9])
-                writer.finishBatch()
-                warningWriter.finishBatch()
+        # get all cross file rules from db in one query, then group them by file pair
+        crossFileRules = sess.query(RuleSql).filter(RuleSql.rule_cross_file_flag==True). \
+            order_by(RuleSql.rule_sql_id).all()
+        pairs = []
+        for first_file, second_file in filePairs:
+            comboRules = [rule for rule in crossFileRules
+                          if (rule.file_id == first_file.id and rule.target_file_id == second_file.id) or
+                          (rule.file_id == second_file.id and rule.target_file_id == first_file.id)]
+            pairs.append((first_file, second_file, comboRules))
+
+        # for each cross-file combo, run associated rules and create error report,
+        # pairs run concurrently but their errors are merged in pair order
+        workers = int(CONFIG_BROKER.get('validator_cross_file_workers') or 1)
+        engine = GlobalDB.db().engine
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(pairs)))) as executor:
+            pairErrorLists = executor.map(
+                lambda pair: self.validateCrossFilePair(job_id, submission_id, *pair, engine=engine), pairs)
+            for pairErrorList in pairErrorLists:
+                error_list.mergeRowErrors(pairErrorList.rowErrors)
 
         error_list.writeAllRowErrors(job_id)
+        # Files loaded after this run started are checked again next time
+        crossFileJob.last_validated = startTime
+        sess.commit()
         interfaces.jobDb.markJobStatus(job_id, "finished")
         _exception_logger.info(
             'VALIDATOR_INFO: Completed runCrossValidation on submission_id: '
@@ -516,6 +916,65 @@ class ValidationManager:
         # Mark validation complete
         markFileComplete(job_id)
 
+    @staticmethod
+    def getChangedFileTypes(crossFileJob):
+        """ Find the file types loaded into staging since the last successful cross-file run
+
+        Args:
+            crossFileJob: Job object for the submission's cross-file validation job
+
+        Returns:
+            Set of file type IDs, or None if every file pair must be checked
+        """
+        if crossFileJob.last_validated is None:
+            return None
+        sess = GlobalDB.db().session
+        fileJobs = sess.query(Job).filter(Job.submission_id == crossFileJob.submission_id,
+                                          Job.job_type_id == JOB_TYPE_DICT['csv_record_validation']).all()
+        return {fileJob.file_type_id for fileJob in fileJobs
+                if fileJob.last_validated is None or fileJob.last_validated > crossFileJob.last_validated}
+
+    def validateCrossFilePair(self, job_id, submission_id, first_file, second_file, rules, engine):
+        """ Run the rules for one pair of files and write the pair's error and warning reports
+
+        Args:
+            job_id: ID of the cross-file job
+            submission_id: ID of the submission being validated
+            first_file: First file type of the pair
+            second_file: Second file type of the pair
+            rules: List of RuleSql objects for this pair
+            engine: Engine to check out this pair's connection from
+
+        Returns:
+            ErrorInterface holding the errors found for this pair
+        """
+        error_list = ErrorInterface()
+        bucketName = CONFIG_BROKER['aws_bucket']
+        regionName = CONFIG_BROKER['aws_region']
+        # get error file name
+        reportFilename = self.getFileName(get_cross_report_name(submission_id, first_file.name, second_file.name))
+        warningReportFilename = self.getFileName(get_cross_warning_report_name(submission_id, first_file.name, second_file.name))
+
+        with engine.connect() as conn:
+            # send comboRules to validator.crossValidate sql
+            failures = Validator.crossValidateSql(rules, submission_id, self.short_to_long_dict, conn, engine)
+
+            # loop through failures to create the error report
+            with self.getWriter(regionName, bucketName, reportFilename, self.crossFileReportHeaders, job_id,
+                                RULE_SEVERITY_DICT['fatal'], engine) as writer, \
+                 self.getWriter(regionName, bucketName, warningReportFilename, self.crossFileReportHeaders, job_id,
+                                RULE_SEVERITY_DICT['warning'], engine) as warningWriter:
+                for failure in failures:
+                    if failure[9] == RULE_SEVERITY_DICT['fatal']:
+                        writer.write(failure[0:7])
+                    if failure[9] == RULE_SEVERITY_DICT['warning']:
+                        warningWriter.write(failure[0:7])
+                    error_list.recordRowError(job_id, "cross_file",
+                        failure[0], failure[3], failure[5], failure[6], failure[7], failure[8], severity_id=failure[9])
+                writer.finishBatch()
+                warningWriter.finishBatch()
+        return error_list
+
     def validate_job(self, request, interfaces):
         """ Gets file for job, validates each row, and sends valid rows to a staging table
         Args:
@@ -600,3 +1059,11 @@ class ValidationManager:
                 ValidationError.unknownError)
             self.markJob(job_id, jobTracker, "failed", self.filename, ValidationError.unknownError)
             return JsonResponse.error(exc, exc.status)
+
+
+def validateSegment(task):
+    """ Pool entry point for ValidationManager.validateSegment, closes the worker's connection when done """
+    try:
+        return ValidationManager(isLocal=True).validateSegment(task)
+    finally:
+        GlobalDB.close()
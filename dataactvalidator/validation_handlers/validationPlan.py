@@ -0,0 +1,144 @@
+from collections import namedtuple
+from decimal import Decimal
+import re
+
+from dataactvalidator.validation_handlers.validationError import ValidationError
+
+
+PlanColumn = namedtuple('PlanColumn', ['name', 'required', 'check_type', 'length'])
+
+
+class ValidationPlan(object):
+    """
+    Basic schema checks for one file type, compiled once from its FileColumn
+    list so validating a row does no per-cell schema lookups or string
+    compares. Plans are cached for the life of the process.
+    """
+    BOOLEAN_VALUES = frozenset(["TRUE", "FALSE", "YES", "NO", "1", "0"])
+    # Fast paths for the common spellings, anything else falls back to int() or Decimal()
+    # so the plan accepts exactly what Validator.checkType accepts
+    INT_PATTERN = re.compile(r'[+-]?[0-9]+')
+    DECIMAL_PATTERN = re.compile(r'[+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)')
+    # Set of metadata fields that should not be directly validated
+    META_FIELDS = frozenset(["row_number"])
+
+    _plans = {}
+
+    def __init__(self, csvSchema):
+        """ Compile the plan
+
+        Args:
+            csvSchema: dict of FileColumn objects keyed by short column name
+        """
+        self.columns = {}
+        for name, column in csvSchema.items():
+            field_type = column.field_type.name if column.field_type is not None else None
+            self.columns[name] = PlanColumn(name, bool(column.required), self.getTypeCheck(field_type),
+                                            column.length)
+        # Required columns in schema order, the first one missing from a record is reported
+        self.required = [name for name in csvSchema if csvSchema[name].required]
+
+    @classmethod
+    def get(cls, fileType, csvSchema):
+        """ Return the cached plan for this file type, compiling it if the schema is new
+
+        Args:
+            fileType: name of the file type being validated
+            csvSchema: dict of FileColumn objects keyed by short column name
+        """
+        key = (fileType, cls.fingerprint(csvSchema))
+        plan = cls._plans.get(key)
+        if plan is None:
+            plan = cls._plans[key] = cls(csvSchema)
+        return plan
+
+    @staticmethod
+    def fingerprint(csvSchema):
+        """ Everything about a schema that affects the compiled plan """
+        return tuple(
+            (name, column.required, column.field_type.name if column.field_type is not None else None,
+             column.length)
+            for name, column in csvSchema.items())
+
+    @classmethod
+    def getTypeCheck(cls, datatype):
+        """ Return a function that checks whether a non-empty, stripped value matches datatype
+
+        Args:
+            datatype: name of the FieldType for a column
+
+        Returns:
+            function taking the value and returning True if it is of the correct type
+        """
+        if datatype is None or datatype == "STRING":
+            return None
+        if datatype == "BOOLEAN":
+            return lambda data: data.upper() in cls.BOOLEAN_VALUES
+        if datatype in ("INT", "LONG"):
+            return lambda data: cls.INT_PATTERN.fullmatch(data) is not None or cls.castCheck(int, data)
+        if datatype == "DECIMAL":
+            return lambda data: cls.DECIMAL_PATTERN.fullmatch(data) is not None or cls.castCheck(Decimal, data)
+
+        def unknownType(data):
+            raise ValueError("".join(["Data Type Error, Type: ", datatype, ", Value: ", data]))
+        return unknownType
+
+    @staticmethod
+    def castCheck(cast, data):
+        """ Slow path for values the fast patterns don't cover """
+        try:
+            cast(data)
+            return True
+        except:
+            return False
+
+    def validate(self, record):
+        """
+        Run initial set of single file validation:
+        - check if required fields are present
+        - check if data type matches data type specified in schema
+        - check that field length matches field length specified in schema
+
+        Args:
+        record -- dict representation of a single record of data
+
+        Returns:
+        Tuple of three values, see Validator.validate
+        """
+        for fieldName in self.required:
+            if fieldName not in record:
+                return False, [[fieldName, ValidationError.requiredError, "", "", "fatal"]], False
+
+        recordFailed = False
+        recordTypeFailure = False
+        failedRules = []
+        columns = self.columns
+        for fieldName, currentData in record.items():
+            if fieldName in self.META_FIELDS:
+                # Skip fields that are not user submitted
+                continue
+            column = columns[fieldName]
+
+            if currentData is not None:
+                currentData = currentData.strip()
+            if not currentData:
+                if column.required:
+                    # If empty and required return field name and error
+                    recordFailed = True
+                    failedRules.append([fieldName, ValidationError.requiredError, "", "", "fatal"])
+                # If field is empty and not required its valid
+                continue
+
+            if column.check_type is not None and not column.check_type(currentData):
+                recordTypeFailure = True
+                recordFailed = True
+                failedRules.append([fieldName, ValidationError.typeError, currentData, "", "fatal"])
+                # Don't check value rules if type failed
+                continue
+
+            if column.length is not None and len(currentData) > column.length:
+                # Length failure, add to failedRules
+                recordFailed = True
+                failedRules.append([fieldName, ValidationError.lengthError, currentData, "", "warning"])
+
+        return (not recordFailed), failedRules, (not recordTypeFailure)
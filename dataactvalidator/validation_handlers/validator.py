@@ -1,9 +1,20 @@
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 import logging
+import pickle
+import tempfile
+import time
+from datetime import datetime
 
-from dataactcore.models.lookups import FILE_TYPE_DICT_ID, FILE_TYPE_DICT
-from dataactcore.models.validationModels import RuleSql
-from dataactvalidator.validation_handlers.validationError import ValidationError
+from sqlalchemy import func, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from dataactcore.config import CONFIG_BROKER
+from dataactcore.models.lookups import FILE_TYPE, FILE_TYPE_DICT_ID, FILE_TYPE_DICT
+from dataactcore.models.validationModels import RuleExecutionStats, RuleSql
+from dataactvalidator.validation_handlers.ruleStatements import RuleStatements
+from dataactvalidator.validation_handlers.sf133WorkingSet import SF133WorkingSet
+from dataactvalidator.validation_handlers.validationPlan import ValidationPlan
 from dataactcore.interfaces.db import GlobalDB
 
 
@@ -18,40 +29,46 @@ class Validator(object):
     tableAbbreviations = {"appropriations":"approp","award_financial_assistance":"afa","award_financial":"af","object_class_program_activity":"op","appropriation":"approp"}
     # Set of metadata fields that should not be directly validated
     META_FIELDS = ["row_number"]
+    # Rows fetched from a rule's server-side cursor at a time
+    SQL_FETCH_SIZE = 10000
+    # Bytes of a rule's errors held in memory by a rule thread before spilling to disk
+    SPOOL_SIZE = 1024 ** 2
 
     @classmethod
-    def crossValidateSql(cls, rules, submissionId, short_to_long_dict):
+    def crossValidateSql(cls, rules, submissionId, short_to_long_dict, conn=None, engine=None):
         """ Evaluate all sql-based rules for cross file validation
 
         Args:
             rules -- List of Rule objects
             submissionId -- ID of submission to run cross-file validation
+            conn -- Connection to run rules on one at a time, defaults to the GlobalDB connection
+            engine -- Engine to check out connections from when rules run concurrently, defaults to the GlobalDB engine
+
+        Returns:
+            Generator of failures, each a list of source file, target file, field names, error message,
+            values, row number, rule label, source file id, target file id and severity id
         """
-        failures = []
-        # Put each rule through evaluate, appending all failures into list
-        # Put each rule through evaluate, appending all failures into list
-        conn = GlobalDB.db().connection
-
-        for rule in rules:
-            failedRows = conn.execute(
-                rule.rule_sql.format(submissionId))
-            if failedRows.rowcount:
-                # get list of fields involved in this validation
-                # note: row_number is metadata, not a field being
-                # validated, so exclude it
-                cols = failedRows.keys()
-                cols.remove('row_number')
-                columnString = ", ".join(short_to_long_dict[c] if c in short_to_long_dict else c for c in cols)
-                for row in failedRows:
-                    # get list of values for each column
-                    values = ["{}: {}".format(short_to_long_dict[c], str(row[c])) if c in short_to_long_dict else "{}: {}".format(c, str(row[c])) for c in cols]
-                    values = ", ".join(values)
-                    targetFileType = FILE_TYPE_DICT_ID[rule.target_file_id]
-                    failures.append([rule.file.name, targetFileType, columnString,
-                        str(rule.rule_error_message), values, row['row_number'],str(rule.rule_label),rule.file_id,rule.target_file_id,rule.rule_severity_id])
-
-        # Return list of cross file validation failures
-        return failures
+        def runRule(conn, rule):
+            """ Yield the failures for one rule """
+            cols, failedRows = cls.streamRuleSql(conn, rule, submissionId)
+            # get list of fields involved in this validation
+            # note: row_number is metadata, not a field being
+            # validated, so exclude it
+            columnString = ", ".join(short_to_long_dict[c] if c in short_to_long_dict else c for c in cols)
+            # Look up file names here, lazy loading rule.file is not safe on a rule thread
+            sourceFileType = FILE_TYPE_DICT_ID[rule.file_id]
+            targetFileType = FILE_TYPE_DICT_ID[rule.target_file_id]
+            for row in failedRows:
+                # get list of values for each column
+                values = ["{}: {}".format(short_to_long_dict[c], str(row[c])) if c in short_to_long_dict else "{}: {}".format(c, str(row[c])) for c in cols]
+                values = ", ".join(values)
+                yield [sourceFileType, targetFileType, columnString,
+                    str(rule.rule_error_message), values, row['row_number'],str(rule.rule_label),rule.file_id,rule.target_file_id,rule.rule_severity_id]
+
+        # Failures are produced as they are fetched, so they are never all held in memory
+        stats = []
+        yield from cls.runSqlRules(rules, runRule, conn, engine, stats)
+        cls.recordRuleStats(stats, submissionId, conn)
 
     @classmethod
     def validate(cls, record, csvSchema):
@@ -61,6 +78,8 @@ class Validator(object):
         - check if data type matches data type specified in schema
         - check that field length matches field length specified in schema
 
+        Row-by-row callers should get a ValidationPlan once and call its validate method instead.
+
         Args:
         record -- dict representation of a single record of data
         csvSchema -- dict of schema for the current file.
@@ -71,50 +90,7 @@ class Validator(object):
         List of failed rules, each with field, description of failure, value that failed, rule label, and severity
         True if type check passed, False if type failed
         """
-        recordFailed = False
-        recordTypeFailure = False
-        failedRules = []
-
-        for fieldName in csvSchema:
-            if (csvSchema[fieldName].required and not fieldName in record):
-                return False, [[fieldName, ValidationError.requiredError, "", "", "fatal"]], False
-
-        for fieldName in record :
-            if fieldName in cls.META_FIELDS:
-                # Skip fields that are not user submitted
-                continue
-            checkRequiredOnly = False
-            currentSchema = csvSchema[fieldName]
-
-            currentData = record[fieldName]
-            if(currentData != None):
-                currentData = currentData.strip()
-
-            if(currentData == None or len(currentData) == 0):
-                if(currentSchema.required ):
-                    # If empty and required return field name and error
-                    recordFailed = True
-                    failedRules.append([fieldName, ValidationError.requiredError, "", "", "fatal"])
-                    continue
-                else:
-                    # If field is empty and not required its valid
-                    checkRequiredOnly = True
-
-            # Always check the type in the schema
-            if(not checkRequiredOnly and not Validator.checkType(currentData,currentSchema.field_type.name) ) :
-                recordTypeFailure = True
-                recordFailed = True
-                failedRules.append([fieldName, ValidationError.typeError, currentData,"", "fatal"])
-                # Don't check value rules if type failed
-                continue
-
-            # Check length based on schema
-            if currentSchema.length is not None and currentData is not None and len(currentData.strip()) > currentSchema.length:
-                # Length failure, add to failedRules
-                recordFailed = True
-                failedRules.append([fieldName, ValidationError.lengthError, currentData,"", "warning"])
-
-        return (not recordFailed), failedRules, (not recordTypeFailure)
+        return ValidationPlan.get(None, csvSchema).validate(record)
 
     @staticmethod
     def checkType(data,datatype) :
@@ -169,7 +145,7 @@ class Validator(object):
             short_to_long_dict: mapping of short to long schema column names
 
         Returns:
-            List of errors found, each element has:
+            Generator of errors found, each element has:
              field names
              error message
              values in fields involved
@@ -183,38 +159,190 @@ class Validator(object):
         _exception_logger.info(
             'VALIDATOR_INFO: Beginning SQL validation rules on submissionID '
             '%s, fileType: %s', submissionId, fileType)
-        conn = GlobalDB.db().connection
         sess = GlobalDB.db().session
 
-        # Pull all SQL rules for this file type
+        # Pull all SQL rules for this file type, in a fixed order so reports are stable
         fileId = FILE_TYPE_DICT[fileType]
         rules = sess.query(RuleSql).filter(RuleSql.file_id == fileId).filter(
-            RuleSql.rule_cross_file_flag == False).all()
-        errors = []
+            RuleSql.rule_cross_file_flag == False).order_by(RuleSql.rule_sql_id).all()
 
-        # For each rule, execute sql for rule
-        for rule in rules:
+        if any(SF133WorkingSet.readsWorkingSet(rule.rule_sql) for rule in rules):
+            # Built and committed on its own connection, so the rules see it from any connection and
+            # committing doesn't expire the rules loaded through the session
+            with GlobalDB.db().engine.begin() as conn:
+                lines = SF133WorkingSet.build(conn, submissionId)
+            _exception_logger.info(
+                'VALIDATOR_INFO: Copied %s SF-133 lines for submissionID %s', lines, submissionId)
+
+        def runRule(conn, rule):
+            """ Execute sql for one rule and yield its errors """
             _exception_logger.info(
                 'VALIDATOR_INFO: Running query: %s on submissionId %s, '
                 'fileType: %s', rule.query_name, submissionId, fileType)
-            failures = conn.execute(rule.rule_sql.format(submissionId))
-            if failures.rowcount:
-                # Create column list (exclude row_number)
-                cols = failures.keys()
-                cols.remove("row_number")
-                # Build error list
-                for failure in failures:
-                    errorMsg = rule.rule_error_message
-                    row = failure["row_number"]
-                    # Create strings for fields and values
-                    valueList = ["{}: {}".format(short_to_long_dict[field], str(failure[field])) if field in short_to_long_dict else "{}: {}".format(field, str(failure[field])) for field in cols]
-                    valueString = ", ".join(valueList)
-                    fieldList = [short_to_long_dict[field] if field in short_to_long_dict else field for field in cols]
-                    fieldString = ", ".join(fieldList)
-                    errors.append([fieldString, errorMsg, valueString, row, rule.rule_label, fileId, rule.target_file_id, rule.rule_severity_id])
+            cols, failures = cls.streamRuleSql(conn, rule, submissionId)
+            # Create strings for fields
+            fieldList = [short_to_long_dict[field] if field in short_to_long_dict else field for field in cols]
+            fieldString = ", ".join(fieldList)
+            for failure in failures:
+                # Create strings for values
+                valueList = ["{}: {}".format(short_to_long_dict[field], str(failure[field])) if field in short_to_long_dict else "{}: {}".format(field, str(failure[field])) for field in cols]
+                valueString = ", ".join(valueList)
+                yield [fieldString, rule.rule_error_message, valueString, failure["row_number"], rule.rule_label, fileId, rule.target_file_id, rule.rule_severity_id]
 
-            _exception_logger.info(
-                'VALIDATOR_INFO: Completed SQL validation rules on '
-                'submissionID: %s, fileType: %s', submissionId, fileType)
+        stats = []
+        yield from cls.runSqlRules(rules, runRule, stats=stats)
+        cls.recordRuleStats(stats, submissionId)
+
+        _exception_logger.info(
+            'VALIDATOR_INFO: Completed SQL validation rules on '
+            'submissionID: %s, fileType: %s', submissionId, fileType)
+
+    @classmethod
+    def streamRuleSql(cls, conn, rule, submissionId):
+        """ Execute a rule's sql, see RuleStatements
+
+        Args:
+            conn: Connection to run the query on
+            rule: RuleSql object
+            submissionId: submission to be checked
+
+        Returns:
+            Tuple of the failing columns other than row_number and a generator of the failing
+            rows, fetched validator_sql_fetch_size rows at a time
+        """
+        fetchSize = int(CONFIG_BROKER.get('validator_sql_fetch_size') or cls.SQL_FETCH_SIZE)
+        result = RuleStatements.execute(conn, rule, submissionId)
+        cols = [col for col in result.keys() if col != "row_number"]
+
+        def rows():
+            try:
+                while True:
+                    batch = result.fetchmany(fetchSize)
+                    if not batch:
+                        break
+                    for row in batch:
+                        yield row
+            finally:
+                result.close()
+        return cols, rows()
+
+    @classmethod
+    def runSqlRules(cls, rules, runRule, conn=None, engine=None, stats=None):
+        """ Yield the errors of runRule(connection, rule) for each rule, in rule order
 
-        return errors
+        If validator_sql_workers is set above 1, rules run on a pool of that many threads,
+        each rule on its own connection from the engine's pool. Each thread spools its
+        rule's errors to a temporary file, which is replayed once the earlier rules are done.
+        A rule whose query fails is logged and stops reporting errors, so it does not stop
+        the other rules.
+
+        Args:
+            rules: List of RuleSql objects
+            runRule: Function taking a connection and a rule, returning an iterable of errors
+            conn: Connection to run rules on one at a time, defaults to the GlobalDB connection
+            engine: Engine to check out connections from when rules run concurrently, defaults to the GlobalDB engine
+            stats: List to append the execution statistics of each rule that completes to, see isolateRule
+
+        Returns:
+            Generator of errors
+        """
+        workers = int(CONFIG_BROKER.get('validator_sql_workers') or 1)
+
+        if workers <= 1 or len(rules) <= 1:
+            if conn is None:
+                conn = GlobalDB.db().connection
+            for rule in rules:
+                yield from cls.isolateRule(rule, runRule(conn, rule), stats)
+            return
+
+        if engine is None:
+            engine = GlobalDB.db().engine
+
+        def spoolRule(rule):
+            spool = tempfile.SpooledTemporaryFile(max_size=cls.SPOOL_SIZE)
+            with engine.connect() as conn:
+                for error in cls.isolateRule(rule, runRule(conn, rule), stats):
+                    pickle.dump(error, spool, pickle.HIGHEST_PROTOCOL)
+            spool.seek(0)
+            return spool
+
+        with ThreadPoolExecutor(max_workers=min(workers, len(rules))) as executor:
+            # map returns spools in the order of rules, whatever order the queries finish in
+            for spool in executor.map(spoolRule, rules):
+                with spool:
+                    while True:
+                        try:
+                            yield pickle.load(spool)
+                        except EOFError:
+                            break
+
+    @staticmethod
+    def isolateRule(rule, errors, stats=None):
+        """ Pass on a rule's errors, logging and stopping if its query fails
+
+        Args:
+            rule: RuleSql object the errors come from
+            errors: Iterable of the rule's errors, its query runs as it is iterated
+            stats: List to append a dict of the rule's failure count and elapsed seconds to once
+                the rule completes. Only time spent producing errors is counted, not time spent
+                by the caller handling them. Rules whose query fails are left out.
+
+        Returns:
+            Generator of errors
+        """
+        errors = iter(errors)
+        failureCount = 0
+        elapsed = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    error = next(errors)
+                except StopIteration:
+                    break
+                finally:
+                    elapsed += time.perf_counter() - start
+                failureCount += 1
+                yield error
+        except SQLAlchemyError:
+            _exception_logger.exception(
+                'VALIDATOR_INFO: Query %s for rule %s failed', rule.query_name, rule.rule_label)
+            return
+        if stats is not None:
+            stats.append({"rule_sql_id": rule.rule_sql_id, "rule_label": rule.rule_label,
+                          "query_name": rule.query_name, "file_type_id": rule.file_id,
+                          "target_file_type_id": rule.target_file_id, "failure_count": failureCount,
+                          "elapsed_seconds": elapsed})
+
+    @staticmethod
+    def recordRuleStats(stats, submissionId, conn=None):
+        """ Store the statistics of a run of rules in rule_execution_stats
+
+        Each rule is stored with the number of rows the submission has in its file's staging table.
+        Set record_rule_stats to false to turn this off. A failure to store the statistics is logged
+        and does not fail the validation.
+
+        Args:
+            stats: List of dicts from isolateRule
+            submissionId: ID of the submission the rules ran against
+            conn: Connection to store them with, defaults to the GlobalDB connection
+        """
+        if not stats or not CONFIG_BROKER.get('record_rule_stats', True):
+            return
+        if conn is None:
+            conn = GlobalDB.db().connection
+        models = {fileType.id: fileType.model for fileType in FILE_TYPE}
+        rowCounts = {}
+        try:
+            for fileId in {stat["file_type_id"] for stat in stats}:
+                model = models.get(fileId)
+                if model is not None:
+                    rowCounts[fileId] = conn.execute(select([func.count()]).select_from(model.__table__).where(
+                        model.__table__.c.submission_id == submissionId)).scalar()
+            now = datetime.utcnow()
+            conn.execute(RuleExecutionStats.__table__.insert().values([
+                dict(stat, submission_id=submissionId, staging_row_count=rowCounts.get(stat["file_type_id"]),
+                     created_at=now, updated_at=now) for stat in stats]))
+        except SQLAlchemyError:
+            _exception_logger.exception(
+                'VALIDATOR_INFO: Could not record rule statistics for submission_id: %s', submissionId)
@@ -0,0 +1,204 @@
+""" Benchmark file and cross-file validation against a local Postgres
+
+Creates a scratch database, loads the schemas, SQL rules and domain values
+from the validator's config folder, then for each size generates a synthetic
+submission and runs runValidation on each file and runCrossValidation on the
+submission in local mode. Each size runs in its own process so its peak RSS is
+not inflated by the sizes before it.
+
+    python -m tests.benchmark.run_benchmark --rows 10000 --rows 100000
+    python -m tests.benchmark.run_benchmark --set lazy_reports=true --output json
+
+Settings passed with --set override CONFIG_BROKER, to compare a feature on and off.
+"""
+import argparse
+import json
+import os
+from random import randint
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+import dataactcore.config
+from dataactcore.config import CONFIG_BROKER, CONFIG_DB
+from dataactcore.interfaces.db import GlobalDB
+from dataactcore.interfaces.interfaceHolder import InterfaceHolder
+from dataactcore.models.jobModels import Job, JobPhaseTiming
+from dataactcore.models.validationModels import RuleExecutionStats
+from dataactcore.scripts.databaseSetup import createDatabase, dropDatabase, runMigrations
+from dataactcore.scripts.setupErrorDB import setupErrorDB
+from dataactcore.scripts.setupJobTrackerDB import setupJobTrackerDB
+from dataactcore.scripts.setupValidationDB import setupValidationDB
+from dataactvalidator.app import createApp
+from dataactvalidator.filestreaming.schemaLoader import SchemaLoader
+from dataactvalidator.filestreaming.sqlLoader import SQLLoader
+from dataactvalidator.scripts.generate_submission import (
+    create_submission_jobs, generate_submission, validator_config_path)
+from dataactvalidator.scripts.loadFile import loadDomainValues
+from dataactvalidator.scripts.loadTas import loadTas
+from dataactvalidator.scripts.load_sf133 import load_sf133
+from dataactvalidator.validation_handlers.validationManager import ValidationManager
+
+SIZES = (10000, 100000, 1000000)
+
+# Number of slowest rules listed for each run
+TOP_RULES = 10
+
+
+def use_database(db_name):
+    """ Point the broker's config at the benchmark database """
+    config = dataactcore.config.CONFIG_DB
+    config['db_name'] = db_name
+    dataactcore.config.CONFIG_DB = config
+
+
+def setup_database(db_name):
+    """ Create the benchmark database and load everything the validations read """
+    use_database(db_name)
+    createDatabase(CONFIG_DB['db_name'])
+    runMigrations()
+    setupJobTrackerDB()
+    setupErrorDB()
+    setupValidationDB()
+    with createApp().app_context():
+        SchemaLoader.loadAllFromPath(validator_config_path)
+        SQLLoader.loadSql("sqlRules.csv")
+        loadDomainValues(validator_config_path)
+        # The SF-133 in the config folder is for fiscal year 2016 period 6, the quarter ending 2016-03-31
+        load_sf133(os.path.join(validator_config_path, "sf_133.csv"), "2016", "06", force_load=True)
+    loadTas()
+
+
+def apply_settings(settings):
+    """ Override CONFIG_BROKER with key=value strings, values are parsed as YAML """
+    for setting in settings:
+        key, _, value = setting.partition("=")
+        CONFIG_BROKER[key.strip()] = yaml.safe_load(value)
+
+
+def run_size(rows, error_rate, seed):
+    """ Generate a submission of the given size and validate it
+
+    Returns:
+        Dict of results for the report
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        started = time.perf_counter()
+        paths = generate_submission(directory, rows, error_rate, seed)
+        result = {"rows": rows, "error_rate": error_rate, "generate_seconds": time.perf_counter() - started,
+                  "files": {}}
+
+        with createApp().app_context():
+            sess = GlobalDB.db().session
+            interfaces = InterfaceHolder()
+            jobs, cross_file_id = create_submission_jobs(sess, paths)
+            manager = ValidationManager(True, os.path.join(directory, "reports"))
+            total_seconds = 0.0
+            for file_type, job_id in sorted(jobs.items()):
+                interfaces.jobDb.markJobStatus(job_id, "running")
+                started = time.perf_counter()
+                manager.runValidation(job_id, interfaces)
+                seconds = time.perf_counter() - started
+                total_seconds += seconds
+                job = sess.query(Job).filter(Job.job_id == job_id).one()
+                phases = sess.query(JobPhaseTiming).filter(JobPhaseTiming.job_id == job_id). \
+                    order_by(JobPhaseTiming.job_phase_timing_id).all()
+                result["files"][file_type] = {
+                    "seconds": seconds, "rows_per_second": rows / seconds if seconds else None,
+                    "bytes": job.file_size, "rows_valid": job.number_of_rows_valid,
+                    "phases": {phase.phase: {"wall_seconds": phase.wall_seconds, "cpu_seconds": phase.cpu_seconds,
+                                             "rows_per_second": phase.rows_per_second} for phase in phases}}
+
+            interfaces.jobDb.markJobStatus(cross_file_id, "running")
+            started = time.perf_counter()
+            manager.runCrossValidation(cross_file_id, interfaces)
+            result["cross_file_seconds"] = time.perf_counter() - started
+            result["file_seconds"] = total_seconds
+            result["rows_per_second"] = rows * len(jobs) / total_seconds if total_seconds else None
+
+            submission_id = sess.query(Job.submission_id).filter(Job.job_id == cross_file_id).scalar()
+            rule_stats = sess.query(RuleExecutionStats).filter(RuleExecutionStats.submission_id == submission_id). \
+                order_by(RuleExecutionStats.elapsed_seconds.desc()).limit(TOP_RULES).all()
+            result["slowest_rules"] = [{"rule_label": stat.rule_label, "file_type_id": stat.file_type_id,
+                                        "target_file_type_id": stat.target_file_type_id,
+                                        "elapsed_seconds": stat.elapsed_seconds,
+                                        "failure_count": stat.failure_count} for stat in rule_stats]
+            interfaces.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    # ru_maxrss is in kilobytes on Linux
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return result
+
+
+def format_result(result):
+    """ Format one size's results as text """
+    lines = ["{rows} rows, error rate {error_rate}: generated in {generate_seconds:.1f}s, files validated in "
+             "{file_seconds:.1f}s ({rows_per_second:.0f} rows/s), cross-file in {cross_file_seconds:.1f}s, "
+             "peak RSS {peak_rss_mb:.0f} MB".format(**result)]
+    for file_type, timing in sorted(result["files"].items()):
+        lines.append("  {:<20} {:>8.1f}s {:>10.0f} rows/s".format(file_type, timing["seconds"],
+                                                                   timing["rows_per_second"] or 0))
+        for phase, phase_timing in timing["phases"].items():
+            lines.append("    {:<20} wall {:>8.2f}s cpu {:>8.2f}s".format(
+                phase, phase_timing["wall_seconds"], phase_timing["cpu_seconds"]))
+    lines.append("  Slowest rules:")
+    for rule in result["slowest_rules"]:
+        lines.append("    {:<10} {:>8.2f}s {:>8} failures".format(rule["rule_label"], rule["elapsed_seconds"],
+                                                                  rule["failure_count"]))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark validation against a local Postgres.')
+    parser.add_argument('-r', '--rows', help='Rows in each file, may be repeated', type=int, action='append')
+    parser.add_argument('-e', '--error_rate', help='Share of rows that fail a basic schema check', type=float,
+                        default=0.01)
+    parser.add_argument('-s', '--seed', help='Seed for the generated files', type=int, default=0)
+    parser.add_argument('--set', help='Override a broker setting as key=value, may be repeated', action='append',
+                        default=[], dest='settings')
+    parser.add_argument('--output', help='Output format', choices=('text', 'json'), default='text')
+    parser.add_argument('--db_name', help='Existing benchmark database to use, created and dropped if not given')
+    parser.add_argument('--keep_db', help='Keep the benchmark database', action='store_true')
+    args = parser.parse_args()
+    apply_settings(args.settings)
+    sizes = args.rows or SIZES
+
+    if args.db_name and len(sizes) == 1:
+        # Run a single size in this process
+        use_database(args.db_name)
+        result = run_size(sizes[0], args.error_rate, args.seed)
+        print(json.dumps(result) if args.output == 'json' else format_result(result))
+        return
+
+    db_name = args.db_name or 'benchmark{}_data_broker'.format(randint(1, 9999))
+    if not args.db_name:
+        setup_database(db_name)
+    results = []
+    try:
+        for rows in sizes:
+            command = [sys.executable, '-m', 'tests.benchmark.run_benchmark', '--rows', str(rows), '--error_rate',
+                       str(args.error_rate), '--seed', str(args.seed), '--db_name', db_name, '--output', 'json']
+            for setting in args.settings:
+                command += ['--set', setting]
+            output = subprocess.check_output(command, universal_newlines=True, cwd=CONFIG_BROKER['path'])
+            results.append(json.loads(output.strip().splitlines()[-1]))
+            if args.output == 'text':
+                print(format_result(results[-1]))
+    finally:
+        GlobalDB.close()
+        if not args.db_name and not args.keep_db:
+            dropDatabase(db_name)
+    if args.output == 'json':
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+from collections import namedtuple
+
+from dataactvalidator.scripts.audit_rule_plans import (
+    compare_reports, condition_columns, find_issues, format_html, summarize_plan)
+
+
+TABLES = {
+    "award_financial": {"rows": 500000, "columns": {"submission_id", "piid", "fain", "tas"},
+                        "indexes": [["award_financial_id"], ["submission_id"]]},
+    "award_procurement": {"rows": 200000, "columns": {"submission_id", "piid"},
+                          "indexes": [["award_procurement_id"]]},
+    "object_class": {"rows": 100, "columns": {"object_class_code"}, "indexes": []},
+}
+
+PLAN = {
+    "Node Type": "Nested Loop", "Plan Rows": 100, "Actual Rows": 3, "Total Cost": 1000.0,
+    "Shared Hit Blocks": 50, "Shared Read Blocks": 7,
+    "Join Filter": "((af.piid)::text = (ap.piid)::text)",
+    "Plans": [
+        {"Node Type": "Seq Scan", "Relation Name": "award_financial", "Alias": "af", "Plan Rows": 5000,
+         "Filter": "(submission_id = $1)"},
+        {"Node Type": "Seq Scan", "Relation Name": "award_procurement", "Alias": "ap", "Plan Rows": 2000,
+         "Filter": "(submission_id = $1)",
+         "Plans": [{"Node Type": "Index Scan", "Relation Name": "object_class", "Alias": "oc",
+                    "Parent Relationship": "SubPlan", "Subplan Name": "SubPlan 1", "Actual Loops": 2000}]},
+    ]
+}
+
+
+def test_condition_columns():
+    columns = {"submission_id", "piid", "fain"}
+    assert condition_columns("((af.piid)::text = (ap.piid)::text) AND (af.submission_id = $1)", "af", columns) == \
+        ["submission_id", "piid"]
+    assert condition_columns("(fain IS NOT NULL)", "ap", columns) == ["fain"]
+    assert condition_columns(None, "af", columns) == []
+
+
+def test_find_issues():
+    issues = find_issues(PLAN, TABLES)
+    assert [(issue["type"], issue["relation"]) for issue in issues] == [
+        ("nested_loop", "award_procurement"), ("seq_scan", "award_financial"), ("seq_scan", "award_procurement"),
+        ("correlated_subplan", "object_class")]
+    # award_financial has an index leading with submission_id, award_procurement does not
+    assert "index_candidate" not in issues[1]
+    assert issues[2]["index_candidate"] == ["submission_id", "piid"]
+
+    assert find_issues(PLAN, TABLES, large_table_rows=300000)[1:] == [issues[1], issues[3]]
+
+
+def test_summarize_and_compare():
+    rule = namedtuple('Rule', ['rule_label', 'query_name', 'file_id', 'target_file_id'])('C23', 'c23_<af>', 2, 4)
+    summary = summarize_plan(rule, [{"Plan": PLAN, "Execution Time": 120.0, "Planning Time": 1.5}], TABLES)
+    assert (summary["execution_ms"], summary["shared_read_blocks"], len(summary["issues"])) == (120.0, 7, 4)
+
+    baseline = [dict(summary, execution_ms=100.0, issues=summary["issues"][1:])]
+    assert compare_reports([summary], baseline) == 1
+    assert summary["regressions"] == ["new issue: Nested loop over an estimated 5000 x 2000 rows"]
+
+    baseline[0]["execution_ms"] = 50.0
+    baseline[0]["issues"] = summary["issues"]
+    assert compare_reports([summary], baseline) == 1
+    assert summary["regressions"] == ["execution time 120.0 ms, was 50.0 ms"]
+
+    page = format_html([summary], 9)
+    assert "c23_&lt;af&gt;" in page and "c23_<af>" not in page
+    assert "index candidate (submission_id, piid)" in page
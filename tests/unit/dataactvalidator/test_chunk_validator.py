@@ -0,0 +1,49 @@
+import copy
+
+from dataactcore.models.validationModels import FieldType, FileColumn
+from dataactvalidator.filestreaming.fieldCleaner import FieldCleaner
+from dataactvalidator.validation_handlers.chunkValidator import ChunkValidator
+from dataactvalidator.validation_handlers.validationPlan import ValidationPlan
+
+
+FIELDS = [
+    FileColumn(name='string_field', name_short='str', required=True, length=5, padded_flag=False,
+               field_type=FieldType(name='STRING')),
+    FileColumn(name='padded_field', name_short='pad', required=False, length=3, padded_flag=True,
+               field_type=FieldType(name='STRING')),
+    FileColumn(name='int_field', name_short='int', required=False, length=None, padded_flag=False,
+               field_type=FieldType(name='INT')),
+    FileColumn(name='decimal_field', name_short='dec', required=True, length=None, padded_flag=False,
+               field_type=FieldType(name='DECIMAL')),
+    FileColumn(name='boolean_field', name_short='bool', required=False, length=None, padded_flag=False,
+               field_type=FieldType(name='BOOLEAN')),
+]
+LONG_TO_SHORT = {field.name: field.name_short for field in FIELDS}
+SCHEMA = {field.name_short: field for field in FIELDS}
+
+RECORDS = [
+    {'dec': '1,234.50', 'str': ' abc ', 'pad': '7', 'int': '12', 'bool': 'yes'},
+    {'dec': None, 'str': '', 'pad': ' ', 'int': '1,2,3', 'bool': 'maybe'},
+    {'dec': 'x,y', 'str': 'abcdefg', 'pad': '12345', 'int': '1.5', 'bool': None},
+    {'dec': '1e5', 'str': 'ok', 'pad': None, 'int': '+1_000', 'bool': '0'},
+    {'dec': '.', 'str': None, 'pad': '-1', 'int': None, 'bool': 'TRUE'},
+]
+
+
+def row_results(records):
+    """Clean and validate each record the way the row-by-row path does"""
+    plan = ValidationPlan(SCHEMA)
+    cleaned = [FieldCleaner.cleanRow(dict(record), LONG_TO_SHORT, FIELDS) for record in records]
+    return cleaned, [plan.validate(record) for record in cleaned]
+
+
+def test_matches_row_path():
+    chunk_validator = ChunkValidator(FIELDS, LONG_TO_SHORT, ValidationPlan(SCHEMA))
+    assert chunk_validator.validateChunk(copy.deepcopy(RECORDS)) == row_results(RECORDS)
+
+
+def test_skip_validation_still_cleans():
+    chunk_validator = ChunkValidator(FIELDS, LONG_TO_SHORT, ValidationPlan(SCHEMA), skip_validation=True)
+    cleaned, results = chunk_validator.validateChunk(copy.deepcopy(RECORDS))
+    assert cleaned == row_results(RECORDS)[0]
+    assert results == [(True, [], True)] * len(RECORDS)
@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+
+from dataactcore.models.jobModels import FileType, JobStatus, JobType
+from dataactvalidator.validation_handlers.validationManager import ValidationManager
+from tests.unit.dataactcore.factories.job import JobFactory, SubmissionFactory
+
+
+def add_job(sess, submission, job_type, file_type=None, last_validated=None):
+    job = JobFactory(
+        submission=submission,
+        job_status=sess.query(JobStatus).filter_by(name='finished').one(),
+        job_type=sess.query(JobType).filter_by(name=job_type).one(),
+        file_type=sess.query(FileType).filter_by(name=file_type).one() if file_type else None,
+        last_validated=last_validated
+    )
+    sess.add(job)
+    return job
+
+
+def test_changed_file_types(database, job_constants):
+    """Only files loaded after the last cross-file run are reported as changed"""
+    sess = database.session
+    submission = SubmissionFactory()
+    last_run = datetime(2016, 11, 1, 12)
+    cross_file = add_job(sess, submission, 'validation', last_validated=last_run)
+    appropriations = add_job(sess, submission, 'csv_record_validation', 'appropriations',
+                             last_run - timedelta(hours=1))
+    program_activity = add_job(sess, submission, 'csv_record_validation', 'program_activity',
+                               last_run + timedelta(hours=1))
+    sess.commit()
+
+    assert ValidationManager.getChangedFileTypes(cross_file) == {program_activity.file_type_id}
+
+    appropriations.last_validated = None
+    sess.commit()
+    assert ValidationManager.getChangedFileTypes(cross_file) == {
+        appropriations.file_type_id, program_activity.file_type_id}
+
+
+def test_first_run_checks_everything(database, job_constants):
+    sess = database.session
+    cross_file = add_job(sess, SubmissionFactory(), 'validation')
+    sess.commit()
+    assert ValidationManager.getChangedFileTypes(cross_file) is None
@@ -0,0 +1,18 @@
+import gzip
+
+import pytest
+
+from dataactvalidator.filestreaming.csvLocalWriter import CsvLocalWriter
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_local_report(tmpdir, compress):
+    report = str(tmpdir.join('report.csv'))
+    with CsvLocalWriter(report, ['Field name', 'Row number'], compress) as writer:
+        writer.write(['a,b', 2])
+        writer.write([None, 3])
+        writer.finishBatch()
+
+    opener = gzip.open if compress else open
+    with opener(report, 'rt', newline='') as f:
+        assert f.read() == 'Field name,Row number\r\n"a,b",2\r\n,3\r\n'
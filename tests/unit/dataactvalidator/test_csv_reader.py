@@ -0,0 +1,128 @@
+from collections import namedtuple
+
+import pytest
+
+from dataactcore.utils.responseException import ResponseException
+from dataactvalidator.filestreaming.csvAbstractReader import CsvAbstractReader
+from dataactvalidator.filestreaming.csvLocalReader import CsvLocalReader
+
+
+Column = namedtuple('Column', ['name', 'name_short'])
+SCHEMA = [Column('field_a', 'a'), Column('field_b', 'b'), Column('field_c', 'c')]
+LONG_TO_SHORT = {column.name: column.name_short for column in SCHEMA}
+
+
+def read_all(tmpdir, content, buffer_size=CsvAbstractReader.BUFFER_SIZE):
+    """Write content to a CSV, then read every record from it. Rows that can't
+    be read are returned as (is_finished, extra_line) tuples"""
+    csv_file = tmpdir.join('upload.csv')
+    with open(str(csv_file), 'w', newline='') as f:
+        f.write(content)
+
+    reader = CsvLocalReader()
+    reader.BUFFER_SIZE = buffer_size
+    reader.open_file(None, None, str(csv_file), SCHEMA, None, str(tmpdir.join('error.csv')), LONG_TO_SHORT)
+    records = []
+    try:
+        while not reader.is_finished:
+            try:
+                records.append(reader.get_next_record())
+            except ResponseException:
+                records.append((reader.is_finished, reader.extra_line))
+    finally:
+        reader.close()
+    return records
+
+
+@pytest.mark.parametrize('buffer_size', [2, 5, 8192])
+def test_quoted_newlines_across_packets(tmpdir, buffer_size):
+    """Quoted newlines stay inside the field, whatever the packet size"""
+    records = read_all(tmpdir, 'a,b,c\r\n1,2,3\r\n"x\ny",5,\r\n', buffer_size)
+    assert records == [{'a': '1', 'b': '2', 'c': '3'}, {'a': 'x\ny', 'b': '5', 'c': None}]
+
+
+def test_pipe_delimiter_and_long_headers(tmpdir):
+    records = read_all(tmpdir, 'field_a|field_b|field_c\n1|2|3\n4|5|6')
+    assert records == [{'a': '1', 'b': '2', 'c': '3'}, {'a': '4', 'b': '5', 'c': '6'}]
+
+
+def test_blank_lines_skipped(tmpdir):
+    records = read_all(tmpdir, '\na,b,c\n\n1,2,3\n\n\n')
+    assert records == [{'a': '1', 'b': '2', 'c': '3'}]
+
+
+def test_wrong_field_count(tmpdir):
+    """A short row is an error but does not stop reading"""
+    records = read_all(tmpdir, 'a,b,c\n1,2\n4,5,6\n7,8,9,10\n')
+    assert records == [(False, False), {'a': '4', 'b': '5', 'c': '6'}, (True, False)]
+
+
+def test_unknown_columns_ignored(tmpdir):
+    records = read_all(tmpdir, 'a,extra,b,c\n1,x,2,3\n')
+    assert records == [{'a': '1', 'b': '2', 'c': '3'}]
+
+
+def test_split_records(tmpdir):
+    """Segments hold whole records, each with the header, and read back the same records"""
+    content = 'a,b,c\r\n1,2,3\r\n\r\n"x\r\n\r\ny",5,\r\n7,8,9\r\n4,"""q""",6'
+    source = tmpdir.join('upload.csv')
+    with open(str(source), 'w', newline='') as f:
+        f.write(content)
+    segment_dir = tmpdir.mkdir('segments')
+
+    reader = CsvLocalReader()
+    reader.BUFFER_SIZE = 4
+    reader.open_stream(None, None, str(source))
+    try:
+        segments = reader.split_records(str(segment_dir), 2)
+    finally:
+        reader.close()
+
+    assert [rows for _, rows in segments] == [2, 2]
+    split_records = []
+    for path, _ in segments:
+        split_records.extend(read_all(tmpdir, open(path, newline='').read()))
+    assert split_records == read_all(tmpdir, content)
+
+
+def test_split_opened_file(tmpdir):
+    """A file opened with open_file is split from its first record, without reading it again"""
+    content = '\r\na,b,c\r\n"x\r\ny",2,3\r\n\r\n4,5,6\r\n7,8,9'
+    source = tmpdir.join('upload.csv')
+    with open(str(source), 'w', newline='') as f:
+        f.write(content)
+    segment_dir = tmpdir.mkdir('segments')
+
+    reader = CsvLocalReader()
+    reader.BUFFER_SIZE = 4
+    reader.open_file(None, None, str(source), SCHEMA, None, str(tmpdir.join('error.csv')), LONG_TO_SHORT)
+    try:
+        segments = reader.split_records(str(segment_dir), 2)
+        assert reader.is_finished
+        assert reader.bytes_read == len(content.encode())
+    finally:
+        reader.close()
+
+    assert [rows for _, rows in segments] == [2, 1]
+    split_records = []
+    for path, _ in segments:
+        split_records.extend(read_all(tmpdir, open(path, newline='').read()))
+    assert split_records == read_all(tmpdir, content)
+
+
+def test_bytes_read(tmpdir):
+    """Bytes are counted in the file, before line endings are translated"""
+    content = 'a,b,c\r\n1,2,3\r\n4,5,6\r\n'
+    csv_file = tmpdir.join('upload.csv')
+    with open(str(csv_file), 'w', newline='') as f:
+        f.write(content)
+
+    reader = CsvLocalReader()
+    reader.BUFFER_SIZE = 4
+    reader.open_file(None, None, str(csv_file), SCHEMA, None, str(tmpdir.join('error.csv')), LONG_TO_SHORT)
+    try:
+        while not reader.is_finished:
+            reader.get_next_record()
+    finally:
+        reader.close()
+    assert reader.bytes_read == len(content)
@@ -0,0 +1,75 @@
+from dataactcore.config import CONFIG_BROKER
+from dataactvalidator.filestreaming.csvS3Reader import CsvS3Reader
+
+
+class FakeKey(object):
+    """Stands in for a boto S3 key, serving ranged requests from bytes"""
+    def __init__(self, content):
+        self.content = content
+        self.size = len(content)
+        self.name = 'upload.csv'
+        self.bucket = self
+        self.ranges = []
+
+    def new_key(self, name):
+        return self
+
+    def get_contents_as_string(self, headers):
+        start, end = headers['Range'][len('bytes='):].split('-')
+        self.ranges.append((int(start), int(end)))
+        return self.content[int(start):int(end) + 1]
+
+
+def prefetch_reader(content, block_size):
+    reader = CsvS3Reader()
+    reader.BUFFER_SIZE = block_size
+    reader.s3_file = FakeKey(content)
+    reader.start_prefetch()
+    return reader
+
+
+def read_packets(reader):
+    packets = []
+    success, packet = reader._get_next_packet()
+    while success:
+        packets.append(packet)
+        success, packet = reader._get_next_packet()
+    reader.close()
+    return packets
+
+
+def test_blocks_read_in_order():
+    """Blocks come back in file order, even with several in flight"""
+    content = ''.join(str(i % 10) for i in range(100)).encode('utf-8')
+    reader = prefetch_reader(content, 7)
+    packets = read_packets(reader)
+
+    assert ''.join(packets).encode('utf-8') == content
+    assert sorted(reader.s3_file.ranges)[0] == (0, 6)
+    assert len(reader.s3_file.ranges) == 15
+
+
+def test_multibyte_character_split_across_blocks():
+    content = 'a,b\né,中\n'.encode('utf-8')
+    reader = prefetch_reader(content, 5)
+    packets = read_packets(reader)
+
+    assert ''.join(packets) == 'a,b\né,中\n'
+
+
+def test_empty_file():
+    reader = prefetch_reader(b'', 5)
+    assert read_packets(reader) == []
+
+
+def test_prefetch_off(monkeypatch):
+    """With s3_prefetch_blocks set to 0, no block is requested before the reader gets to it"""
+    monkeypatch.setitem(CONFIG_BROKER, 's3_prefetch_blocks', 0)
+    content = b'0123456789'
+    reader = prefetch_reader(content, 4)
+    assert reader.prefetch_blocks == 0
+
+    success, packet = reader._get_next_packet()
+    assert (success, packet) == (True, '0123')
+    assert reader.s3_file.ranges == [(0, 3)]
+    assert ''.join([packet] + read_packets(reader)).encode('utf-8') == content
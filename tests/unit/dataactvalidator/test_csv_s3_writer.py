@@ -0,0 +1,134 @@
+import gzip
+import threading
+
+import pytest
+
+from dataactvalidator.filestreaming import csvS3Writer
+from dataactvalidator.filestreaming.csvS3Writer import CsvS3Writer
+
+
+class FakeMultipartUpload:
+    def __init__(self, bucket, fail_part=None):
+        self.bucket = bucket
+        self.parts = {}
+        self.fail_part = fail_part
+        self.state = 'open'
+        self.threads = set()
+
+    def upload_part_from_file(self, fp, part_num):
+        self.threads.add(threading.get_ident())
+        if part_num == self.fail_part:
+            raise IOError('upload failed')
+        self.parts[part_num] = fp.read()
+
+    def complete_upload(self):
+        self.state = 'complete'
+        self.bucket.objects[self.name] = b''.join(self.parts[n] for n in sorted(self.parts))
+        self.bucket.headers[self.name] = self.headers
+
+    def cancel_upload(self):
+        self.state = 'cancelled'
+
+
+class FakeKey:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+
+    def set_contents_from_string(self, data, headers=None):
+        self.bucket.objects[self.name] = data
+        self.bucket.headers[self.name] = headers
+
+
+class FakeBucket:
+    def __init__(self, fail_part=None):
+        self.objects = {}
+        self.headers = {}
+        self.uploads = []
+        self.fail_part = fail_part
+
+    def initiate_multipart_upload(self, name, headers=None):
+        upload = FakeMultipartUpload(self, self.fail_part)
+        upload.name = name
+        upload.headers = headers
+        self.uploads.append(upload)
+        return upload
+
+    def new_key(self, name):
+        return FakeKey(self, name)
+
+
+@pytest.fixture
+def bucket(monkeypatch):
+    fake_bucket = FakeBucket()
+
+    class FakeConnection:
+        def get_bucket(self, name):
+            return fake_bucket
+
+    monkeypatch.setattr(csvS3Writer.boto.s3, 'connect_to_region', lambda region: FakeConnection(), raising=False)
+    return fake_bucket
+
+
+def test_small_report_single_request(bucket):
+    with CsvS3Writer('us-east-1', 'bucket', 'errors/report.csv', ['Field name', 'Row number']) as writer:
+        writer.write(['a,b', 2])
+        writer.write([None, 3])
+        writer.finishBatch()
+    assert bucket.uploads == []
+    assert bucket.objects['errors/report.csv'] == b'Field name,Row number\r\n"a,b",2\r\n,3\r\n'
+
+
+def test_large_report_uploaded_in_background(bucket, monkeypatch):
+    monkeypatch.setattr(CsvS3Writer, 'BUFFER_SIZE', 64)
+    monkeypatch.setattr(CsvS3Writer, 'BATCH_SIZE', 2)
+    rows = [['field', str(n), 'value {}'.format(n)] for n in range(100)]
+    with CsvS3Writer('us-east-1', 'bucket', 'errors/report.csv', ['Field name', 'Row number', 'Value']) as writer:
+        for row in rows:
+            writer.write(row)
+        writer.flush()
+        assert len(bucket.uploads[0].parts) == writer.part_number
+        writer.write(['last', '101', ''])
+        writer.finishBatch()
+
+    upload = bucket.uploads[0]
+    assert upload.state == 'complete'
+    assert len(upload.parts) > 2
+    assert threading.get_ident() not in upload.threads
+    expected = 'Field name,Row number,Value\r\n' + ''.join(','.join(row) + '\r\n' for row in rows) + 'last,101,\r\n'
+    assert bucket.objects['errors/report.csv'] == expected.encode()
+
+
+def test_upload_error_raised_and_cancelled(monkeypatch):
+    fake_bucket = FakeBucket(fail_part=1)
+
+    class FakeConnection:
+        def get_bucket(self, name):
+            return fake_bucket
+
+    monkeypatch.setattr(csvS3Writer.boto.s3, 'connect_to_region', lambda region: FakeConnection(), raising=False)
+    monkeypatch.setattr(CsvS3Writer, 'BUFFER_SIZE', 16)
+    with pytest.raises(IOError):
+        with CsvS3Writer('us-east-1', 'bucket', 'errors/report.csv', ['header']) as writer:
+            for n in range(50):
+                writer.write(['row {}'.format(n)])
+            writer.finishBatch()
+    assert fake_bucket.uploads[0].state == 'cancelled'
+    assert 'errors/report.csv' not in fake_bucket.objects
+
+
+@pytest.mark.parametrize('buffer_size', [1024, CsvS3Writer.BUFFER_SIZE])
+def test_compressed_report(bucket, monkeypatch, buffer_size):
+    """Compressed reports are gzip data stored with a gzip Content-Encoding, in one or many parts"""
+    monkeypatch.setattr(CsvS3Writer, 'BUFFER_SIZE', buffer_size)
+    rows = [['field', str(n), 'value {}'.format(n * 7919 % 10007)] for n in range(20000)]
+    with CsvS3Writer('us-east-1', 'bucket', 'errors/report.csv', ['Field name', 'Row number', 'Value'],
+                     compress=True) as writer:
+        for row in rows:
+            writer.write(row)
+        writer.finishBatch()
+
+    expected = 'Field name,Row number,Value\r\n' + ''.join(','.join(row) + '\r\n' for row in rows)
+    assert gzip.decompress(bucket.objects['errors/report.csv']) == expected.encode()
+    assert bucket.headers['errors/report.csv'] == {'Content-Type': 'text/csv', 'Content-Encoding': 'gzip'}
+    assert bool(bucket.uploads) == (buffer_size == 1024)
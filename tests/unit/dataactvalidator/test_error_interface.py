@@ -0,0 +1,49 @@
+from dataactcore.models.errorModels import ErrorMetadata
+from dataactcore.models.lookups import ERROR_TYPE_DICT
+from dataactcore.scripts import setupErrorDB
+from dataactvalidator.validation_handlers.errorInterface import ErrorInterface
+from dataactvalidator.validation_handlers.validationError import ValidationError
+
+
+def test_merge_row_errors():
+    """Merged counts add up and the earliest first row is kept"""
+    first, second = ErrorInterface(), ErrorInterface()
+    first.recordRowError(1, 'file.csv', 'field_a', ValidationError.typeError, 3)
+    second.recordRowError(1, 'file.csv', 'field_a', ValidationError.typeError, 12)
+    second.recordRowError(1, 'file.csv', 'field_a', ValidationError.typeError, 15)
+    second.recordRowError(1, 'file.csv', 'field_b', ValidationError.requiredError, 14)
+
+    first.mergeRowErrors(second.rowErrors)
+    counts = {error.fieldName: (error.numErrors, error.firstRow) for error in first.rowErrors.values()}
+    assert counts == {'field_a': (3, 3), 'field_b': (1, 14)}
+
+
+def test_prestored_error_type():
+    assert ErrorInterface.getPrestoredErrorType(ValidationError.typeError) == ValidationError.typeError
+    assert ErrorInterface.getPrestoredErrorType(str(ValidationError.typeError)) == ValidationError.typeError
+    assert ErrorInterface.getPrestoredErrorType('Value must be positive') is None
+
+
+def test_write_all_row_errors(database):
+    """Aggregates for the job are written in one go, other jobs' errors are skipped"""
+    sess = database.session
+    setupErrorDB.insertCodes(sess)
+    sess.commit()
+
+    error_list = ErrorInterface()
+    error_list.recordRowError(1, 'file.csv', 'field_a', ValidationError.typeError, 3)
+    error_list.recordRowError(1, 'file.csv', 'field_a', ValidationError.typeError, 5)
+    error_list.recordRowError(1, 'file.csv', 'field_b', 'Field must be no longer than specified limit (5)', 4,
+                              'B1')
+    error_list.recordRowError(2, 'other.csv', 'field_a', ValidationError.typeError, 2)
+    error_list.writeAllRowErrors(1)
+
+    rows = {row.field_name: row for row in sess.query(ErrorMetadata).all()}
+    assert set(rows) == {'field_a', 'field_b'}
+    assert (rows['field_a'].occurrences, rows['field_a'].first_row) == (2, 3)
+    assert rows['field_a'].error_type_id == ERROR_TYPE_DICT['type_error']
+    assert rows['field_a'].rule_failed == ValidationError.getErrorMessage(ValidationError.typeError)
+    assert rows['field_b'].error_type_id == ERROR_TYPE_DICT['length_error']
+    assert rows['field_b'].original_rule_label == 'B1'
+    assert rows['field_b'].created_at is not None
+    assert error_list.rowErrors == {}
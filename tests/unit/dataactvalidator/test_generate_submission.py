@@ -0,0 +1,61 @@
+import csv
+
+from dataactvalidator.scripts.generate_submission import SubmissionGenerator, generate_submission, read_fields
+from dataactvalidator.validation_handlers.validator import Validator
+
+# Data types in the field files and the types Validator.checkType checks them as
+CHECK_TYPES = {"float": "DECIMAL", "int": "INT", "long": "LONG", "str": "STRING"}
+
+
+def read_rows(path):
+    with open(path, newline='') as csvfile:
+        return list(csv.DictReader(csvfile))
+
+
+def failed_fields(fields, row):
+    """Return the names of the fields in a row that fail a basic schema check"""
+    failed = []
+    for field in fields:
+        value = row[field.name]
+        if (field.required and not value.strip()) or (field.length and len(value) > field.length) or \
+                not Validator.checkType(value, CHECK_TYPES[field.data_type]):
+            failed.append(field.name)
+    return failed
+
+
+def test_generated_files_pass_basic_checks(tmpdir):
+    paths = generate_submission(str(tmpdir), 50)
+
+    assert sorted(paths) == ["appropriations", "award", "award_financial", "award_procurement",
+                             "program_activity"]
+    for file_type, path in paths.items():
+        fields = read_fields(file_type)
+        rows = read_rows(path)
+        assert len(rows) == 50
+        assert list(rows[0]) == [field.name for field in fields]
+        for row in rows:
+            assert failed_fields(fields, row) == []
+
+
+def test_award_ids_shared(tmpdir):
+    paths = generate_submission(str(tmpdir), 50, file_types=["award_financial", "award_procurement"])
+    financial = {row["piid"] for row in read_rows(paths["award_financial"]) if row["piid"]}
+    procurement = {row["piid"] for row in read_rows(paths["award_procurement"])}
+    assert financial & procurement
+
+
+def test_error_rate(tmpdir):
+    generator = SubmissionGenerator(seed=1)
+    path = str(tmpdir.join("approp.csv"))
+    broken = generator.write_file("appropriations", path, 1000, 0.1)
+
+    fields = read_fields("appropriations")
+    assert 50 < broken < 150
+    assert sum(1 for row in read_rows(path) if failed_fields(fields, row)) == broken
+
+
+def test_seed(tmpdir):
+    first = SubmissionGenerator(seed=3).write_file("appropriations", str(tmpdir.join("first.csv")), 20, 0.1)
+    second = SubmissionGenerator(seed=3).write_file("appropriations", str(tmpdir.join("second.csv")), 20, 0.1)
+    assert first == second
+    assert tmpdir.join("first.csv").read() == tmpdir.join("second.csv").read()
@@ -0,0 +1,49 @@
+import logging
+import time
+
+from dataactvalidator.validation_handlers import phaseTimer
+from dataactvalidator.validation_handlers.phaseTimer import PhaseTimer
+
+
+def test_laps_add_up():
+    """Each lap is added to its phase, repeated phases accumulate"""
+    timer = PhaseTimer()
+    started = timer.start()
+    for _ in range(2):
+        time.sleep(0.02)
+        started = timer.lap('read', started)
+        sum(range(100000))
+        started = timer.lap('validate', started)
+
+    assert list(timer.phases) == ['read', 'validate']
+    assert timer.phases['read'].wall_seconds >= 0.04
+    # Sleeping takes no CPU time
+    assert timer.phases['read'].cpu_seconds < timer.phases['read'].wall_seconds
+    assert timer.phases['validate'].cpu_seconds > 0
+
+
+def test_counts_and_rate():
+    timer = PhaseTimer()
+    timer.lap('read', timer.start())
+    timer.phases['read'].wall_seconds = 2.0
+    timer.count('read', rows=100, bytes_read=4096)
+    # Phases that were never timed are not added
+    timer.count('load_parallel', rows=100)
+
+    assert list(timer.phases) == ['read']
+    assert (timer.phases['read'].rows, timer.phases['read'].bytes_read) == (100, 4096)
+    assert timer.phases['read'].rows_per_second == 50.0
+
+
+def test_record_logs_fields(monkeypatch, caplog):
+    """Phases are logged with structured fields, storing them can be turned off"""
+    monkeypatch.setitem(phaseTimer.CONFIG_BROKER, 'record_phase_timing', False)
+    timer = PhaseTimer()
+    timer.lap('sql_rules', timer.start())
+    timer.count('sql_rules', rows=10)
+
+    with caplog.at_level(logging.INFO, logger=phaseTimer.__name__):
+        timer.record(5)
+    record, = caplog.records
+    assert (record.job_id, record.phase, record.rows) == (5, 'sql_rules', 10)
+    assert 'phase: sql_rules' in record.getMessage()
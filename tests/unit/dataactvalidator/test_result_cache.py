@@ -0,0 +1,113 @@
+from datetime import date
+import json
+
+from dataactcore.models.errorModels import ErrorMetadata
+from dataactcore.models.jobModels import FileType, JobStatus, JobType, ValidationCache
+from dataactcore.models.stagingModels import Appropriation
+from dataactcore.scripts import setupErrorDB, setupValidationDB
+from dataactcore.utils.report import get_report_path
+from dataactvalidator.validation_handlers.resultCache import ResultCache
+from tests.unit.dataactcore.factories.job import JobFactory, SubmissionFactory
+from tests.unit.dataactcore.factories.staging import AppropriationFactory
+
+
+def add_job(sess, status='finished', reporting_start_date=date(2016, 10, 1)):
+    job = JobFactory(
+        submission=SubmissionFactory(reporting_start_date=reporting_start_date,
+                                     reporting_end_date=date(2016, 12, 31)),
+        job_status=sess.query(JobStatus).filter_by(name=status).one(),
+        job_type=sess.query(JobType).filter_by(name='csv_record_validation').one(),
+        file_type=sess.query(FileType).filter_by(name='appropriations').one()
+    )
+    sess.add(job)
+    sess.commit()
+    return job
+
+
+def test_content_hash_local(tmpdir):
+    first, second, third = tmpdir.join('first.csv'), tmpdir.join('second.csv'), tmpdir.join('third.csv')
+    first.write('a,b\n1,2\n')
+    second.write('a,b\n1,2\n')
+    third.write('a,b\n1,3\n')
+
+    assert ResultCache.getContentHash(str(first), True) == ResultCache.getContentHash(str(second), True)
+    assert ResultCache.getContentHash(str(first), True) != ResultCache.getContentHash(str(third), True)
+    assert ResultCache.getContentHash(str(tmpdir.join('missing.csv')), True) is None
+
+
+def test_cache_key(database, job_constants):
+    """The key changes with the reporting period, the agency, the agency's published submissions and the schema
+    version"""
+    sess = database.session
+    job = add_job(sess)
+    other_period = add_job(sess, reporting_start_date=date(2016, 7, 1))
+    other_agency = add_job(sess)
+    other_agency.submission.cgac_code = job.submission.cgac_code + 'x'
+    sess.commit()
+    key = ResultCache.getCacheKey(job, 'sha256:abc')
+
+    assert ResultCache.getCacheKey(job, 'sha256:abc') == key
+    assert ResultCache.getCacheKey(job, 'sha256:abd') != key
+    assert ResultCache.getCacheKey(other_period, 'sha256:abc') != key
+    assert ResultCache.getCacheKey(other_agency, 'sha256:abc') != key
+
+    # A16 passes once another submission of the agency for the fiscal year is publishable
+    same_year = add_job(sess, reporting_start_date=date(2016, 11, 1))
+    same_year.submission.cgac_code = job.submission.cgac_code
+    same_year.submission.reporting_fiscal_year = job.submission.reporting_fiscal_year
+    same_year.submission.publishable = True
+    sess.commit()
+    assert ResultCache.getCacheKey(job, 'sha256:abc') != key
+    key = ResultCache.getCacheKey(job, 'sha256:abc')
+
+    job.file_type.schema_version += 1
+    sess.commit()
+    assert ResultCache.getCacheKey(job, 'sha256:abc') != key
+
+
+def test_find_prefers_own_job(database, job_constants):
+    sess = database.session
+    other = add_job(sess)
+    job = add_job(sess, status='running')
+    unfinished = add_job(sess, status='running')
+    ResultCache.store(other.job_id, 'key', 10, 3, 2)
+    ResultCache.store(unfinished.job_id, 'key', 10, 3, 2)
+
+    assert ResultCache.find(job, 'key').job_id == other.job_id
+    assert ResultCache.find(job, 'other key') is None
+
+    ResultCache.store(job.job_id, 'key', 10, 3, 2)
+    assert ResultCache.find(job, 'key').job_id == job.job_id
+
+    ResultCache.discard(job.job_id)
+    assert ResultCache.find(job, 'key').job_id == other.job_id
+
+
+def test_reuse_other_job(database, job_constants, tmpdir):
+    """Staging rows, error metadata and reports are copied from the cached job"""
+    sess = database.session
+    setupErrorDB.insertCodes(sess)
+    setupValidationDB.insertCodes(sess)
+    source = add_job(sess)
+    job = add_job(sess, status='running')
+    sess.add_all([AppropriationFactory(submission_id=source.submission_id, job_id=source.job_id, row_number=row)
+                  for row in (2, 3)])
+    sess.add(ErrorMetadata(job_id=source.job_id, filename='source.csv', field_name='field_a', occurrences=4,
+                           first_row=2, rule_failed='Value must be positive', original_rule_label='A1'))
+    sess.commit()
+    for report_type in ('error', 'warning'):
+        tmpdir.join(get_report_path(source, report_type)).write(report_type)
+    ResultCache.store(source.job_id, 'key', 100, 3, 1)
+
+    ResultCache.reuse(job, ResultCache.find(job, 'key'), Appropriation, 'new.csv', True, str(tmpdir))
+
+    rows = sess.query(Appropriation).filter_by(submission_id=job.submission_id).all()
+    assert sorted(row.row_number for row in rows) == [2, 3]
+    assert {row.job_id for row in rows} == {job.job_id}
+    error = sess.query(ErrorMetadata).filter_by(job_id=job.job_id).one()
+    assert (error.filename, error.field_name, error.occurrences) == ('new.csv', 'field_a', 4)
+    assert tmpdir.join(get_report_path(job, 'warning')).read() == 'warning'
+    # The job now has its own cache entry
+    cached = sess.query(ValidationCache).filter_by(job_id=job.job_id).one()
+    assert (cached.cache_key, cached.number_of_rows) == ('key', 3)
+    assert json.loads(cached.error_metadata)[0]['field_name'] == 'field_a'
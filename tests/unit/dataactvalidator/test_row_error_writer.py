@@ -0,0 +1,172 @@
+import csv
+import os
+
+import pytest
+
+from dataactcore.interfaces.function_bag import get_row_errors
+from dataactcore.models.errorModels import ErrorReport, RowError
+from dataactcore.models.jobModels import FileType, JobStatus, JobType
+from dataactcore.models.lookups import RULE_SEVERITY_DICT
+from dataactcore.scripts import setupValidationDB
+from dataactvalidator.filestreaming.csvLocalWriter import CsvLocalWriter
+from dataactvalidator.filestreaming.rowErrorWriter import (
+    RowErrorWriter, materializeReports, pendingReports, REPORT_HEADERS, CROSS_FILE_REPORT_HEADERS)
+from tests.unit.dataactcore.factories.job import JobFactory, SubmissionFactory
+
+
+def add_job(sess):
+    setupValidationDB.insertCodes(sess)
+    job = JobFactory(
+        submission=SubmissionFactory(),
+        job_status=sess.query(JobStatus).filter_by(name='finished').one(),
+        job_type=sess.query(JobType).filter_by(name='csv_record_validation').one(),
+        file_type=sess.query(FileType).filter_by(name='appropriations').one()
+    )
+    sess.add(job)
+    sess.commit()
+    return job
+
+
+def read_report(path):
+    with open(path, newline='') as report:
+        return list(csv.reader(report))
+
+
+def test_materialize_report(database, job_constants, tmpdir):
+    """Stored rows are written out in order the first time, and only the first time"""
+    sess = database.session
+    job = add_job(sess)
+    with RowErrorWriter(database.engine, job.job_id, 'errors.csv', REPORT_HEADERS,
+                        RULE_SEVERITY_DICT['fatal']) as writer:
+        writer.write(['field_a', 'Value must be positive', '3', '-1', 'A1'])
+        writer.write(['field_b', 'Required field', '5', None, ''])
+        writer.finishBatch()
+    with RowErrorWriter(database.engine, job.job_id, 'empty.csv', REPORT_HEADERS,
+                        RULE_SEVERITY_DICT['warning']) as writer:
+        writer.finishBatch()
+
+    assert sess.query(RowError).count() == 2
+    assert not os.path.exists(str(tmpdir.join('errors.csv')))
+
+    materializeReports(['errors.csv', 'empty.csv', 'missing.csv'], True, str(tmpdir))
+    assert read_report(str(tmpdir.join('errors.csv'))) == [
+        REPORT_HEADERS,
+        ['field_a', 'Value must be positive', '3', '-1', 'A1'],
+        ['field_b', 'Required field', '5', '', '']
+    ]
+    assert read_report(str(tmpdir.join('empty.csv'))) == [REPORT_HEADERS]
+
+    # Already materialized, so the report is not written again
+    os.remove(str(tmpdir.join('errors.csv')))
+    materializeReports(['errors.csv'], True, str(tmpdir))
+    assert not os.path.exists(str(tmpdir.join('errors.csv')))
+
+
+def test_report_being_written_skipped(database, job_constants, tmpdir):
+    """A report another request is writing is left to it, and stays pending until it is written"""
+    sess = database.session
+    job = add_job(sess)
+    with RowErrorWriter(database.engine, job.job_id, 'errors.csv', REPORT_HEADERS,
+                        RULE_SEVERITY_DICT['fatal']) as writer:
+        writer.write(['field_a', 'Value must be positive', '3', '-1', 'A1'])
+        writer.finishBatch()
+    assert pendingReports(['errors.csv', 'missing.csv']) == {'errors.csv'}
+
+    other = database.engine.connect()
+    transaction = other.begin()
+    try:
+        other.execute("SELECT * FROM error_report WHERE report_name = 'errors.csv' FOR UPDATE")
+        materializeReports(['errors.csv'], True, str(tmpdir))
+        assert not os.path.exists(str(tmpdir.join('errors.csv')))
+    finally:
+        transaction.rollback()
+        other.close()
+    assert pendingReports(['errors.csv']) == {'errors.csv'}
+
+    materializeReports(['errors.csv'], True, str(tmpdir))
+    assert os.path.exists(str(tmpdir.join('errors.csv')))
+    assert pendingReports(['errors.csv']) == set()
+
+
+def test_cross_file_report(database, job_constants, tmpdir):
+    sess = database.session
+    job = add_job(sess)
+    row = ['appropriations', 'program_activity', 'field_a, field_b', 'Totals must match', 'field_a: 1, field_b: 2',
+           7, 'A18']
+    with RowErrorWriter(database.engine, job.job_id, 'cross.csv', CROSS_FILE_REPORT_HEADERS,
+                        RULE_SEVERITY_DICT['fatal']) as writer:
+        writer.write(row)
+        writer.finishBatch()
+
+    materializeReports(['cross.csv'], True, str(tmpdir))
+    assert read_report(str(tmpdir.join('cross.csv'))) == [CROSS_FILE_REPORT_HEADERS, row[:5] + ['7', 'A18']]
+
+
+def test_rewrite_replaces_report(database, job_constants):
+    """A new writer for the same report replaces the old rows, a failed one leaves nothing behind"""
+    sess = database.session
+    job = add_job(sess)
+    for _ in range(2):
+        with RowErrorWriter(database.engine, job.job_id, 'errors.csv', REPORT_HEADERS,
+                            RULE_SEVERITY_DICT['fatal']) as writer:
+            writer.write(['field_a', 'Value must be positive', '3', '-1', 'A1'])
+            writer.finishBatch()
+    assert sess.query(ErrorReport).count() == 1
+    assert sess.query(RowError).count() == 1
+
+    with pytest.raises(ValueError):
+        with RowErrorWriter(database.engine, job.job_id, 'errors.csv', REPORT_HEADERS,
+                            RULE_SEVERITY_DICT['fatal']) as writer:
+            writer.write(['field_a', 'Value must be positive', '3', '-1', 'A1'])
+            raise ValueError()
+    assert sess.query(ErrorReport).count() == 0
+    assert sess.query(RowError).count() == 0
+
+
+def test_csv_written_alongside(database, job_constants, tmpdir):
+    """Given a CSV writer, rows go to both and the report counts as materialized"""
+    sess = database.session
+    job = add_job(sess)
+    path = str(tmpdir.join('errors.csv'))
+    with RowErrorWriter(database.engine, job.job_id, 'errors.csv', REPORT_HEADERS, RULE_SEVERITY_DICT['fatal'],
+                        CsvLocalWriter(path, REPORT_HEADERS)) as writer:
+        writer.write(['field_a', 'Value must be positive', '3', '-1', None])
+        writer.finishBatch()
+
+    assert read_report(path) == [REPORT_HEADERS, ['field_a', 'Value must be positive', '3', '-1', '']]
+    assert sess.query(ErrorReport).one().materialized
+    assert sess.query(RowError).one().original_rule_label == ''
+
+
+def test_row_error_pages(database, job_constants):
+    """Pages follow rule label then row order, filters apply to every page"""
+    sess = database.session
+    job = add_job(sess)
+    with RowErrorWriter(database.engine, job.job_id, 'errors.csv', REPORT_HEADERS,
+                        RULE_SEVERITY_DICT['fatal']) as writer:
+        for row in (5, 1, 3):
+            writer.write(['field_a', 'Value must be positive', str(row), '-1', 'B2'])
+            writer.write(['field_b', 'Required field', str(row), None, 'A1'])
+        writer.finishBatch()
+    with RowErrorWriter(database.engine, job.job_id, 'warnings.csv', REPORT_HEADERS,
+                        RULE_SEVERITY_DICT['warning']) as writer:
+        writer.write(['field_a', 'Value is long', '2', 'abc', 'C3'])
+        writer.finishBatch()
+
+    seen = []
+    after = None
+    while True:
+        rows, after = get_row_errors(job.job_id, 2, after)
+        seen.extend((row.original_rule_label, row.row_number) for row in rows)
+        if after is None:
+            break
+    assert seen == [('A1', 1), ('A1', 3), ('A1', 5), ('B2', 1), ('B2', 3), ('B2', 5), ('C3', 2)]
+
+    rows, after = get_row_errors(job.job_id, 2, rule_label='B2')
+    assert [row.row_number for row in rows] == [1, 3]
+    rows, after = get_row_errors(job.job_id, 2, after, rule_label='B2')
+    assert [row.row_number for row in rows] == [5]
+    assert after is None
+
+    rows, _ = get_row_errors(job.job_id, 10, field_name='field_a', severity_id=RULE_SEVERITY_DICT['warning'])
+    assert [(row.original_rule_label, row.value_provided) for row in rows] == [('C3', 'abc')]
@@ -0,0 +1,52 @@
+import pytest
+
+from dataactcore.interfaces.function_bag import get_rule_execution_stats
+from dataactcore.models.lookups import FILE_TYPE_DICT
+from dataactcore.models.validationModels import RuleExecutionStats
+from dataactvalidator.scripts.rule_stats_report import format_report
+from dataactvalidator.validation_handlers.validator import Validator
+from tests.unit.dataactcore.factories.staging import AppropriationFactory
+
+
+def make_stat(query_name, elapsed_seconds, failure_count=0):
+    return {"rule_sql_id": 1, "rule_label": query_name.upper(), "query_name": query_name,
+            "file_type_id": FILE_TYPE_DICT['appropriations'], "target_file_type_id": None,
+            "failure_count": failure_count, "elapsed_seconds": elapsed_seconds}
+
+
+def test_record_rule_stats(database):
+    """Each rule is stored with the size of its file's staging table for the submission"""
+    sess = database.session
+    sess.add_all([AppropriationFactory(submission_id=5), AppropriationFactory(submission_id=5),
+                  AppropriationFactory(submission_id=6)])
+    sess.commit()
+
+    Validator.recordRuleStats([make_stat('a1', 0.5, 2), make_stat('a2', 0.25)], 5, database.connection)
+    stats = sess.query(RuleExecutionStats).order_by(RuleExecutionStats.query_name).all()
+    assert [(stat.query_name, stat.submission_id, stat.staging_row_count, stat.failure_count)
+            for stat in stats] == [('a1', 5, 2, 2), ('a2', 5, 2, 0)]
+
+
+def test_rule_stats_percentiles(database):
+    """Rules are summarized slowest median first"""
+    Validator.recordRuleStats([make_stat('a1', seconds) for seconds in range(1, 21)] +
+                              [make_stat('a2', 50.0)], 5, database.connection)
+
+    rules = get_rule_execution_stats()
+    assert [(rule['query_name'], rule['executions']) for rule in rules] == [('a2', 1), ('a1', 20)]
+    assert rules[1]['p50_seconds'] == 10.5
+    assert rules[1]['p95_seconds'] == pytest.approx(19.05)
+    assert rules[1]['file_type'] == 'appropriations'
+
+    daily = get_rule_execution_stats(period='day', file_type_id=FILE_TYPE_DICT['appropriations'])
+    assert [rule['query_name'] for rule in daily] == ['a1', 'a2']
+    assert get_rule_execution_stats(file_type_id=FILE_TYPE_DICT['award_financial']) == []
+
+
+def test_format_report():
+    rules = [{"query_name": "a1", "rule_label": "A1", "file_type": "appropriations", "executions": 3,
+              "p50_seconds": 1.5, "p95_seconds": 2.25, "average_failures": 0.0, "average_staging_rows": 10.0}]
+    lines = format_report(rules).splitlines()
+    assert lines[0].split() == ["query_name", "rule_label", "file_type", "executions", "p50_seconds",
+                                "p95_seconds", "average_failures", "average_staging_rows"]
+    assert lines[1].split() == ["a1", "A1", "appropriations", "3", "1.500", "2.250", "0.000", "10.000"]
@@ -0,0 +1,101 @@
+from collections import namedtuple
+
+from dataactvalidator.validation_handlers import ruleStatements
+from dataactvalidator.validation_handlers.ruleStatements import RuleStatements
+from tests.unit.dataactcore.factories.staging import AppropriationFactory
+
+
+Rule = namedtuple('Rule', ['rule_sql_id', 'rule_sql'])
+
+
+class FakeResult:
+    def __init__(self, value=None):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+
+class FakeConnection:
+    def __init__(self):
+        self.info = {}
+        self.executed = []
+
+    def execution_options(self, **options):
+        self.executed.append(('options', options))
+        return self
+
+    def execute(self, sql, **params):
+        self.executed.append((sql, params))
+        return FakeResult(params.get('cursor'))
+
+
+def test_parameterize():
+    assert RuleStatements.parameterize('SELECT 1 WHERE a = {}', '$1') == 'SELECT 1 WHERE a = $1'
+    assert RuleStatements.parameterize('SELECT 1 WHERE a = {0} AND b = {0}', '$1') == \
+        'SELECT 1 WHERE a = $1 AND b = $1'
+
+
+def test_not_prepared_by_default(monkeypatch):
+    """Rules run on a server-side cursor with the submission ID bound, however often they run"""
+    monkeypatch.delitem(ruleStatements.CONFIG_BROKER, 'prepare_rule_sql', raising=False)
+    rule = Rule(5, 'SELECT row_number FROM appropriation WHERE submission_id = {}')
+    conn = FakeConnection()
+
+    RuleStatements.execute(conn, rule, 1)
+    RuleStatements.execute(conn, rule, 2)
+    bound = 'SELECT row_number FROM appropriation WHERE submission_id = %(submission_id)s'
+    assert conn.executed == [('options', {'stream_results': True}), (bound, {'submission_id': 1}),
+                             ('options', {'stream_results': True}), (bound, {'submission_id': 2})]
+
+
+def test_prepared_on_reused_connections(monkeypatch):
+    """A rule is prepared the second time it runs on a connection, and again if its SQL changes"""
+    monkeypatch.setitem(ruleStatements.CONFIG_BROKER, 'prepare_rule_sql', True)
+    rule = Rule(5, 'SELECT row_number FROM appropriation WHERE submission_id = {};')
+    changed = Rule(5, 'SELECT row_number, tas FROM appropriation WHERE submission_id = {}')
+    conn = FakeConnection()
+
+    RuleStatements.execute(conn, rule, 1)
+    assert conn.executed[0] == ('options', {'stream_results': True})
+    del conn.executed[:]
+
+    RuleStatements.execute(conn, rule, 2)
+    RuleStatements.execute(conn, rule, 3)
+    RuleStatements.execute(conn, changed, 4)
+    RuleStatements.execute(conn, changed, 5)
+
+    name, changedName = RuleStatements.statementName(rule), RuleStatements.statementName(changed)
+    assert name != changedName and name.startswith('rule_5_')
+    create = [sql for sql, _ in conn.executed if sql.startswith('CREATE')]
+    assert len(create) == 2
+    assert create[0].startswith('CREATE OR REPLACE FUNCTION pg_temp.{}(integer, refcursor)'.format(name))
+    assert 'OPEN failures NO SCROLL FOR SELECT row_number FROM appropriation WHERE submission_id = $1; ' in \
+        create[0]
+    run = 'SELECT pg_temp.{}(%(submission_id)s, %(cursor)s)'.format(name)
+    assert [params for sql, params in conn.executed if sql == run] == [
+        {'submission_id': 2, 'cursor': name + '_failures'}, {'submission_id': 3, 'cursor': name + '_failures'}]
+
+
+def test_execute_prepared_rule(database, monkeypatch):
+    monkeypatch.setitem(ruleStatements.CONFIG_BROKER, 'prepare_rule_sql', True)
+    sess = database.session
+    sess.add_all([AppropriationFactory(submission_id=1, row_number=2),
+                  AppropriationFactory(submission_id=1, row_number=3),
+                  AppropriationFactory(submission_id=2, row_number=4)])
+    sess.commit()
+    rule = Rule(1, 'SELECT row_number FROM appropriation WHERE submission_id = {0} ORDER BY row_number')
+
+    def run(conn, submission_id):
+        result = RuleStatements.execute(conn, rule, submission_id)
+        assert list(result.keys()) == ['row_number']
+        rows = result.fetchmany(1) + result.fetchmany(10)
+        result.close()
+        return [row['row_number'] for row in rows]
+
+    with database.engine.connect() as conn:
+        assert run(conn, 1) == [2, 3]
+        assert run(conn, 1) == [2, 3]
+        assert run(conn, 2) == [4]
+        functions = conn.execute("SELECT proname FROM pg_proc WHERE pronamespace = pg_my_temp_schema()").fetchall()
+        assert [row['proname'] for row in functions] == [RuleStatements.statementName(rule)]
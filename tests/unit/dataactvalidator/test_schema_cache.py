@@ -0,0 +1,46 @@
+from dataactcore.models.validationModels import FieldType, FileColumn
+from dataactvalidator.validation_handlers.schemaCache import SchemaCache
+
+
+class FakeQuery:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return list(self.rows)
+
+
+class FakeSession:
+    def __init__(self, versions):
+        self.versions = versions
+
+    def query(self, *columns):
+        return FakeQuery(self.versions.items())
+
+
+def test_describe():
+    column = FileColumn(file_column_id=3, file_id=1, name='allocation transfer agency identifier',
+                        name_short='allocation_transfer_agency', required=False, padded_flag=True, length=3,
+                        field_type=FieldType(field_type_id=1, name='STRING'))
+    descriptor = SchemaCache.describe(column)
+    assert descriptor.name_short == 'allocation_transfer_agency'
+    assert descriptor.padded_flag and descriptor.length == 3
+    assert descriptor.field_type.name == 'STRING'
+    assert SchemaCache.describe(FileColumn(name='x', field_type=None)).field_type is None
+
+
+def test_version_bump_drops_stale_entries():
+    SchemaCache.clear()
+    try:
+        SchemaCache.checkVersions(FakeSession({1: 0, 2: 0}))
+        SchemaCache._columns = {1: ('appropriations',), 2: ('program_activity',)}
+        SchemaCache._nameMaps = ({}, {})
+
+        SchemaCache.checkVersions(FakeSession({1: 0, 2: 0}))
+        assert set(SchemaCache._columns) == {1, 2} and SchemaCache._nameMaps is not None
+
+        SchemaCache.checkVersions(FakeSession({1: 0, 2: 1}))
+        assert set(SchemaCache._columns) == {1}
+        assert SchemaCache._nameMaps is None
+    finally:
+        SchemaCache.clear()
@@ -0,0 +1,85 @@
+from sqlalchemy import inspect
+
+from dataactcore.models.domainModels import SubmissionSF133
+from dataactcore.models.lookups import FILE_TYPE_DICT, RULE_SEVERITY_DICT
+from dataactcore.models.validationModels import RuleSql
+from dataactcore.scripts import setupValidationDB
+from dataactvalidator.filestreaming.sqlLoader import SQLLoader
+from dataactvalidator.validation_handlers import validator
+from dataactvalidator.validation_handlers.sf133WorkingSet import SF133WorkingSet
+from dataactvalidator.validation_handlers.validator import Validator
+from tests.unit.dataactcore.factories.domain import SF133Factory
+from tests.unit.dataactcore.factories.job import SubmissionFactory
+from tests.unit.dataactcore.factories.staging import AppropriationFactory, ObjectClassProgramActivityFactory
+
+
+def test_reads_working_set():
+    assert SF133WorkingSet.readsWorkingSet("SELECT 1 FROM submission_sf_133 AS sf")
+    assert not SF133WorkingSet.readsWorkingSet("SELECT 1 FROM sf_133 AS sf")
+
+
+def test_build(database):
+    """ The working set has every line of the submission's period for the TAS in its A and B files """
+    sess = database.session
+    submission = SubmissionFactory(reporting_fiscal_year=2016, reporting_fiscal_period=6)
+    sess.add(submission)
+    sess.commit()
+    sid = submission.submission_id
+    sess.add_all([
+        AppropriationFactory(submission_id=sid, row_number=2, tas='tas_a'),
+        ObjectClassProgramActivityFactory(submission_id=sid, row_number=2, tas='tas_b'),
+        SF133Factory(tas='tas_a', fiscal_year=2016, period=6, line=1910, amount=1),
+        SF133Factory(tas='tas_a', fiscal_year=2016, period=6, line=2490, amount=2),
+        SF133Factory(tas='tas_b', fiscal_year=2016, period=6, line=2004, amount=3),
+        # Another period and a TAS the submission doesn't have are left out
+        SF133Factory(tas='tas_a', fiscal_year=2016, period=3, line=1910, amount=4),
+        SF133Factory(tas='tas_c', fiscal_year=2016, period=6, line=1910, amount=5)])
+    sess.commit()
+
+    def working_set():
+        return sorted((row.tas, row.line, row.amount) for row in sess.query(SubmissionSF133).filter_by(
+            submission_id=sid))
+
+    assert SF133WorkingSet.build(sess, sid) == 3
+    sess.commit()
+    assert working_set() == [('tas_a', 1910, 1), ('tas_a', 2490, 2), ('tas_b', 2004, 3)]
+
+    # Building again replaces the submission's lines
+    sess.query(SubmissionSF133).filter_by(submission_id=sid, line=2004).update({"amount": 9})
+    assert SF133WorkingSet.build(sess, sid) == 3
+    sess.commit()
+    assert working_set() == [('tas_a', 1910, 1), ('tas_a', 2490, 2), ('tas_b', 2004, 3)]
+
+
+def test_a_rules_on_rule_threads(database, job_constants, monkeypatch):
+    """ Rules running on a pool of threads read the working set built for them, and the rules loaded
+    through the session are not expired by building it """
+    monkeypatch.setitem(validator.CONFIG_BROKER, 'validator_sql_workers', 4)
+    sess = database.session
+    setupValidationDB.insertCodes(sess)
+    for label, query_name in (('A6', 'a6_appropriations'), ('A7', 'a7_appropriations'),
+                              ('A33', 'a33_appropriations_2')):
+        sess.add(RuleSql(rule_sql=SQLLoader.readSqlStr(query_name), rule_label=label, rule_description=label,
+                         rule_error_message=label, rule_cross_file_flag=False,
+                         file_id=FILE_TYPE_DICT['appropriations'], rule_severity_id=RULE_SEVERITY_DICT['fatal'],
+                         query_name=query_name))
+    submission = SubmissionFactory(reporting_fiscal_year=2016, reporting_fiscal_period=6)
+    sess.add(submission)
+    sess.commit()
+    sid = submission.submission_id
+    sess.add_all([
+        AppropriationFactory(submission_id=sid, row_number=2, tas='tas_a', budget_authority_available_cpe=1,
+                             budget_authority_unobligat_fyb=2),
+        AppropriationFactory(submission_id=sid, row_number=3, tas='tas_b', budget_authority_available_cpe=1,
+                             budget_authority_unobligat_fyb=1),
+        # No SF-133 lines for this TAS
+        AppropriationFactory(submission_id=sid, row_number=4, tas='tas_c', budget_authority_available_cpe=1),
+        SF133Factory(tas='tas_a', fiscal_year=2016, period=6, line=1910, amount=1),
+        SF133Factory(tas='tas_a', fiscal_year=2016, period=6, line=1000, amount=1),
+        SF133Factory(tas='tas_b', fiscal_year=2016, period=6, line=1910, amount=2)])
+    sess.commit()
+    rules = sess.query(RuleSql).all()
+
+    errors = list(Validator.validateFileBySql(sid, 'appropriations', {}))
+    assert sorted((error[4], error[3]) for error in errors) == [('A33', 4), ('A6', 3), ('A7', 2)]
+    assert all(not inspect(rule).expired_attributes for rule in rules)
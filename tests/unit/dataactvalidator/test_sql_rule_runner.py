@@ -0,0 +1,129 @@
+from collections import namedtuple
+import threading
+import time
+
+from sqlalchemy.exc import OperationalError
+
+from dataactvalidator.validation_handlers import validator
+from dataactvalidator.validation_handlers.validator import Validator
+
+
+Rule = namedtuple('Rule', ['rule_label', 'query_name', 'delay'])
+FakeDB = namedtuple('FakeDB', ['engine', 'connection'])
+
+
+class FakeEngine:
+    def __init__(self):
+        self.connections = set()
+
+    def connect(self):
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, engine):
+        self.engine = engine
+
+    def __enter__(self):
+        self.engine.connections.add(threading.get_ident())
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+def run_rule(conn, rule):
+    time.sleep(rule.delay)
+    yield [rule.rule_label, 1]
+    if rule.rule_label == 'bad':
+        raise OperationalError('select broken', {}, Exception('broken'))
+    yield [rule.rule_label, 2]
+
+
+def test_run_sql_rules_concurrently(monkeypatch):
+    """Slow rules don't change the result order, and a failing rule only stops its own errors"""
+    engine = FakeEngine()
+    monkeypatch.setattr(validator.GlobalDB, 'db', classmethod(lambda cls: FakeDB(engine, None)))
+    monkeypatch.setitem(validator.CONFIG_BROKER, 'validator_sql_workers', 3)
+    monkeypatch.setattr(Validator, 'SPOOL_SIZE', 10)
+    rules = [Rule('a1', 'q1', 0.05), Rule('bad', 'q2', 0), Rule('a3', 'q3', 0), Rule('a4', 'q4', 0.01)]
+
+    assert list(Validator.runSqlRules(rules, run_rule)) == [
+        ['a1', 1], ['a1', 2], ['bad', 1], ['a3', 1], ['a3', 2], ['a4', 1], ['a4', 2]]
+    assert len(engine.connections) > 1
+
+
+def test_run_sql_rules_serially(monkeypatch):
+    connection = object()
+    monkeypatch.setattr(validator.GlobalDB, 'db', classmethod(lambda cls: FakeDB(None, connection)))
+    monkeypatch.setitem(validator.CONFIG_BROKER, 'validator_sql_workers', None)
+    rules = [Rule('a1', 'q1', 0), Rule('bad', 'q2', 0), Rule('a3', 'q3', 0)]
+
+    assert list(Validator.runSqlRules(rules, run_rule)) == [['a1', 1], ['a1', 2], ['bad', 1], ['a3', 1], ['a3', 2]]
+
+
+def test_rule_stats(monkeypatch):
+    """Completed rules report their failures and query time, time spent by the caller is not counted"""
+    monkeypatch.setattr(validator.GlobalDB, 'db', classmethod(lambda cls: FakeDB(None, object())))
+    monkeypatch.setitem(validator.CONFIG_BROKER, 'validator_sql_workers', None)
+    StatsRule = namedtuple('StatsRule', Rule._fields + ('rule_sql_id', 'file_id', 'target_file_id'))
+    rules = [StatsRule('a1', 'q1', 0.05, 1, 1, None), StatsRule('bad', 'q2', 0, 2, 1, None)]
+    stats = []
+
+    for _ in Validator.runSqlRules(rules, run_rule, stats=stats):
+        time.sleep(0.1)
+    assert [(stat['rule_label'], stat['query_name'], stat['failure_count']) for stat in stats] == [('a1', 'q1', 2)]
+    assert 0.05 <= stats[0]['elapsed_seconds'] < 0.1
+
+
+class FakeResult:
+    def __init__(self, keys, rows):
+        self._keys = keys
+        self.rows = rows
+        self.fetches = []
+        self.closed = False
+
+    def keys(self):
+        return list(self._keys)
+
+    def fetchmany(self, size):
+        self.fetches.append(size)
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+    def close(self):
+        self.closed = True
+
+
+class FakeStreamingConnection:
+    def __init__(self, result):
+        self.result = result
+        self.options = {}
+        self.info = {}
+
+    def execution_options(self, **options):
+        self.options.update(options)
+        return self
+
+    def execute(self, sql, **params):
+        self.sql = sql
+        self.params = params
+        return self.result
+
+
+def test_stream_rule_sql(monkeypatch):
+    """Rule rows come from a server-side cursor a batch at a time"""
+    monkeypatch.setitem(validator.CONFIG_BROKER, 'validator_sql_fetch_size', 2)
+    monkeypatch.setitem(validator.CONFIG_BROKER, 'prepare_rule_sql', False)
+    result = FakeResult(['row_number', 'tas'], [{'row_number': n, 'tas': 'x'} for n in range(5)])
+    conn = FakeStreamingConnection(result)
+    rule = namedtuple('RuleSql', ['rule_sql'])("SELECT * FROM staging WHERE submission_id = {} AND tas LIKE 'a%'")
+
+    cols, rows = Validator.streamRuleSql(conn, rule, 7)
+    assert cols == ['tas']
+    assert conn.options == {'stream_results': True}
+    assert conn.sql.endswith("submission_id = %(submission_id)s AND tas LIKE 'a%%'")
+    assert conn.params == {'submission_id': 7}
+    assert [row['row_number'] for row in rows] == [0, 1, 2, 3, 4]
+    assert result.fetches == [2, 2, 2, 2]
+    assert result.closed
@@ -0,0 +1,150 @@
+from collections import namedtuple
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from dataactcore.models.stagingModels import Appropriation
+from dataactvalidator.validation_handlers import stagingPartitions
+from dataactvalidator.validation_handlers.stagingPartitions import StagingPartitions
+from tests.unit.dataactcore.factories.job import SubmissionFactory
+from tests.unit.dataactcore.factories.staging import AppropriationFactory
+
+
+class FakeSession:
+    def __init__(self, existing):
+        self.existing = existing
+        self.executed = []
+
+    def execute(self, statement, params=None):
+        sql = str(statement)
+        self.executed.append(sql)
+        return FakeResult(self.existing if 'to_regclass(:name)' in sql else None)
+
+
+class FakeResult:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+
+class LockTimeout(Exception):
+    pgcode = stagingPartitions.LOCK_NOT_AVAILABLE
+
+
+class FakeEngine:
+    """ Records the statements of each transaction, the first `timeouts` transactions fail to get their lock """
+    def __init__(self, timeouts=0):
+        self.timeouts = timeouts
+        self.transactions = []
+
+    def begin(self):
+        return FakeTransaction(self)
+
+
+class FakeTransaction:
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.engine.transactions.append(self.statements)
+
+    def execute(self, statement):
+        self.statements.append(str(statement))
+        if len(self.statements) > 1 and self.engine.timeouts:
+            self.engine.timeouts -= 1
+            raise OperationalError(statement, {}, LockTimeout())
+
+
+@pytest.fixture
+def partitioned(monkeypatch):
+    monkeypatch.setattr(StagingPartitions, '_partitioned', {'appropriation': True})
+    monkeypatch.setattr(stagingPartitions.time, 'sleep', lambda seconds: None)
+    monkeypatch.setitem(stagingPartitions.CONFIG_BROKER, 'staging_partition_lock_timeout', 100)
+    monkeypatch.setitem(stagingPartitions.CONFIG_BROKER, 'staging_partition_retries', 2)
+
+
+def use_engine(monkeypatch, engine):
+    FakeDB = namedtuple('FakeDB', ['engine'])
+    monkeypatch.setattr(stagingPartitions.GlobalDB, 'db', classmethod(lambda cls: FakeDB(engine)))
+
+
+def test_clear_creates_partition(partitioned, monkeypatch):
+    """ The partition is created in a transaction of its own that waits a limited time for the table lock """
+    engine = FakeEngine()
+    use_engine(monkeypatch, engine)
+    sess = FakeSession(None)
+    StagingPartitions.clear(sess, Appropriation, 12)
+    assert len(sess.executed) == 1
+    assert engine.transactions == [[
+        'SET LOCAL lock_timeout = 100',
+        'DELETE FROM appropriation_default WHERE submission_id = 12',
+        'CREATE TABLE IF NOT EXISTS appropriation_submission_12 PARTITION OF appropriation '
+        '(PRIMARY KEY (appropriation_id)) FOR VALUES IN (12)']]
+
+
+def test_create_partition_retries(partitioned, monkeypatch):
+    engine = FakeEngine(timeouts=2)
+    use_engine(monkeypatch, engine)
+    StagingPartitions.clear(FakeSession(None), Appropriation, 12)
+    assert len(engine.transactions) == 3
+    assert len(engine.transactions[-1]) == 3
+
+    engine = FakeEngine(timeouts=3)
+    use_engine(monkeypatch, engine)
+    with pytest.raises(OperationalError):
+        StagingPartitions.clear(FakeSession(None), Appropriation, 12)
+
+
+def test_clear_truncates_partition(partitioned):
+    sess = FakeSession('appropriation_submission_12')
+    StagingPartitions.clear(sess, Appropriation, 12)
+    assert sess.executed[1:] == ['TRUNCATE appropriation_submission_12']
+
+
+def test_clear(database, monkeypatch):
+    """A submission's rows are cleared whether or not the staging tables are partitioned"""
+    monkeypatch.setattr(StagingPartitions, '_partitioned', {})
+    sess = database.session
+    StagingPartitions.clear(sess, Appropriation, 1)
+    sess.add_all([AppropriationFactory(submission_id=1, row_number=2),
+                  AppropriationFactory(submission_id=2, row_number=2)])
+    sess.commit()
+
+    StagingPartitions.clear(sess, Appropriation, 1)
+    sess.commit()
+    assert [row.submission_id for row in sess.query(Appropriation)] == [2]
+
+    # Submission 2 has no partition yet, its rows are removed before one is created
+    StagingPartitions.clear(sess, Appropriation, 2)
+    sess.commit()
+    assert sess.query(Appropriation).count() == 0
+    if StagingPartitions.isPartitioned(sess, 'appropriation'):
+        assert sess.execute("SELECT to_regclass('appropriation_submission_2')").scalar() is not None
+
+
+def test_drop_orphaned(database):
+    """ Only the partitions of deleted submissions are dropped """
+    sess = database.session
+    if not StagingPartitions.isPartitioned(sess, 'appropriation'):
+        assert StagingPartitions.dropOrphaned(sess, [Appropriation]) == []
+        return
+    submission = SubmissionFactory()
+    deleted = SubmissionFactory()
+    sess.add_all([submission, deleted])
+    sess.commit()
+    for submission_id in (submission.submission_id, deleted.submission_id):
+        StagingPartitions.clear(sess, Appropriation, submission_id)
+    sess.delete(deleted)
+    sess.commit()
+
+    dropped = StagingPartitions.dropOrphaned(sess, [Appropriation])
+    assert StagingPartitions.partitionName('appropriation', deleted.submission_id) in dropped
+    assert StagingPartitions.partitionName('appropriation', submission.submission_id) not in dropped
+    assert sess.execute("SELECT to_regclass('{}')".format(
+        StagingPartitions.partitionName('appropriation', submission.submission_id))).scalar() is not None
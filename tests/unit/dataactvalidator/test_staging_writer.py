@@ -0,0 +1,44 @@
+from dataactcore.models.stagingModels import Appropriation, concatTasDict
+from dataactvalidator.filestreaming.stagingWriter import StagingWriter
+
+
+def test_concat_tas_dict_defaults():
+    """Missing TAS components are filled in with zeros, matching concatTas"""
+    assert concatTasDict({}) == '00000000000000 0000000'
+    assert concatTasDict({'allocation_transfer_agency': '097', 'agency_identifier': '017',
+                          'beginning_period_of_availa': '2015', 'ending_period_of_availabil': '2016',
+                          'availability_type_code': 'X', 'main_account_code': '0100',
+                          'sub_account_code': '001'}) == '09701720152016X0100001'
+
+
+def test_write_batches(database):
+    """Records are only written once the batch is full or flushed"""
+    sess = database.session
+    writer = StagingWriter(Appropriation, job_id=1, submission_id=1001, batch_size=2)
+
+    assert writer.write({'agency_identifier': '017', 'unobligated_balance_cpe': '1.5'}, 2) == []
+    assert sess.query(Appropriation).filter_by(submission_id=1001).count() == 0
+    assert writer.write({'agency_identifier': '018'}, 3) == []
+    assert sess.query(Appropriation).filter_by(submission_id=1001).count() == 2
+    assert writer.write({'agency_identifier': '019'}, 4) == []
+    assert writer.flush() == []
+
+    rows = sess.query(Appropriation).filter_by(submission_id=1001).order_by(Appropriation.row_number).all()
+    assert [row.row_number for row in rows] == [2, 3, 4]
+    assert rows[0].tas == '00001700000000 0000000'
+    assert rows[0].job_id == 1
+    assert rows[0].created_at is not None
+
+
+def test_write_reports_failed_rows(database):
+    """A row the database rejects is reported by row number without losing the rest of the batch"""
+    sess = database.session
+    writer = StagingWriter(Appropriation, job_id=1, submission_id=1002)
+
+    writer.write({'agency_identifier': '017'}, 2)
+    writer.write({'unobligated_balance_cpe': 'not a number'}, 3)
+    writer.write({'agency_identifier': '019'}, 4)
+
+    assert writer.flush() == [3]
+    rows = sess.query(Appropriation).filter_by(submission_id=1002).order_by(Appropriation.row_number).all()
+    assert [row.row_number for row in rows] == [2, 4]
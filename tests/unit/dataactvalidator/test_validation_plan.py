@@ -0,0 +1,54 @@
+import pytest
+
+from dataactcore.models.validationModels import FieldType, FileColumn
+from dataactvalidator.validation_handlers.validationError import ValidationError
+from dataactvalidator.validation_handlers.validationPlan import ValidationPlan
+from dataactvalidator.validation_handlers.validator import Validator
+
+
+def make_schema(*columns):
+    """Build a csvSchema dict from (name, type name, required, length) tuples"""
+    schema = {}
+    for name, type_name, required, length in columns:
+        schema[name] = FileColumn(name=name, name_short=name, required=required, length=length,
+                                  field_type=FieldType(name=type_name))
+    return schema
+
+
+SCHEMA = make_schema(('str', 'STRING', True, 5), ('int', 'INT', False, None), ('dec', 'DECIMAL', False, None),
+                     ('bool', 'BOOLEAN', False, None), ('long', 'LONG', False, 3))
+
+
+@pytest.mark.parametrize('value', ['1', '-1', '+01', '1.0', '1.', '.5', '1e5', '1_000', 'NaN', 'inf', '١٢',
+                                   'abc', '.', '--1', 'yes', 'TRUE', '0', 'x'])
+@pytest.mark.parametrize('type_name', ['INT', 'DECIMAL', 'BOOLEAN', 'LONG', 'STRING'])
+def test_type_checks_match_checkType(value, type_name):
+    """Compiled type checks accept exactly what Validator.checkType accepts"""
+    check = ValidationPlan.getTypeCheck(type_name)
+    compiled = True if check is None else check(value)
+    assert compiled == Validator.checkType(value, type_name)
+
+
+def test_failures_in_record_order():
+    plan = ValidationPlan(SCHEMA)
+    record = {'long': '12345', 'str': 'abcdefg', 'int': 'x', 'dec': None, 'bool': '', 'row_number': 2}
+    assert plan.validate(record) == (False, [
+        ['long', ValidationError.lengthError, '12345', '', 'warning'],
+        ['str', ValidationError.lengthError, 'abcdefg', '', 'warning'],
+        ['int', ValidationError.typeError, 'x', '', 'fatal']], False)
+
+
+def test_required():
+    plan = ValidationPlan(SCHEMA)
+    assert plan.validate({'int': '1'}) == (
+        False, [['str', ValidationError.requiredError, '', '', 'fatal']], False)
+    assert plan.validate({'str': ' ', 'int': '1'}) == (
+        False, [['str', ValidationError.requiredError, '', '', 'fatal']], True)
+    assert plan.validate({'str': ' ab ', 'int': ' 1 '}) == (True, [], True)
+
+
+def test_plan_cached_per_schema():
+    plan = ValidationPlan.get('test_file', SCHEMA)
+    assert ValidationPlan.get('test_file', SCHEMA) is plan
+    changed = make_schema(('str', 'STRING', False, 5))
+    assert ValidationPlan.get('test_file', changed) is not plan
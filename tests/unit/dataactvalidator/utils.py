@@ -3,6 +3,7 @@ from random import randint
 
 from dataactcore.models.jobModels import Submission
 from dataactvalidator.filestreaming.sqlLoader import SQLLoader
+from dataactvalidator.validation_handlers.sf133WorkingSet import SF133WorkingSet
 
 
 def insert_submission(db, submission):
@@ -29,6 +30,9 @@ def error_rows(rule_file, staging_db, submission=None, models=None, assert_num =
         staging_db.session.add(model)
 
     staging_db.session.commit()
+    if SF133WorkingSet.readsWorkingSet(sql):
+        SF133WorkingSet.build(staging_db.session, submission_id)
+        staging_db.session.commit()
     result = staging_db.connection.execute(sql).fetchall()
 
     if assert_num is not None: